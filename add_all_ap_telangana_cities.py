@@ -14,6 +14,7 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent / 'backend'))
 
 from cities_data import ANDHRA_PRADESH_CITIES, TELANGANA_CITIES, DEFAULT_DELIVERY_CHARGES, DEFAULT_OTHER_CITY_CHARGE
+from location_index import location_keys
 
 # Load environment variables
 load_dotenv(Path(__file__).parent / 'backend' / '.env')
@@ -62,7 +63,8 @@ async def add_all_cities():
             "charge": charge,
             "free_delivery_threshold": 1000,  # Default threshold
             "enabled": True,
-            "created_at": datetime.now(timezone.utc)
+            "created_at": datetime.now(timezone.utc),
+            **location_keys(city, "Andhra Pradesh")
         }
         cities_to_add.append(city_data)
     
@@ -84,7 +86,8 @@ async def add_all_cities():
             "charge": charge,
             "free_delivery_threshold": 1500 if city in ["Hyderabad", "Secunderabad"] else 1000,
             "enabled": True,
-            "created_at": datetime.now(timezone.utc)
+            "created_at": datetime.now(timezone.utc),
+            **location_keys(city, "Telangana")
         }
         cities_to_add.append(city_data)
     
@@ -1,6 +1,7 @@
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 from cities_data import ALL_CITIES, DEFAULT_DELIVERY_CHARGES, DEFAULT_OTHER_CITY_CHARGE
+from location_index import location_keys
 import os
 
 MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
@@ -71,7 +72,8 @@ async def add_missing_cities():
             "state": state,
             "charge": delivery_charge,
             "enabled": True,
-            "free_delivery_threshold": 1000 if state == "Andhra Pradesh" else 1500
+            "free_delivery_threshold": 1000 if state == "Andhra Pradesh" else 1500,
+            **location_keys(city_name, state)
         }
         
         try:
@@ -1,13 +1,29 @@
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
 
 SECRET_KEY = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost factor; hashes made with any other cost are rehashed on the next successful login
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+
+# bcrypt is CPU-bound (~100-300 ms a call), so it runs on a small dedicated pool instead of the event loop
+BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
+
+_hash_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -15,6 +31,28 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def _verify_and_update(plain_password, hashed_password):
+    if not hashed_password:
+        return False, None
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+async def verify_password_async(plain_password, hashed_password):
+    """Check a password off the event loop; returns (valid, new_hash).
+
+    new_hash is set when the stored hash uses an outdated cost factor and should be
+    replaced - the caller saves it, so users are upgraded transparently as they log in.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, _verify_and_update, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    """Hash a password off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, pwd_context.hash, password)
+
+def shutdown_hash_executor():
+    _hash_executor.shutdown(wait=False, cancel_futures=True)
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+
+from catalog_cache import CACHE_MAX_AGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class AvailabilityIndex:
+    """In-memory inverted index from city name to the products deliverable there.
+
+    Products with no available_cities restriction are kept in a separate set and are
+    available everywhere, so a city or state filter is a set union instead of an
+    $or / $in query against MongoDB. Writes from other workers are picked up by reloading
+    once the index is older than CACHE_MAX_AGE_SECONDS, the same bound as the catalog cache.
+    """
+
+    def __init__(self):
+        self.products_by_city = defaultdict(set)
+        self.unrestricted = set()
+        self._cities_by_product = {}
+        self.loaded = False
+        self.loaded_at = None
+        self._load_lock = asyncio.Lock()
+
+    async def load(self, db):
+        """Rebuild the index from the products collection"""
+        products = await db.products.find({}, {"_id": 0, "id": 1, "available_cities": 1}).to_list(None)
+
+        self.products_by_city = defaultdict(set)
+        self.unrestricted = set()
+        self._cities_by_product = {}
+        for product in products:
+            self.set_product(product["id"], product.get("available_cities"))
+
+        self.loaded = True
+        self.loaded_at = time.monotonic()
+        logger.info(f"Availability index loaded: {len(products)} products, {len(self.products_by_city)} cities")
+
+    def is_stale(self) -> bool:
+        return not self.loaded or time.monotonic() - self.loaded_at >= CACHE_MAX_AGE_SECONDS
+
+    async def refresh_if_stale(self, db):
+        """Reload once when the index has aged out - concurrent callers wait for that one load"""
+        if not self.is_stale():
+            return
+        async with self._load_lock:
+            if self.is_stale():
+                await self.load(db)
+
+    def set_product(self, product_id: str, available_cities):
+        """Record (or replace) the cities a product can be delivered to"""
+        self.remove_product(product_id)
+
+        cities = tuple(available_cities or ())
+        self._cities_by_product[product_id] = cities
+        if not cities:
+            self.unrestricted.add(product_id)
+            return
+        for city in cities:
+            self.products_by_city[city].add(product_id)
+
+    def remove_product(self, product_id: str):
+        cities = self._cities_by_product.pop(product_id, None)
+        if cities is None:
+            return
+        self.unrestricted.discard(product_id)
+        for city in cities:
+            city_products = self.products_by_city.get(city)
+            if city_products is not None:
+                city_products.discard(product_id)
+                if not city_products:
+                    del self.products_by_city[city]
+
+    def product_ids_for_cities(self, cities) -> set:
+        """IDs of products deliverable to any of the given cities"""
+        product_ids = set(self.unrestricted)
+        for city in cities:
+            product_ids |= self.products_by_city.get(city, set())
+        return product_ids
@@ -0,0 +1,179 @@
+"""Checkout latency benchmark: per-item product lookups vs one $in fetch.
+
+Replays the product reads and inventory writes create_order makes for a cart,
+against an in-memory products collection that charges a fixed round-trip
+latency per call (so the numbers reflect round trips, not MongoDB itself).
+
+    python benchmarks/checkout_latency.py --items 15 --latency-ms 2 --runs 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory import aggregate_quantities, decrement_inventory, fetch_products_by_id
+
+
+class _Result:
+    def __init__(self, matched_count=0, modified_count=0):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+
+
+class _Cursor:
+    def __init__(self, collection, docs):
+        self.collection = collection
+        self.docs = docs
+
+    async def to_list(self, length=None):
+        await self.collection.round_trip()
+        return self.docs if length is None else self.docs[:length]
+
+
+class LatencyCollection:
+    """Just enough of a Motor collection for the checkout path, with simulated latency"""
+
+    def __init__(self, docs, latency):
+        self.docs = {doc["id"]: doc for doc in docs}
+        self.latency = latency
+        self.calls = 0
+
+    async def round_trip(self):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+    def _matches(self, doc, query):
+        for field, condition in query.items():
+            value = doc.get(field)
+            if isinstance(condition, dict):
+                if "$in" in condition and value not in condition["$in"]:
+                    return False
+                if "$gte" in condition and (value is None or value < condition["$gte"]):
+                    return False
+                if "$lte" in condition and (value is None or value > condition["$lte"]):
+                    return False
+                if "$ne" in condition and value == condition["$ne"]:
+                    return False
+            elif isinstance(value, list):
+                if condition not in value:
+                    return False
+            elif value != condition:
+                return False
+        return True
+
+    def _apply(self, doc, update):
+        for field, amount in update.get("$inc", {}).items():
+            doc[field] = doc.get(field, 0) + amount
+        doc.update(update.get("$set", {}))
+        for field, spec in update.get("$push", {}).items():
+            doc[field] = (doc.get(field, []) + spec["$each"])[spec["$slice"]:]
+        for field, value in update.get("$pull", {}).items():
+            doc[field] = [item for item in doc.get(field, []) if item != value]
+
+    async def find_one(self, query, projection=None):
+        await self.round_trip()
+        return next((dict(doc) for doc in self.docs.values() if self._matches(doc, query)), None)
+
+    def find(self, query, projection=None):
+        return _Cursor(self, [dict(doc) for doc in self.docs.values() if self._matches(doc, query)])
+
+    async def update_one(self, query, update):
+        await self.round_trip()
+        for doc in self.docs.values():
+            if self._matches(doc, query):
+                self._apply(doc, update)
+                return _Result(1, 1)
+        return _Result()
+
+    async def update_many(self, query, update):
+        await self.round_trip()
+        matched = [doc for doc in self.docs.values() if self._matches(doc, query)]
+        for doc in matched:
+            self._apply(doc, update)
+        return _Result(len(matched), len(matched))
+
+    async def bulk_write(self, operations, ordered=True):
+        await self.round_trip()
+        modified = 0
+        for operation in operations:
+            for doc in self.docs.values():
+                if self._matches(doc, operation._filter):
+                    self._apply(doc, operation._doc)
+                    modified += 1
+                    break
+        return _Result(modified, modified)
+
+
+class LatencyDB:
+    def __init__(self, products, latency):
+        self.products = LatencyCollection(products, latency)
+
+
+def _make_cart(item_count):
+    products = [
+        {"id": f"product-{index}", "available_cities": None, "out_of_stock": False, "inventory_count": 1000}
+        for index in range(item_count)
+    ]
+    items = [{"product_id": product["id"], "quantity": 1} for product in products]
+    return products, items
+
+
+async def per_item_checkout(db, items, order_id):
+    """The old create_order path: a find_one per item to validate, then find_one + update_one per item"""
+    for item in items:
+        product = await db.products.find_one({"id": item["product_id"]})
+        if product.get("out_of_stock") or product["inventory_count"] < item["quantity"]:
+            raise RuntimeError("Insufficient inventory")
+
+    for item in items:
+        product = await db.products.find_one({"id": item["product_id"]})
+        if product and product.get("inventory_count") is not None:
+            new_count = product["inventory_count"] - item["quantity"]
+            update_data = {"inventory_count": max(0, new_count)}
+            if new_count <= 0:
+                update_data["out_of_stock"] = True
+            await db.products.update_one({"id": item["product_id"]}, {"$set": update_data})
+
+
+async def batched_checkout(db, items, order_id):
+    """The current create_order path: one $in fetch, then one conditional bulk decrement"""
+    products_by_id = await fetch_products_by_id(db, [item["product_id"] for item in items])
+    for item in items:
+        product = products_by_id[item["product_id"]]
+        if product.get("out_of_stock") or product["inventory_count"] < item["quantity"]:
+            raise RuntimeError("Insufficient inventory")
+
+    await decrement_inventory(db, aggregate_quantities(items), order_id)
+
+
+async def _measure(checkout, item_count, latency, runs):
+    products, items = _make_cart(item_count)
+    db = LatencyDB(products, latency)
+    timings = []
+    for run in range(runs):
+        started = time.perf_counter()
+        await checkout(db, items, f"order-{run}")
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), db.products.calls // runs
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=15, help="cart size")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="simulated MongoDB round trip")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+    print(f"{args.items}-item cart, {args.latency_ms} ms per round trip, median of {args.runs} runs")
+    for name, checkout in (("per-item lookups", per_item_checkout), ("batched $in fetch", batched_checkout)):
+        median_ms, round_trips = await _measure(checkout, args.items, latency, args.runs)
+        print(f"  {name:<18} {median_ms:8.1f} ms  {round_trips:3d} round trips")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+"""Email template render benchmark: renders per second for every registered template.
+
+    python benchmarks/email_render.py --items 15 --seconds 1
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_templates import get_template, item_row_html, template_names
+
+
+def sample_order(item_count):
+    return {
+        "order_id": "AL20261018ABCD",
+        "tracking_code": "TRK8F3K2Q",
+        "customer_name": "Lakshmi Prasanna",
+        "order_date": "October 18, 2026",
+        "total": 2450.0,
+        "doorNo": "12-3-45",
+        "building": "Sai Residency",
+        "street": "Brodipet 4th Line",
+        "city": "Guntur",
+        "state": "Andhra Pradesh",
+        "pincode": "522002",
+        "location": "Guntur",
+        "phone": "9876543210",
+        "payment_status": "completed",
+        "items": [
+            {"name": f"Festival Item {index % 8}", "weight": ["250g", "500g", "1kg"][index % 3], "quantity": 1 + index % 3, "price": 150.0}
+            for index in range(item_count)
+        ]
+    }
+
+
+def sample_args(name, order):
+    city = {"city": "Tenali", "state": "Andhra Pradesh", "customer_name": "Lakshmi Prasanna"}
+    return {
+        "order_confirmation": (order,),
+        "order_status_update": (order, "confirmed", "shipped"),
+        "order_cancellation": (order, 20.0),
+        "payment_completion": (order,),
+        "city_approval": (city,),
+        "city_rejection": (city, True)
+    }[name]
+
+
+def renders_per_second(template, args, seconds):
+    renders = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while True:
+        for _ in range(100):
+            template.render(*args)
+        renders += 100
+        now = time.perf_counter()
+        if now >= deadline:
+            return renders / (now - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=15, help="items per order")
+    parser.add_argument("--seconds", type=float, default=1.0, help="time spent on each template")
+    args = parser.parse_args()
+
+    order = sample_order(args.items)
+    print(f"{args.items}-item orders, {args.seconds}s per template")
+    for name in template_names():
+        rate = renders_per_second(get_template(name), sample_args(name, order), args.seconds)
+        print(f"  {name:<22} {rate:>12,.0f} renders/s")
+
+    info = item_row_html.cache_info()
+    print(f"item row cache: {info.hits:,} hits, {info.misses:,} misses, {info.currsize:,} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Login storm benchmark: latency of unrelated requests while many logins hash passwords.
+
+Runs a burst of concurrent password checks, once inline on the event loop (the old
+behaviour) and once through auth's bcrypt executor, while a probe coroutine stands in for
+an unrelated endpoint (e.g. GET /api/products served from cache) and records how long
+each of its turns takes to get scheduled.
+
+    python benchmarks/login_storm.py --logins 40 --rounds 12
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument("--logins", type=int, default=40, help="concurrent logins in the storm")
+parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+parser.add_argument("--probe-interval-ms", type=float, default=5.0)
+args = parser.parse_args()
+
+# auth reads its settings at import time
+os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth import get_password_hash, verify_password, verify_password_async
+
+
+async def inline_login(password, stored_hash):
+    return verify_password(password, stored_hash)
+
+
+async def offloaded_login(password, stored_hash):
+    valid, _ = await verify_password_async(password, stored_hash)
+    return valid
+
+
+async def probe(latencies, stop, interval):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        # How much later than requested the loop got back to us
+        latencies.append((time.perf_counter() - started - interval) * 1000)
+
+
+async def storm(login, stored_hash):
+    latencies = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(latencies, stop, args.probe_interval_ms / 1000))
+    await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login("festival-password", stored_hash) for _ in range(args.logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await probe_task
+    return elapsed, latencies
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def main():
+    stored_hash = get_password_hash("festival-password")
+    print(f"{args.logins} concurrent logins, bcrypt cost {args.rounds}")
+    for name, login in (("inline on event loop", inline_login), ("bcrypt executor", offloaded_login)):
+        elapsed, latencies = await storm(login, stored_hash)
+        print(
+            f"  {name:<21} storm {elapsed * 1000:7.0f} ms | unrelated request delay "
+            f"p50 {statistics.median(latencies):7.1f} ms  p99 {percentile(latencies, 0.99):7.1f} ms  "
+            f"max {max(latencies):7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
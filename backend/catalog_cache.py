@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from http_cache import CACHE_MAX_AGE_SECONDS, EncodedBody
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on distinct (city, state, shape) entries kept in memory
+MAX_CATALOG_ENTRIES = 512
+
+_catalog_version = 0
+_entries = {}
+_build_locks = {}
+
+
+def catalog_version():
+    """Current catalog version - bumped on every product write"""
+    return _catalog_version
+
+
+def bump_catalog_version(reason: str = ""):
+    """Invalidate every cached catalog entry after a product write"""
+    global _catalog_version
+    _catalog_version += 1
+    _entries.clear()
+    logger.info(f"Catalog version bumped to {_catalog_version}" + (f" ({reason})" if reason else ""))
+
+
+def _get_fresh(key):
+    entry = _entries.get(key)
+    if not entry or entry["version"] != _catalog_version:
+        return None
+    expires_at = entry["expires_at"]
+    aged_out = time.monotonic() - entry["built_at"] >= CACHE_MAX_AGE_SECONDS
+    if aged_out or (expires_at is not None and expires_at <= datetime.now(timezone.utc)):
+        _entries.pop(key, None)
+        return None
+    return entry["products"]
+
+
+def _store(key, products, version, expires_at, built_at):
+    # A write landed while we were building - don't cache stale data
+    if version != _catalog_version:
+        return
+    if key not in _entries and len(_entries) >= MAX_CATALOG_ENTRIES:
+        _entries.pop(next(iter(_entries)))
+    _entries[key] = {
+        "version": version, "products": products, "expires_at": expires_at, "built_at": built_at, "body": None
+    }
+
+
+async def get_or_build_catalog(key, builder):
+    """Return the cached catalog for key, building it once with builder() on a miss.
+
+    builder is an async callable returning (products, expires_at); expires_at is the
+    earliest moment the computed list goes stale on its own (e.g. a discount expiry).
+    """
+    products = _get_fresh(key)
+    if products is not None:
+        return products
+
+    if len(_build_locks) > MAX_CATALOG_ENTRIES:
+        _build_locks.clear()
+    lock = _build_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        # Another request may have rebuilt it while we waited
+        products = _get_fresh(key)
+        if products is not None:
+            return products
+
+        version = _catalog_version
+        built_at = time.monotonic()
+        products, expires_at = await builder()
+        _store(key, products, version, expires_at, built_at)
+        return products
+
+
+async def get_or_build_catalog_body(key, builder) -> EncodedBody:
+    """Like get_or_build_catalog, but returns the JSON body encoded once per catalog version"""
+    products = await get_or_build_catalog(key, builder)
+
+    entry = _entries.get(key)
+    if entry is None or entry["products"] is not products:
+        # Built under a version that has since been bumped - don't cache the encoding either
+        return EncodedBody(products)
+    if entry["body"] is None:
+        entry["body"] = EncodedBody(products)
+    return entry["body"]
@@ -0,0 +1,229 @@
+"""Declarative MongoDB index registry, applied at startup and from the command line.
+
+    python db_indexes.py ensure   # create any missing indexes
+    python db_indexes.py verify   # explain() every registered query shape, fail on COLLSCAN
+"""
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from order_pagination import ORDER_SORT, after_cursor, encode_cursor
+from order_tracking import tracking_query
+
+logger = logging.getLogger(__name__)
+
+# ============= INDEXES =============
+
+INDEXES = {
+    "orders": [
+        IndexModel([("order_id", ASCENDING)], name="order_id"),
+        IndexModel([("tracking_code", ASCENDING)], name="tracking_code"),
+        IndexModel([("phone", ASCENDING), ("created_at", DESCENDING)], name="phone_created_at"),
+        IndexModel([("email", ASCENDING), ("created_at", DESCENDING)], name="email_created_at"),
+        # Keyset pagination: each listing filter leads a (filter, created_at, order_id) index
+        IndexModel([("created_at", DESCENDING), ("order_id", DESCENDING)], name="created_at_order_id"),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("order_id", DESCENDING)], name="user_id_created_at_order_id"),
+        IndexModel([("order_status", ASCENDING), ("created_at", DESCENDING), ("order_id", DESCENDING)], name="order_status_created_at_order_id"),
+        IndexModel([("payment_status", ASCENDING), ("created_at", DESCENDING), ("order_id", DESCENDING)], name="payment_status_created_at_order_id"),
+        IndexModel([("city", ASCENDING), ("created_at", DESCENDING), ("order_id", DESCENDING)], name="city_created_at_order_id"),
+        IndexModel([("custom_city_request", ASCENDING), ("created_at", DESCENDING), ("order_id", DESCENDING)], name="custom_city_request_created_at_order_id"),
+        # Analytics breakdown filters
+        IndexModel([("state", ASCENDING), ("created_at", DESCENDING)], name="state_created_at"),
+        IndexModel([("payment_method", ASCENDING), ("created_at", DESCENDING)], name="payment_method_created_at"),
+        IndexModel([("is_custom_location", ASCENDING)], name="is_custom_location")
+    ],
+    "products": [
+        IndexModel([("id", ASCENDING)], name="id"),
+        IndexModel([("available_cities", ASCENDING)], name="available_cities"),
+        IndexModel([("isBestSeller", ASCENDING)], name="isBestSeller"),
+        IndexModel([("isFestival", ASCENDING)], name="isFestival"),
+        IndexModel([("discount_active", ASCENDING), ("discount_expires_at", ASCENDING)], name="discount_expiry"),
+        IndexModel([("discount_active", ASCENDING), ("discount_starts_at", ASCENDING)], name="discount_start")
+    ],
+    "locations": [
+        IndexModel([("name", ASCENDING), ("state", ASCENDING)], name="name_state"),
+        IndexModel([("name_key", ASCENDING), ("state_key", ASCENDING)], name="name_key_state_key"),
+        IndexModel([("state", ASCENDING)], name="state")
+    ],
+    "states": [
+        IndexModel([("name", ASCENDING)], name="name")
+    ],
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id"),
+        IndexModel([("email", ASCENDING)], name="email"),
+        IndexModel([("phone", ASCENDING)], name="phone")
+    ],
+    "saved_user_details": [
+        IndexModel([("identifier", ASCENDING)], name="identifier")
+    ],
+    "city_suggestions": [
+        IndexModel([("id", ASCENDING)], name="id"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created_at"),
+        IndexModel([("city", ASCENDING), ("state", ASCENDING), ("status", ASCENDING)], name="city_state_status")
+    ],
+    "bug_reports": [
+        IndexModel([("id", ASCENDING)], name="id"),
+        IndexModel([("status", ASCENDING)], name="status")
+    ],
+    "dismissed_notifications": [
+        IndexModel([("admin_id", ASCENDING), ("dismissed_at", DESCENDING)], name="admin_id_dismissed_at")
+    ],
+    "otp_verifications": [
+        IndexModel([("email", ASCENDING), ("otp", ASCENDING)], name="email_otp")
+    ],
+    "settings": [
+        IndexModel([("key", ASCENDING)], name="key")
+    ],
+    "inventory_reservations": [
+        IndexModel([("status", ASCENDING), ("expires_at", ASCENDING)], name="status_expires_at"),
+        IndexModel([("order_id", ASCENDING)], name="order_id"),
+        IndexModel([("claim_token", ASCENDING)], name="claim_token", sparse=True)
+    ],
+    "sales_rollups": [
+        IndexModel([("period", ASCENDING), ("key", ASCENDING)], name="period_key")
+    ],
+    "email_outbox": [
+        IndexModel([("dedupe_key", ASCENDING)], name="dedupe_key", unique=True),
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt_at")
+    ]
+}
+
+# ============= QUERY SHAPES =============
+
+def query_shapes():
+    """(collection, filter, sort) for every hot query the backend issues - values are placeholders"""
+    now = datetime.now(timezone.utc)
+    return [
+        ("orders", {"order_id": "AL0"}, None),
+        ("orders", {"order_id": {"$in": ["AL0", "AL1"]}, "cancelled": {"$ne": True}}, None),
+        ("orders", tracking_query("AL0"), [("created_at", -1)]),
+        ("orders", {"$or": [{"phone": "0"}, {"email": "0"}]}, [("created_at", -1)]),
+        ("orders", {"user_id": "u"}, ORDER_SORT),
+        ("orders", {}, ORDER_SORT),
+        ("orders", after_cursor(encode_cursor({"created_at": now, "order_id": "AL0"})), ORDER_SORT),
+        ("orders", {"order_status": "pending", "created_at": {"$gte": now}}, ORDER_SORT),
+        ("orders", {"payment_status": "completed"}, ORDER_SORT),
+        ("orders", {"city": "Guntur"}, ORDER_SORT),
+        ("orders", {"custom_city_request": True}, ORDER_SORT),
+        ("orders", {"state": "Telangana", "created_at": {"$gte": now}}, None),
+        ("orders", {"payment_method": "online", "created_at": {"$gte": now}}, None),
+        ("orders", {"created_at": {"$gte": now}}, None),
+        ("orders", {"is_custom_location": True}, None),
+        ("products", {"id": "p"}, None),
+        ("products", {"id": {"$in": ["p", "q"]}}, None),
+        ("products", {"available_cities": {"$in": ["Guntur"]}}, None),
+        ("products", {"isBestSeller": True}, None),
+        ("products", {"isFestival": True}, None),
+        ("products", {"$or": [{"isBestSeller": True}, {"id": {"$in": ["p", "q"]}}]}, None),
+        ("products", {"$or": [{"isFestival": True}, {"id": {"$in": ["p", "q"]}}]}, None),
+        ("products", {"discount_active": True, "discount_expires_at": {"$gt": now}}, [("discount_expires_at", 1)]),
+        ("products", {"discount_active": False, "discount_starts_at": {"$gt": now}}, [("discount_starts_at", 1)]),
+        ("locations", {"name": "Guntur", "state": "Andhra Pradesh"}, None),
+        ("locations", {"name": "Guntur"}, None),
+        ("locations", {"name_key": "guntur", "state_key": "andhra pradesh"}, None),
+        ("locations", {"state": "Andhra Pradesh"}, None),
+        ("states", {"name": "Andhra Pradesh"}, None),
+        ("users", {"id": "u"}, None),
+        ("users", {"email": "a@example.com"}, None),
+        ("users", {"phone": "0"}, None),
+        ("saved_user_details", {"identifier": "0"}, None),
+        ("city_suggestions", {"id": "s"}, None),
+        ("city_suggestions", {"status": "pending"}, [("created_at", -1)]),
+        ("city_suggestions", {"city": "Tenali", "state": "Andhra Pradesh", "status": "pending"}, None),
+        ("bug_reports", {"status": {"$in": ["New", "In Progress"]}}, None),
+        ("dismissed_notifications", {"admin_id": "admin", "dismissed_at": {"$gte": now}}, None),
+        ("otp_verifications", {"email": "a@example.com", "otp": "000000"}, None),
+        ("settings", {"key": "free_delivery"}, None),
+        ("inventory_reservations", {"order_id": "AL0", "status": "held"}, None),
+        ("inventory_reservations", {"order_id": {"$in": ["AL0", "AL1"]}, "status": "held"}, None),
+        ("inventory_reservations", {"$or": [
+            {"status": "held", "expires_at": {"$lte": now}},
+            {"status": "releasing", "claimed_at": {"$lte": now}}
+        ]}, None),
+        ("inventory_reservations", {"claim_token": "t"}, None),
+        ("sales_rollups", {"period": "month"}, None),
+        ("email_outbox", {"status": "pending", "next_attempt_at": {"$lte": now}}, [("next_attempt_at", 1)])
+    ]
+
+# ============= APPLY / VERIFY =============
+
+async def ensure_indexes(db) -> int:
+    """Create every registered index that is missing; returns how many collections failed"""
+    failures = 0
+    for collection, indexes in INDEXES.items():
+        try:
+            await db[collection].create_indexes(indexes)
+        except OperationFailure as e:
+            # e.g. an index with the same name but different options - report, don't block startup
+            failures += 1
+            logger.error(f"Could not create indexes on {collection}: {str(e)}")
+    logger.info(f"Ensured indexes on {len(INDEXES) - failures} of {len(INDEXES)} collections")
+    return failures
+
+
+def plan_stages(plan: dict):
+    """Yield every stage name in an explain() plan tree"""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan", "innerStage", "outerStage", "thenStage", "elseStage"):
+        if key in plan:
+            yield from plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from plan_stages(child)
+
+
+async def explain_stages(db, collection: str, query: dict, sort=None) -> set:
+    command = {"find": collection, "filter": query}
+    if sort:
+        command["sort"] = dict(sort)
+    explanation = await db.command({"explain": command, "verbosity": "queryPlanner"})
+    return set(plan_stages(explanation["queryPlanner"]["winningPlan"]))
+
+
+async def verify_indexes(db) -> list:
+    """explain() every registered query shape; returns the shapes that fall back to COLLSCAN"""
+    collscans = []
+    for collection, query, sort in query_shapes():
+        stages = await explain_stages(db, collection, query, sort)
+        if "COLLSCAN" in stages:
+            collscans.append((collection, query, sort))
+            logger.error(f"COLLSCAN: {collection} {query} sort={sort}")
+    return collscans
+
+# ============= CLI =============
+
+async def _main(command: str) -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        if command == "ensure":
+            return 1 if await ensure_indexes(db) else 0
+
+        await ensure_indexes(db)
+        collscans = await verify_indexes(db)
+        print(f"{len(query_shapes()) - len(collscans)} of {len(query_shapes())} query shapes use an index")
+        for collection, query, sort in collscans:
+            print(f"  COLLSCAN  {collection}  {query}  sort={sort}")
+        return 1 if collscans else 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in ("ensure", "verify"):
+        print(__doc__)
+        sys.exit(2)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(_main(sys.argv[1])))
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_BATCH_SIZE = 500
+
+# Fields derived from discount_percentage / discount dates and stored on the product
+MATERIALIZED_DISCOUNT_FIELDS = ["discount_active", "discounted_prices", "discount_starts_at", "discount_expires_at"]
+
+
+def parse_discount_date(value: str) -> datetime:
+    """Parse an admin-supplied discount date into an aware UTC datetime (raises ValueError)"""
+    date_str = value.replace('Z', '+00:00')
+    if 'T' in date_str:
+        parsed = datetime.fromisoformat(date_str)
+    else:
+        # If only date is provided (YYYY-MM-DD), the discount runs until the end of that day
+        parsed = datetime.fromisoformat(date_str + "T23:59:59+00:00")
+    return as_utc(parsed)
+
+
+def as_utc(value: datetime) -> datetime:
+    """MongoDB hands back naive UTC datetimes - make them comparable with aware ones"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def compute_discounted_prices(prices: list, discount_percentage: float) -> list:
+    """Apply a percentage discount to every weight/price entry"""
+    discounted_prices = []
+    for price_item in prices or []:
+        original_price = price_item['price']
+        discounted_prices.append({
+            **price_item,
+            'original_price': original_price,
+            'discounted_price': round(original_price * (1 - discount_percentage / 100), 2)
+        })
+    return discounted_prices
+
+
+def materialize_discount(product: dict, now: datetime = None):
+    """Compute the stored discount fields for a product.
+
+    Returns (set_fields, unset_fields) ready for an update_one on the product.
+    Date strings are parsed here, on write, so catalog reads never have to.
+    """
+    now = now or datetime.now(timezone.utc)
+    discount_percentage = product.get("discount_percentage")
+    expires_at = _discount_bound(product, "discount_expiry_date")
+    starts_at = _discount_bound(product, "discount_start_date")
+
+    if not discount_percentage or expires_at is None:
+        unset_fields = {field: "" for field in MATERIALIZED_DISCOUNT_FIELDS if field != "discount_active"}
+        return {"discount_active": False}, unset_fields
+
+    set_fields = {
+        "discount_expires_at": expires_at,
+        "discounted_prices": compute_discounted_prices(product.get("prices", []), discount_percentage),
+        "discount_active": (starts_at is None or starts_at <= now) and expires_at > now
+    }
+    unset_fields = {}
+    if starts_at:
+        set_fields["discount_starts_at"] = starts_at
+    else:
+        unset_fields["discount_starts_at"] = ""
+    return set_fields, unset_fields
+
+
+def _discount_bound(product: dict, date_field: str):
+    # Only the admin-entered string counts - a cleared or invalid date means no bound, even if
+    # a parsed copy from an earlier write is still stored on the product
+    value = product.get(date_field)
+    if isinstance(value, datetime):
+        return as_utc(value)
+    if value:
+        try:
+            return parse_discount_date(value)
+        except (ValueError, AttributeError):
+            pass
+    return None
+
+
+class DiscountScheduler:
+    """Flips discount_active on products at the exact start/expiry instants.
+
+    A single timer is armed for the next transition across all products; when it fires
+    the due products are updated in one pass and the timer is re-armed for the next one.
+    """
+
+    def __init__(self, db, on_change=None):
+        self.db = db
+        self.on_change = on_change
+        self._timer = None
+        self._task = None
+
+    async def start(self):
+        await self.reconcile()
+
+    def stop(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    async def reconcile(self):
+        """Materialize discount fields for every discounted product (e.g. legacy string expiries)"""
+        cursor = self.db.products.find(
+            {"$or": [
+                {"discount_percentage": {"$ne": None}},
+                {"discount_active": True}
+            ]},
+            {"_id": 0}
+        )
+
+        count = 0
+        batch = []
+        async for product in cursor:
+            batch.append(self._update_op(product))
+            if len(batch) >= RECONCILE_BATCH_SIZE:
+                await self.db.products.bulk_write(batch, ordered=False)
+                count += len(batch)
+                batch = []
+        if batch:
+            await self.db.products.bulk_write(batch, ordered=False)
+            count += len(batch)
+
+        logger.info(f"Discount scheduler reconciled {count} discounted products")
+        await self.reschedule()
+
+    async def refresh_product(self, product_id: str):
+        """Recompute stored discount fields after a product's prices or discount changed"""
+        await self.refresh_products([product_id])
+
+    async def refresh_products(self, product_ids: list):
+        """Recompute stored discount fields for several products with one read and one bulk write"""
+        if product_ids:
+            products = await self.db.products.find({"id": {"$in": list(product_ids)}}, {"_id": 0}).to_list(None)
+            if products:
+                await self.db.products.bulk_write([self._update_op(product) for product in products], ordered=False)
+        await self.reschedule()
+
+    def _update_op(self, product: dict) -> UpdateOne:
+        set_fields, unset_fields = materialize_discount(product)
+        update = {"$set": set_fields}
+        if unset_fields:
+            update["$unset"] = unset_fields
+        return UpdateOne({"id": product["id"]}, update)
+
+    async def reschedule(self):
+        """Arm the timer for the earliest upcoming start or expiry"""
+        now = datetime.now(timezone.utc)
+        next_expiry = await self.db.products.find_one(
+            {"discount_active": True, "discount_expires_at": {"$gt": now}},
+            {"_id": 0, "discount_expires_at": 1},
+            sort=[("discount_expires_at", 1)]
+        )
+        next_start = await self.db.products.find_one(
+            {"discount_active": False, "discount_starts_at": {"$gt": now}},
+            {"_id": 0, "discount_starts_at": 1},
+            sort=[("discount_starts_at", 1)]
+        )
+
+        candidates = []
+        if next_expiry:
+            candidates.append(as_utc(next_expiry["discount_expires_at"]))
+        if next_start:
+            candidates.append(as_utc(next_start["discount_starts_at"]))
+
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+        if not candidates:
+            return
+
+        next_at = min(candidates)
+        delay = max(0.0, (next_at - datetime.now(timezone.utc)).total_seconds())
+        self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+        logger.info(f"Next discount transition scheduled at {next_at.isoformat()}")
+
+    def _on_timer(self):
+        self._timer = None
+        self._task = asyncio.ensure_future(self._apply_due_transitions())
+
+    async def _apply_due_transitions(self):
+        try:
+            now = datetime.now(timezone.utc)
+            expired = await self.db.products.update_many(
+                {"discount_active": True, "discount_expires_at": {"$lte": now}},
+                {"$set": {"discount_active": False}}
+            )
+            started = await self.db.products.update_many(
+                {
+                    "discount_active": False,
+                    "discount_starts_at": {"$lte": now},
+                    "discount_expires_at": {"$gt": now}
+                },
+                {"$set": {"discount_active": True}}
+            )
+
+            if expired.modified_count or started.modified_count:
+                logger.info(f"Discounts expired: {expired.modified_count}, started: {started.modified_count}")
+                if self.on_change:
+                    self.on_change()
+        except Exception as e:
+            logger.error(f"Failed to apply discount transitions: {str(e)}")
+        finally:
+            await self.reschedule()
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from gmail_service import (
+    send_order_confirmation_email_gmail,
+    send_order_status_update_email,
+    send_order_cancellation_email,
+    send_payment_completion_email,
+    send_city_approval_email,
+    send_city_rejection_email
+)
+
+logger = logging.getLogger(__name__)
+
+EMAIL_WORKERS = int(os.environ.get('EMAIL_WORKERS', '4'))
+MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS', '6'))
+
+# Retry after 30s, 1m, 2m, 4m ... capped at an hour
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+
+# A message claimed by a worker that died mid-send becomes claimable again after this
+LEASE_SECONDS = 120
+
+# How long an idle worker sleeps when nothing woke it up
+POLL_INTERVAL_SECONDS = 15
+
+
+async def _send_order_confirmation(to_email, payload):
+    return await send_order_confirmation_email_gmail(to_email, payload["order"])
+
+
+async def _send_order_status_update(to_email, payload):
+    return await send_order_status_update_email(to_email, payload["order"], payload["old_status"], payload["new_status"])
+
+
+async def _send_order_cancellation(to_email, payload):
+    return await send_order_cancellation_email(to_email, payload["order"], cancellation_fee=payload.get("cancellation_fee", 0.0))
+
+
+async def _send_payment_completion(to_email, payload):
+    return await send_payment_completion_email(to_email, payload["order"])
+
+
+async def _send_city_approval(to_email, payload):
+    return await send_city_approval_email(to_email, payload["suggestion"])
+
+
+async def _send_city_rejection(to_email, payload):
+    return await send_city_rejection_email(to_email, payload["suggestion"])
+
+
+# Template name -> sender; every sender returns True once the mail server accepted the message
+TEMPLATES = {
+    "order_confirmation": _send_order_confirmation,
+    "order_status_update": _send_order_status_update,
+    "order_cancellation": _send_order_cancellation,
+    "payment_completion": _send_payment_completion,
+    "city_approval": _send_city_approval,
+    "city_rejection": _send_city_rejection
+}
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before the next attempt, doubling per failure, with jitter so retries don't bunch up"""
+    delay = min(BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class EmailOutbox:
+    """Mongo-backed queue of transactional emails drained by a pool of background workers.
+
+    Request handlers only insert into email_outbox, so their latency no longer depends on
+    the mail server. Each message is deduplicated by (reference id, template[, variant]),
+    retried with exponential backoff and moved to the "dead" state after MAX_ATTEMPTS.
+    """
+
+    def __init__(self, db, workers: int = EMAIL_WORKERS):
+        self.db = db
+        self.worker_count = workers
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._run(index)) for index in range(self.worker_count)]
+        logger.info(f"Email outbox started with {self.worker_count} workers")
+
+    def stop(self):
+        for task in self._tasks:
+            if not task.done():
+                task.cancel()
+        self._tasks = []
+
+    @staticmethod
+    def _message(template: str, to_email: str, payload: dict, ref_id: str, variant: str = None) -> dict:
+        if template not in TEMPLATES:
+            raise ValueError(f"Unknown email template: {template}")
+        now = datetime.now(timezone.utc)
+        return {
+            "id": str(uuid.uuid4()),
+            "dedupe_key": ":".join(part for part in (ref_id, template, variant) if part),
+            "ref_id": ref_id,
+            "template": template,
+            "to_email": to_email,
+            "payload": payload,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+            "last_error": None
+        }
+
+    async def enqueue(self, template: str, to_email: str, payload: dict, ref_id: str, variant: str = None) -> bool:
+        """Queue an email; returns False if the same (ref_id, template, variant) was already queued"""
+        message = self._message(template, to_email, payload, ref_id, variant)
+        if not to_email:
+            return False
+
+        try:
+            await self.db.email_outbox.insert_one(message)
+        except DuplicateKeyError:
+            logger.info(f"Email {message['dedupe_key']} already queued - skipping duplicate")
+            return False
+
+        self._wakeup.set()
+        return True
+
+    async def enqueue_many(self, emails: list) -> int:
+        """Queue (template, to_email, payload, ref_id, variant) tuples in one insert; returns how many were new"""
+        messages = [self._message(*email) for email in emails if email[1]]
+        if not messages:
+            return 0
+
+        queued = len(messages)
+        try:
+            await self.db.email_outbox.insert_many(messages, ordered=False)
+        except BulkWriteError as e:
+            duplicates = [error for error in e.details.get("writeErrors", []) if error.get("code") == 11000]
+            if len(duplicates) != len(e.details.get("writeErrors", [])):
+                raise
+            queued -= len(duplicates)
+            logger.info(f"{len(duplicates)} emails already queued - skipping duplicates")
+
+        if queued:
+            self._wakeup.set()
+        return queued
+
+    async def _claim(self):
+        now = datetime.now(timezone.utc)
+        return await self.db.email_outbox.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "lease_expires_at": {"$lte": now}}
+            ]},
+            {
+                "$set": {"status": "sending", "lease_expires_at": now + timedelta(seconds=LEASE_SECONDS)},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("next_attempt_at", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _run(self, worker_index: int):
+        while True:
+            try:
+                message = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Email outbox worker {worker_index} could not claim a message: {str(e)}")
+                message = None
+
+            if message is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self.deliver(message)
+
+    async def deliver(self, message: dict):
+        """Send one claimed message and record the outcome"""
+        error = None
+        try:
+            if not await TEMPLATES[message["template"]](message["to_email"], message["payload"]):
+                error = "Mail server did not accept the message"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = str(e)
+
+        now = datetime.now(timezone.utc)
+        if error is None:
+            await self.db.email_outbox.update_one(
+                {"id": message["id"]},
+                {"$set": {"status": "sent", "sent_at": now, "last_error": None}, "$unset": {"lease_expires_at": ""}}
+            )
+            logger.info(f"✅ Email {message['dedupe_key']} sent to {message['to_email']}")
+            return
+
+        if message["attempts"] >= MAX_ATTEMPTS:
+            update = {"status": "dead", "dead_at": now, "last_error": error}
+            logger.error(f"❌ Email {message['dedupe_key']} dead-lettered after {message['attempts']} attempts: {error}")
+        else:
+            update = {
+                "status": "pending",
+                "next_attempt_at": now + timedelta(seconds=backoff_seconds(message["attempts"])),
+                "last_error": error
+            }
+            logger.warning(f"⚠️ Email {message['dedupe_key']} attempt {message['attempts']} failed: {error}")
+        await self.db.email_outbox.update_one(
+            {"id": message["id"]},
+            {"$set": update, "$unset": {"lease_expires_at": ""}}
+        )
+
+    async def retry(self, message_id: str) -> bool:
+        """Put a dead-lettered message back in the queue"""
+        result = await self.db.email_outbox.update_one(
+            {"id": message_id, "status": "dead"},
+            {"$set": {"status": "pending", "attempts": 0, "next_attempt_at": datetime.now(timezone.utc)}}
+        )
+        if result.modified_count:
+            self._wakeup.set()
+        return result.modified_count > 0
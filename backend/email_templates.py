@@ -0,0 +1,449 @@
+import html
+import logging
+import string
+from datetime import datetime
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# ============= COMPILER =============
+
+def compile_template(source: str, name: str = "template", escape: bool = True):
+    """Compile a "{field}" template into a Python function of one context dict.
+
+    The template is parsed once; rendering is a single join over the literal chunks and
+    the context values, with no parsing or formatting machinery per call. Values are
+    HTML-escaped unless escape is False or the field name ends in _html (pre-rendered
+    fragments such as item rows).
+    """
+    parts = []
+    for literal, field, format_spec, conversion in string.Formatter().parse(source):
+        if literal:
+            parts.append(repr(literal))
+        if field is None:
+            continue
+        if not field.isidentifier() or format_spec or conversion:
+            raise ValueError(f"Unsupported placeholder {{{field}}} in {name}")
+        if escape and not field.endswith("_html"):
+            parts.append(f"_escape(str(ctx[{field!r}]))")
+        else:
+            parts.append(f"str(ctx[{field!r}])")
+
+    code = "def render(ctx):\n    return ''.join((" + "".join(part + ", " for part in parts) + "))\n"
+    namespace = {"_escape": html.escape}
+    exec(compile(code, f"<email template {name}>", "exec"), namespace)
+    return namespace["render"]
+
+
+class EmailTemplate:
+    """A compiled subject + HTML body pair with the function that builds its context"""
+
+    __slots__ = ("name", "render_subject", "render_html", "build_context")
+
+    def __init__(self, name: str, subject: str, body: str, build_context):
+        self.name = name
+        self.render_subject = compile_template(subject, name, escape=False)
+        self.render_html = compile_template(body, name)
+        self.build_context = build_context
+
+    def render(self, *args, **kwargs):
+        """Return (subject, html) for the given data"""
+        context = self.build_context(*args, **kwargs)
+        return self.render_subject(context), self.render_html(context)
+
+
+_templates = {}
+
+
+def register(name: str, subject: str, body: str, build_context):
+    _templates[name] = EmailTemplate(name, subject, body, build_context)
+
+
+def get_template(name: str) -> EmailTemplate:
+    return _templates[name]
+
+
+def template_names():
+    return list(_templates)
+
+
+def render_email(name: str, *args, **kwargs):
+    """Render a registered template; returns (subject, html)"""
+    return _templates[name].render(*args, **kwargs)
+
+# ============= SHARED MARKUP =============
+
+def _layout(heading: str, heading_color: str, content: str, signoff: str = None) -> str:
+    return f'''
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #ddd; border-radius: 10px;">
+                <h2 style="color: {heading_color}; text-align: center;">{heading}</h2>
+                {content}
+                <p style="text-align: center; color: #666; margin-top: 30px; font-size: 12px;">
+                    {signoff or DEFAULT_SIGNOFF}
+                </p>
+            </div>
+        </body>
+        </html>
+        '''
+
+DEFAULT_SIGNOFF = '''Thank you for choosing Anantha Home Foods!<br>
+                    Handcrafted with love and tradition 💚'''
+
+def _contact(margin_top: int = 30) -> str:
+    return f'''<p style="margin-top: {margin_top}px;">If you have any questions, feel free to contact us at <strong>9985116385</strong></p>'''
+
+PRODUCT_RANGE = '''<ul style="margin: 10px 0;">
+                        <li>Traditional Laddus &amp; Chikkis</li>
+                        <li>Authentic Sweets</li>
+                        <li>Hot Snacks &amp; Items</li>
+                        <li>Homemade Pickles</li>
+                        <li>Fresh Powders &amp; Spices</li>
+                    </ul>'''
+
+
+@lru_cache(maxsize=2048)
+def item_row_html(name: str, weight: str, quantity: int, price: float) -> str:
+    """One ordered-item row - memoized, since the same product/weight lines repeat across orders"""
+    return f'''
+            <div style="padding: 10px; border-bottom: 1px solid #e5e7eb;">
+                <p><strong>{html.escape(str(name))}</strong> ({html.escape(str(weight))})</p>
+                <p>Quantity: {quantity} × Rs.{price} = Rs.{quantity * price}</p>
+            </div>
+            '''
+
+
+def _items_html(items) -> str:
+    return "".join(
+        item_row_html(item["name"], item["weight"], item["quantity"], item["price"])
+        for item in items or ()
+    )
+
+
+def _address_html(order: dict) -> str:
+    if order.get("doorNo"):
+        escaped = {field: html.escape(str(order.get(field) or "")) for field in ("doorNo", "building", "street", "city", "state", "pincode")}
+        return f'''
+            {escaped["doorNo"]}, {escaped["building"]}<br>
+            {escaped["street"]}<br>
+            {escaped["city"]}, {escaped["state"]} - {escaped["pincode"]}
+            '''
+    return html.escape(str(order.get("address") or ""))
+
+
+def _order_context(order: dict, default_name: str = "Customer") -> dict:
+    return {
+        "customer_name": order.get("customer_name") or default_name,
+        "order_id": order.get("order_id", "N/A"),
+        "tracking_code": order.get("tracking_code") or "N/A",
+        "total": order.get("total", 0),
+        "location": order.get("location") or "",
+        "phone": order.get("phone") or "",
+        "address_html": _address_html(order)
+    }
+
+# ============= ORDER TEMPLATES =============
+
+def _order_confirmation_context(order: dict) -> dict:
+    return {
+        **_order_context(order),
+        "order_date": order.get("order_date") or datetime.now().strftime("%B %d, %Y"),
+        "items_html": _items_html(order.get("items"))
+    }
+
+register(
+    "order_confirmation",
+    subject="Order Confirmation - #{order_id}",
+    body=_layout("🎉 Order Confirmed!", "#f97316", f'''<p>Dear {{customer_name}},</p>
+                <p><strong>Your order has been successfully placed!</strong> Thank you for choosing Anantha Home Foods!</p>
+
+                <div style="background-color: #fff7ed; padding: 15px; border-radius: 8px; margin: 20px 0;">
+                    <h3 style="color: #ea580c; margin-top: 0;">Order Details</h3>
+                    <p><strong>Order ID:</strong> {{order_id}}</p>
+                    <p><strong>Tracking Code:</strong> {{tracking_code}}</p>
+                    <p><strong>Order Date:</strong> {{order_date}}</p>
+                    <p><strong>Total Amount:</strong> Rs.{{total}}</p>
+                </div>
+
+                <div style="background-color: #f0fdf4; padding: 15px; border-radius: 8px; margin: 20px 0;">
+                    <h3 style="color: #16a34a; margin-top: 0;">Delivery Address</h3>
+                    <p>{{address_html}}<br>
+                    {{location}}</p>
+                    <p><strong>Phone:</strong> {{phone}}</p>
+                </div>
+
+                <div style="margin: 20px 0;">
+                    <h3 style="color: #1e40af;">Items Ordered</h3>
+                    {{items_html}}
+                </div>
+
+                <div style="background-color: #fef3c7; padding: 15px; border-radius: 8px; margin: 20px 0;">
+                    <h4 style="margin-top: 0;">📦 Track Your Order</h4>
+                    <p>You can track your order anytime using your Order ID <strong>{{order_id}}</strong> or Tracking Code <strong>{{tracking_code}}</strong> on our website.</p>
+                    <p>Simply visit the Track Order page and enter your tracking code, phone number, or email to get updates!</p>
+                </div>
+
+                {_contact()}'''),
+    build_context=_order_confirmation_context
+)
+
+# Status display names with emojis, and their colours
+STATUS_DISPLAY = {
+    'confirmed': ' Confirmed',
+    'processing': '🔄 Processing',
+    'shipped': '🚚 Shipped',
+    'delivered': '📦 Delivered',
+    'cancelled': ' Cancelled'
+}
+
+STATUS_COLORS = {
+    'confirmed': '#16a34a',
+    'processing': '#2563eb',
+    'shipped': '#f59e0b',
+    'delivered': '#059669',
+    'cancelled': '#dc2626'
+}
+
+def _order_status_update_context(order: dict, old_status: str, new_status: str) -> dict:
+    return {
+        **_order_context(order),
+        "tracking_code": order.get("tracking_code", ""),
+        "new_status_display": STATUS_DISPLAY.get(new_status, new_status.title()),
+        "status_color": STATUS_COLORS.get(new_status, '#666')
+    }
+
+register(
+    "order_status_update",
+    subject="Order Status Update - #{order_id}",
+    body=_layout("📬 Order Status Update", "#f97316", f'''<p>Dear {{customer_name}},</p>
+                <p>Your order status has been updated!</p>
+
+                <div style="background-color: #fff7ed; padding: 20px; border-radius: 8px; margin: 20px 0; text-align: center;">
+                    <h3 style="color: {{status_color}}; margin: 0; font-size: 24px;">
+                        {{new_status_display}}
+                    </h3>
+                    <p style="margin-top: 10px; color: #666;">Order ID: <strong>{{order_id}}</strong></p>
+                    <p style="color: #666;">Tracking Code: <strong>{{tracking_code}}</strong></p>
+                </div>
+
+                <div style="background-color: #f0fdf4; padding: 15px; border-radius: 8px; margin: 20px 0;">
+                    <h3 style="color: #16a34a; margin-top: 0;">Delivery Details</h3>
+                    <p><strong>Address:</strong><br>{{address_html}}<br>
+                    {{location}}</p>
+                    <p><strong>Phone:</strong> {{phone}}</p>
+                    <p><strong>Total Amount:</strong> Rs.{{total}}</p>
+                </div>
+
+                <div style="background-color: #fef3c7; padding: 15px; border-radius: 8px; margin: 20px 0;">
+                    <h4 style="margin-top: 0;">📦 Track Your Order</h4>
+                    <p>You can track your order anytime using your Order ID or Tracking Code on our website.</p>
+                    <p>Visit our Track Order page and enter your details to get real-time updates!</p>
+                </div>
+
+                {_contact()}'''),
+    build_context=_order_status_update_context
+)
+
+REFUND_SECTION = compile_template('''
+                <div style="background-color: #fff7ed; padding: 20px; border-radius: 8px; margin: 20px 0;">
+                    <h3 style="color: #ea580c; margin: 0;"> Refund Information</h3>
+                    <p style="margin-top: 15px;">
+                        <strong>Order Total:</strong> Rs.{total}<br>
+                        <strong>Cancellation Fee:</strong> Rs.{cancellation_fee}<br>
+                        <strong>Refund Amount:</strong> Rs.{refund_amount}
+                    </p>
+                    <p style="margin-top: 10px; font-style: italic;">
+                        Your refund will be processed within 2-3 business days to the original payment method.
+                    </p>
+                </div>
+                ''', "order_cancellation refund")
+
+def _order_cancellation_context(order: dict, cancellation_fee: float = 20.0) -> dict:
+    context = _order_context(order, default_name="Valued Customer")
+    refund_section_html = ""
+    if order.get("payment_status") == "completed":
+        refund_section_html = REFUND_SECTION({
+            "total": context["total"],
+            "cancellation_fee": cancellation_fee,
+            "refund_amount": context["total"] - cancellation_fee
+        })
+    return {**context, "refund_section_html": refund_section_html}
+
+register(
+    "order_cancellation",
+    subject="Order Cancelled - #{order_id}",
+    body=_layout("😔 Order Cancelled", "#dc2626", '''<p>Dear {customer_name},</p>
+                <p><strong>Sorry to see you go!</strong> Your order <strong>#{order_id}</strong> has been cancelled.</p>
+
+                <div style="background-color: #fef2f2; padding: 20px; border-radius: 8px; margin: 20px 0;">
+                    <h3 style="color: #dc2626; margin: 0;">Order Details</h3>
+                    <p style="margin-top: 15px;">
+                        <strong>Order ID:</strong> {order_id}<br>
+                        <strong>Tracking Code:</strong> {tracking_code}<br>
+                        <strong>Total Amount:</strong> Rs.{total}
+                    </p>
+                </div>
+
+                {refund_section_html}
+
+                <div style="background-color: #fef3c7; padding: 15px; border-radius: 8px; margin: 20px 0;">
+                    <h4 style="margin-top: 0;">📞 Need Help?</h4>
+                    <p>If you have any questions about this cancellation or would like to place a new order, please contact us:</p>
+                    <p><strong>Phone:</strong> 9985116385</p>
+                </div>
+
+                <p style="margin-top: 30px; text-align: center;">
+                    We hope to serve you again soon!
+                </p>''', signoff='''Thank you for your understanding<br>
+                    Anantha Home Foods 💚'''),
+    build_context=_order_cancellation_context
+)
+
+register(
+    "payment_completion",
+    subject="Payment Received - Order #{order_id}",
+    body=_layout(" Payment Confirmed!", "#16a34a", f'''<p>Dear {{customer_name}},</p>
+                <p>We have successfully received your payment for order <strong>#{{order_id}}</strong>.</p>
+
+                <div style="background-color: #f0fdf4; padding: 20px; border-radius: 8px; margin: 20px 0; text-align: center;">
+                    <h3 style="color: #16a34a; margin: 0; font-size: 24px;">
+                         Payment Complete
+                    </h3>
+                    <p style="margin-top: 15px; font-size: 18px; color: #166534;">
+                        <strong>Rs.{{total}}</strong>
+                    </p>
+                </div>
+
+                <div style="background-color: #fff7ed; padding: 20px; border-radius: 8px; margin: 20px 0;">
+                    <h3 style="color: #ea580c; margin: 0;">📦 Order Status</h3>
+                    <p style="margin-top: 15px;">
+                        <strong>Order ID:</strong> {{order_id}}<br>
+                        <strong>Tracking Code:</strong> {{tracking_code}}<br>
+                        <strong>Status:</strong> Confirmed
+                    </p>
+                    <p style="margin-top: 10px; color: #9a3412;">
+                        Your order is now confirmed and will be processed for delivery!
+                    </p>
+                </div>
+
+                <div style="background-color: #fef3c7; padding: 15px; border-radius: 8px; margin: 20px 0;">
+                    <h4 style="margin-top: 0;"> Track Your Order</h4>
+                    <p>You can track your order anytime using:</p>
+                    <ul>
+                        <li>Your phone number: {{phone}}</li>
+                        <li>Tracking code: {{tracking_code}}</li>
+                    </ul>
+                </div>
+
+                {_contact(margin_top=20)}''', signoff='''Thank you for your order!<br>
+                    Anantha Home Foods 💚'''),
+    build_context=lambda order: _order_context(order, default_name="Valued Customer")
+)
+
+# ============= CITY TEMPLATES =============
+
+def _city_context(city_data: dict) -> dict:
+    return {
+        "customer_name": city_data.get("customer_name") or "Valued Customer",
+        "city": city_data["city"],
+        "state": city_data.get("state", "")
+    }
+
+register(
+    "city_approval",
+    subject="Great News! We now deliver to {city}! ",
+    body=_layout(" Exciting News!", "#16a34a", f'''<p>Dear {{customer_name}},</p>
+                <p>We're thrilled to inform you that we now deliver to <strong>{{city}}, {{state}}</strong>!</p>
+
+                <div style="background-color: #f0fdf4; padding: 20px; border-radius: 8px; margin: 20px 0; text-align: center;">
+                    <h3 style="color: #16a34a; margin: 0; font-size: 24px;">
+                         City Added
+                    </h3>
+                    <p style="margin-top: 15px; font-size: 18px; color: #166534;">
+                        <strong>{{city}}, {{state}}</strong>
+                    </p>
+                </div>
+
+                <div style="background-color: #fff7ed; padding: 15px; border-radius: 8px; margin: 20px 0;">
+                    <h3 style="color: #ea580c; margin-top: 0;"> Delivery Information</h3>
+                    <p>Thanks to your suggestion, we've added {{city}} to our delivery locations!</p>
+                    <p>You can now enjoy our delicious traditional foods delivered right to your doorstep.</p>
+                </div>
+
+                <div style="background-color: #fef3c7; padding: 15px; border-radius: 8px; margin: 20px 0;">
+                    <h4 style="margin-top: 0;"> Start Shopping!</h4>
+                    <p>Visit our website to browse our complete collection of:</p>
+                    {PRODUCT_RANGE}
+                    <p>All made with authentic ingredients and traditional recipes!</p>
+                </div>
+
+                <p style="margin-top: 30px; text-align: center;">
+                    <strong>Ready to place your first order?</strong><br>
+                    Visit our website and start shopping today!
+                </p>
+
+                {_contact(margin_top=20)}'''),
+    build_context=_city_context
+)
+
+CITY_REFUND_SECTION = compile_template('''
+                <div style="background-color: #fef2f2; padding: 20px; border-radius: 8px; margin: 20px 0; border: 2px solid #fca5a5;">
+                    <h3 style="color: #dc2626; margin: 0;"> Refund Information</h3>
+                    <p style="margin-top: 15px; font-weight: bold;">
+                        Since you have already made a payment for delivery to {city}, we will process a full refund.
+                    </p>
+                    <p>
+                        <strong>Refund Timeline:</strong> Your payment will be refunded within 2-3 working days.
+                    </p>
+                    <p style="background-color: #fee2e2; padding: 15px; border-radius: 6px; margin-top: 10px;">
+                        <strong> IMPORTANT:</strong> Please reply to this email with your UPI details so we can process the refund quickly:
+                    </p>
+                    <ul style="margin: 10px 0 0 20px;">
+                        <li>UPI ID (e.g., yourname@paytm, yourname@okaxis)</li>
+                        <li>Or Bank Account details (Account Number, IFSC Code, Account Holder Name)</li>
+                    </ul>
+                </div>
+            ''', "city_rejection refund")
+
+def _city_rejection_context(city_data: dict, has_payment: bool = False) -> dict:
+    context = _city_context(city_data)
+    context["refund_section_html"] = CITY_REFUND_SECTION(context) if has_payment else ""
+    return context
+
+register(
+    "city_rejection",
+    subject="Update on Your City Request - {city}",
+    body=_layout("Update on Your Delivery Request", "#ea580c", '''<p>Dear {customer_name},</p>
+                <p>Thank you for your interest in getting Anantha Home Foods delivered to <strong>{city}, {state}</strong>.</p>
+
+                <div style="background-color: #fff7ed; padding: 20px; border-radius: 8px; margin: 20px 0;">
+                    <h3 style="color: #ea580c; margin: 0;"> Current Status</h3>
+                    <p style="margin-top: 15px;">
+                        We appreciate your suggestion! Unfortunately, we are not able to deliver to <strong>{city}</strong> at this time due to logistical constraints.
+                    </p>
+                </div>
+
+                {refund_section_html}
+
+                <div style="background-color: #fef3c7; padding: 15px; border-radius: 8px; margin: 20px 0;">
+                    <h4 style="margin-top: 0;">🔔 Stay Updated</h4>
+                    <p>We're constantly expanding our delivery network! If there's enough demand from your area, we'll definitely consider adding {city} in the future.</p>
+                    <p>We'll keep your request on file and notify you if we start delivering to your area.</p>
+                </div>
+
+                <div style="background-color: #f0fdf4; padding: 15px; border-radius: 8px; margin: 20px 0;">
+                    <h4 style="margin-top: 0;">💡 Alternative Options</h4>
+                    <p>In the meantime, you might consider:</p>
+                    <ul style="margin: 10px 0;">
+                        <li>Checking if we deliver to nearby cities</li>
+                        <li>Arranging a bulk order for delivery to a nearby location</li>
+                        <li>Following us on social media for expansion updates</li>
+                    </ul>
+                </div>
+
+                <p style="margin-top: 30px;">If you have any questions or would like to discuss alternatives, feel free to contact us at <strong>9985116385</strong></p>''',
+                 signoff='''Thank you for your understanding and interest in Anantha Home Foods!<br>
+                    Handcrafted with love and tradition 💚'''),
+    build_context=_city_rejection_context
+)
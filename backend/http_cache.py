@@ -0,0 +1,120 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional - gzip is still served without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Invalidation only reaches this process - writes made by other workers show up once cached data ages out
+CACHE_MAX_AGE_SECONDS = int(os.environ.get('CACHE_MAX_AGE_SECONDS', '60'))
+
+
+class EncodedBody:
+    """A JSON response body encoded once, with its ETag and precompressed variants"""
+
+    __slots__ = ("etag", "identity", "gzip", "br")
+
+    def __init__(self, data):
+        # Same encoding FastAPI's JSONResponse uses, so clients see identical JSON
+        self.identity = json.dumps(
+            jsonable_encoder(data),
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":")
+        ).encode("utf-8")
+        self.etag = '"' + hashlib.sha256(self.identity).hexdigest()[:32] + '"'
+        self.gzip = gzip.compress(self.identity, compresslevel=6)
+        self.br = brotli.compress(self.identity) if brotli else None
+
+
+def _accepts_encoding(accept_encoding: str, coding: str) -> bool:
+    for part in accept_encoding.split(","):
+        token, _, params = part.partition(";")
+        if token.strip().lower() != coding:
+            continue
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+def encoded_response(request, body: EncodedBody) -> Response:
+    """304 when the client already has this body, otherwise the best precompressed variant"""
+    headers = {
+        "ETag": body.etag,
+        "Vary": "Accept-Encoding",
+        # Clients may keep the body but must revalidate - a 304 costs no JSON encoding
+        "Cache-Control": "no-cache"
+    }
+
+    if _etag_matches(request.headers.get("if-none-match", ""), body.etag):
+        return Response(status_code=304, headers=headers)
+
+    accept_encoding = request.headers.get("accept-encoding", "")
+    if body.br is not None and _accepts_encoding(accept_encoding, "br"):
+        headers["Content-Encoding"] = "br"
+        content = body.br
+    elif _accepts_encoding(accept_encoding, "gzip"):
+        headers["Content-Encoding"] = "gzip"
+        content = body.gzip
+    else:
+        content = body.identity
+
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+# Encoded bodies for small reference-data endpoints, keyed by name
+_bodies = {}
+_generations = {}
+
+
+def invalidate_body(*names):
+    """Drop cached bodies after the data behind them changed"""
+    for name in names:
+        _generations[name] = _generations.get(name, 0) + 1
+        _bodies.pop(name, None)
+
+
+async def get_or_build_body(name: str, builder, version=None) -> EncodedBody:
+    """Return the cached encoded body for name, rebuilding it with builder() when stale.
+
+    version lets a body depend on another cache's version (e.g. the catalog version).
+    Bodies are also rebuilt once they are CACHE_MAX_AGE_SECONDS old.
+    """
+    cached = _bodies.get(name)
+    if cached and cached[0] == version and time.monotonic() - cached[2] < CACHE_MAX_AGE_SECONDS:
+        return cached[1]
+
+    generation = _generations.get(name, 0)
+    built_at = time.monotonic()
+    body = EncodedBody(await builder())
+
+    # Only keep it if nothing was invalidated while we were reading
+    if _generations.get(name, 0) == generation:
+        _bodies[name] = (version, body, built_at)
+    return body
@@ -0,0 +1,101 @@
+import logging
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# How many recent inventory transaction IDs each product remembers for rollbacks
+INVENTORY_TXN_WINDOW = 50
+
+# Projection for product reads that leave the server - inventory_txns is internal rollback bookkeeping
+PRODUCT_PROJECTION = {"_id": 0, "inventory_txns": 0}
+
+
+class InsufficientInventory(Exception):
+    """Raised when at least one product could not cover the requested quantity"""
+
+    def __init__(self, product_ids):
+        self.product_ids = list(product_ids)
+        super().__init__(f"Insufficient inventory for products: {', '.join(self.product_ids)}")
+
+
+def aggregate_quantities(items) -> dict:
+    """Sum quantities per product - different weights of one product share its inventory"""
+    quantities = {}
+    for item in items:
+        quantities[item["product_id"]] = quantities.get(item["product_id"], 0) + item["quantity"]
+    return quantities
+
+
+async def fetch_products_by_id(db, product_ids, projection=None) -> dict:
+    """Load several products with a single $in query, keyed by product id"""
+    unique_ids = list(dict.fromkeys(product_ids))
+    if not unique_ids:
+        return {}
+    products = await db.products.find(
+        {"id": {"$in": unique_ids}},
+        projection or PRODUCT_PROJECTION
+    ).to_list(len(unique_ids))
+    return {product["id"]: product for product in products}
+
+
+async def decrement_inventory(db, quantities: dict, txn_id: str):
+    """Atomically take quantities from inventory for every product, or for none of them.
+
+    Each product gets a conditional $inc guarded by inventory_count >= quantity, and all of
+    them go out in one bulk_write. Every successful decrement also records txn_id on the
+    product, so a partial failure can be rolled back without touching other orders' stock.
+    """
+    if not quantities:
+        return
+
+    operations = [
+        UpdateOne(
+            {"id": product_id, "inventory_count": {"$gte": quantity}},
+            {
+                "$inc": {"inventory_count": -quantity},
+                "$push": {"inventory_txns": {"$each": [txn_id], "$slice": -INVENTORY_TXN_WINDOW}}
+            }
+        )
+        for product_id, quantity in quantities.items()
+    ]
+    result = await db.products.bulk_write(operations, ordered=False)
+
+    if result.modified_count < len(operations):
+        await restore_inventory(db, quantities, txn_id)
+
+        # Work out which products fell short, for the error message
+        products = await db.products.find(
+            {"id": {"$in": list(quantities)}},
+            {"_id": 0, "id": 1, "inventory_count": 1}
+        ).to_list(None)
+        counts = {product["id"]: product.get("inventory_count") for product in products}
+        short = [
+            product_id for product_id, quantity in quantities.items()
+            if counts.get(product_id) is None or counts[product_id] < quantity
+        ]
+        raise InsufficientInventory(short or list(quantities))
+
+    # Mark products that just sold out; out_of_stock_auto lets a later restock undo it
+    await db.products.update_many(
+        {"id": {"$in": list(quantities)}, "inventory_count": {"$lte": 0}, "out_of_stock": {"$ne": True}},
+        {"$set": {"out_of_stock": True, "out_of_stock_auto": True}}
+    )
+
+
+async def restore_inventory(db, quantities: dict, txn_id: str) -> int:
+    """Give back stock taken by decrement_inventory for txn_id; returns how many products were restored"""
+    if not quantities:
+        return 0
+
+    operations = [
+        UpdateOne(
+            {"id": product_id, "inventory_txns": txn_id},
+            {"$inc": {"inventory_count": quantity}, "$pull": {"inventory_txns": txn_id}}
+        )
+        for product_id, quantity in quantities.items()
+    ]
+    result = await db.products.bulk_write(operations, ordered=False)
+    if result.modified_count:
+        logger.info(f"Restored inventory for {result.modified_count} products (txn {txn_id})")
+    return result.modified_count
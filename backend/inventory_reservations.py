@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timezone, timedelta
+
+from pymongo import UpdateOne
+
+from inventory import InsufficientInventory, aggregate_quantities, decrement_inventory
+
+logger = logging.getLogger(__name__)
+
+# How long stock stays held for an order that has not been paid yet
+HOLD_MINUTES = int(os.environ.get('INVENTORY_HOLD_MINUTES', '30'))
+
+SWEEP_INTERVAL_SECONDS = 60
+SWEEP_BATCH_SIZE = 200
+
+# A release that was claimed but never finished (e.g. the process died) is retried after this
+STALE_CLAIM_MINUTES = 10
+
+
+async def place_holds(db, order_id: str, quantities: dict, hold_minutes: int = None):
+    """Record a time-limited hold for every product whose stock this order took"""
+    if not quantities:
+        return
+
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(minutes=hold_minutes or HOLD_MINUTES)
+    await db.inventory_reservations.insert_many([
+        {
+            "id": str(uuid.uuid4()),
+            "order_id": order_id,
+            "product_id": product_id,
+            "quantity": quantity,
+            "status": "held",
+            "created_at": now,
+            "expires_at": expires_at
+        }
+        for product_id, quantity in quantities.items()
+    ])
+
+
+async def commit_holds(db, order_id: str) -> int:
+    """Make an order's holds permanent once it is paid; returns how many were committed"""
+    result = await db.inventory_reservations.update_many(
+        {"order_id": order_id, "status": "held"},
+        {"$set": {"status": "committed", "committed_at": datetime.now(timezone.utc)}}
+    )
+    return result.modified_count
+
+
+async def reclaim_lapsed_holds(db, order_id: str) -> int:
+    """Take stock again for holds the sweeper expired, committing them to the order.
+
+    For an order paid after its hold lapsed. Raises InsufficientInventory, leaving the holds
+    expired, when that stock has been sold since; returns how many holds were reclaimed.
+    """
+    claim_token = str(uuid.uuid4())
+    await db.inventory_reservations.update_many(
+        {"order_id": order_id, "status": "expired"},
+        {"$set": {"status": "reclaiming", "claim_token": claim_token, "claimed_at": datetime.now(timezone.utc)}}
+    )
+    claimed = await db.inventory_reservations.find(
+        {"claim_token": claim_token},
+        {"_id": 0, "product_id": 1, "quantity": 1}
+    ).to_list(None)
+    if not claimed:
+        return 0
+
+    try:
+        # The claim token doubles as the inventory transaction, so a failed take rolls back only itself
+        await decrement_inventory(db, aggregate_quantities(claimed), claim_token)
+    except InsufficientInventory:
+        await db.inventory_reservations.update_many(
+            {"claim_token": claim_token},
+            {"$set": {"status": "expired"}, "$unset": {"claim_token": "", "claimed_at": ""}}
+        )
+        logger.warning(f"Order {order_id} was paid after its inventory hold expired and the stock is gone")
+        raise
+
+    await db.inventory_reservations.update_many(
+        {"claim_token": claim_token},
+        {"$set": {"status": "committed", "committed_at": datetime.now(timezone.utc)}, "$unset": {"claim_token": ""}}
+    )
+    await db.orders.update_one({"order_id": order_id}, {"$unset": {"inventory_hold_lapsed": ""}})
+    logger.info(f"Order {order_id} was paid after its inventory hold expired - reclaimed {len(claimed)} holds")
+    return len(claimed)
+
+
+async def commit_many_holds(db, order_ids: list) -> int:
+    """commit_holds for several orders with one update_many; returns how many holds were committed"""
+    if not order_ids:
+        return 0
+    result = await db.inventory_reservations.update_many(
+        {"order_id": {"$in": list(order_ids)}, "status": "held"},
+        {"$set": {"status": "committed", "committed_at": datetime.now(timezone.utc)}}
+    )
+    return result.modified_count
+
+
+async def discard_holds(db, order_id: str) -> int:
+    """Delete an order's holds without restocking - for an order that was never stored,
+    whose stock the caller gives back itself"""
+    result = await db.inventory_reservations.delete_many({"order_id": order_id, "status": "held"})
+    return result.deleted_count
+
+
+async def release_holds(db, order_id: str, include_committed: bool = False) -> int:
+    """Return an order's reserved stock (on cancellation); returns how many products were restocked"""
+    statuses = ["held", "committed"] if include_committed else ["held"]
+    claim_token = str(uuid.uuid4())
+    await db.inventory_reservations.update_many(
+        {"order_id": order_id, "status": {"$in": statuses}},
+        {"$set": {"status": "releasing", "claim_token": claim_token, "claimed_at": datetime.now(timezone.utc)}}
+    )
+    return await _restock_claimed(db, claim_token, final_status="released")
+
+
+async def _restock_claimed(db, claim_token: str, final_status: str) -> int:
+    # Only reservations this caller claimed are restocked, so concurrent releases never double-count
+    claimed = await db.inventory_reservations.find(
+        {"claim_token": claim_token},
+        {"_id": 0, "product_id": 1, "quantity": 1}
+    ).to_list(None)
+    if not claimed:
+        return 0
+
+    quantities = {}
+    for reservation in claimed:
+        quantities[reservation["product_id"]] = quantities.get(reservation["product_id"], 0) + reservation["quantity"]
+
+    await db.products.bulk_write([
+        UpdateOne({"id": product_id, "inventory_count": {"$ne": None}}, {"$inc": {"inventory_count": quantity}})
+        for product_id, quantity in quantities.items()
+    ], ordered=False)
+
+    # Products that only sold out because of these orders are back in stock
+    await db.products.update_many(
+        {"id": {"$in": list(quantities)}, "inventory_count": {"$gt": 0}, "out_of_stock_auto": True},
+        {"$set": {"out_of_stock": False}, "$unset": {"out_of_stock_auto": ""}}
+    )
+
+    await db.inventory_reservations.update_many(
+        {"claim_token": claim_token},
+        {"$set": {"status": final_status, "released_at": datetime.now(timezone.utc)}, "$unset": {"claim_token": ""}}
+    )
+    return len(quantities)
+
+
+class ReservationSweeper:
+    """Background task that returns stock held by orders that were never paid.
+
+    Orders whose holds it expires are flagged inventory_hold_lapsed, so a late payment
+    knows to reclaim the stock with reclaim_lapsed_holds.
+    """
+
+    def __init__(self, db, on_change=None):
+        self.db = db
+        self.on_change = on_change
+        self._task = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Inventory reservation sweep failed: {str(e)}")
+            await asyncio.sleep(SWEEP_INTERVAL_SECONDS)
+
+    async def sweep(self) -> int:
+        """Release expired holds in batches; returns how many reservations were released"""
+        released = 0
+        while True:
+            now = datetime.now(timezone.utc)
+            due = {"$or": [
+                {"status": "held", "expires_at": {"$lte": now}},
+                {"status": "releasing", "claimed_at": {"$lte": now - timedelta(minutes=STALE_CLAIM_MINUTES)}}
+            ]}
+            batch = await self.db.inventory_reservations.find(
+                due, {"_id": 0, "id": 1}
+            ).limit(SWEEP_BATCH_SIZE).to_list(SWEEP_BATCH_SIZE)
+            if not batch:
+                break
+
+            # Re-check the due condition while claiming, in case a cancellation got there first
+            claim_token = str(uuid.uuid4())
+            claim = await self.db.inventory_reservations.update_many(
+                {"id": {"$in": [reservation["id"] for reservation in batch]}, **due},
+                {"$set": {"status": "releasing", "claim_token": claim_token, "claimed_at": now}}
+            )
+            order_ids = await self.db.inventory_reservations.distinct("order_id", {"claim_token": claim_token})
+            await _restock_claimed(self.db, claim_token, final_status="expired")
+            released += claim.modified_count
+            if order_ids:
+                await self.db.orders.update_many(
+                    {"order_id": {"$in": order_ids}, "cancelled": {"$ne": True}},
+                    {"$set": {"inventory_hold_lapsed": True}}
+                )
+
+            if len(batch) < SWEEP_BATCH_SIZE:
+                break
+
+        if released:
+            logger.info(f"Released {released} expired inventory holds")
+            if self.on_change:
+                self.on_change()
+        return released
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+
+from pymongo import UpdateOne
+
+from catalog_cache import CACHE_MAX_AGE_SECONDS
+from cities_data import ANDHRA_PRADESH_CITIES, TELANGANA_CITIES
+
+logger = logging.getLogger(__name__)
+
+# Fields kept in memory for checkout's delivery charge calculation
+CHARGE_FIELDS = ("name", "state", "charge", "free_delivery_threshold")
+
+
+def location_key(value) -> str:
+    """Lowercased, trimmed, single-spaced form used to match city and state names"""
+    return " ".join(str(value or "").split()).lower()
+
+
+def default_state(city_name: str) -> str:
+    """State for a location stored without one"""
+    if city_name in ANDHRA_PRADESH_CITIES:
+        return "Andhra Pradesh"
+    if city_name in TELANGANA_CITIES:
+        return "Telangana"
+    return "Andhra Pradesh"
+
+
+def location_keys(name: str, state: str) -> dict:
+    return {"name_key": location_key(name), "state_key": location_key(state or default_state(name))}
+
+
+class LocationIndex:
+    """In-memory map of (name_key, state_key) to a delivery location's charge settings.
+
+    Checkout resolves the customer's city here instead of running case-insensitive
+    regex queries against the locations collection. Locations added by another worker
+    are picked up by a single indexed lookup on a miss; their charge changes and
+    deletions once the map is older than CACHE_MAX_AGE_SECONDS and gets reloaded.
+    """
+
+    def __init__(self):
+        self.locations = {}
+        self.loaded = False
+        self.loaded_at = None
+        self._load_lock = asyncio.Lock()
+
+    async def load(self, db):
+        """Backfill missing name_key/state_key fields and rebuild the map"""
+        locations = await db.locations.find(
+            {}, {"_id": 1, "name_key": 1, "state_key": 1, **{field: 1 for field in CHARGE_FIELDS}}
+        ).to_list(None)
+
+        backfill = []
+        self.locations = {}
+        for location in locations:
+            keys = location_keys(location.get("name"), location.get("state"))
+            if location.get("name_key") != keys["name_key"] or location.get("state_key") != keys["state_key"]:
+                backfill.append(UpdateOne({"_id": location["_id"]}, {"$set": keys}))
+            self._store(keys, location)
+
+        if backfill:
+            await db.locations.bulk_write(backfill, ordered=False)
+            logger.info(f"Backfilled name_key/state_key on {len(backfill)} locations")
+
+        self.loaded = True
+        self.loaded_at = time.monotonic()
+        logger.info(f"Location index loaded: {len(self.locations)} locations")
+
+    def is_stale(self) -> bool:
+        return not self.loaded or time.monotonic() - self.loaded_at >= CACHE_MAX_AGE_SECONDS
+
+    async def refresh_if_stale(self, db):
+        """Reload once when the map has aged out - concurrent callers wait for that one load"""
+        if not self.is_stale():
+            return
+        async with self._load_lock:
+            if self.is_stale():
+                await self.load(db)
+
+    def _store(self, keys: dict, location: dict):
+        settings = {field: location.get(field) for field in CHARGE_FIELDS}
+        settings["state"] = settings["state"] or default_state(settings["name"])
+        self.locations[(keys["name_key"], keys["state_key"])] = settings
+
+    async def resolve(self, db, city: str, state: str):
+        """Charge settings for a city, or None if it is not a delivery location"""
+        key = (location_key(city), location_key(state))
+        if not key[0] or not key[1]:
+            return None
+
+        await self.refresh_if_stale(db)
+        settings = self.locations.get(key)
+        if settings is None:
+            location = await db.locations.find_one(
+                {"name_key": key[0], "state_key": key[1]},
+                {"_id": 0, **{field: 1 for field in CHARGE_FIELDS}}
+            )
+            if location is None:
+                return None
+            self._store({"name_key": key[0], "state_key": key[1]}, location)
+            settings = self.locations[key]
+        return dict(settings)
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from pathlib import Path
+
+from smtp_pool import SMTPPool
+
+logger = logging.getLogger(__name__)
+
+SENDER_NAME = 'Anantha Home Foods'
+
+MAIL_MAX_CONCURRENCY = int(os.environ.get('MAIL_MAX_CONCURRENCY', '4'))
+MAIL_SEND_TIMEOUT_SECONDS = float(os.environ.get('MAIL_SEND_TIMEOUT_SECONDS', '30'))
+
+
+class MailNotConfigured(Exception):
+    """Raised when a transport is missing the credentials it needs"""
+
+
+class OutgoingEmail:
+    """A rendered email, independent of how it is delivered"""
+
+    __slots__ = ("to_email", "subject", "html")
+
+    def __init__(self, to_email: str, subject: str, html: str):
+        self.to_email = to_email
+        self.subject = subject
+        self.html = html
+
+    def to_mime(self, from_address: str) -> MIMEMultipart:
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = self.subject
+        msg['From'] = f'{SENDER_NAME} <{from_address}>'
+        msg['To'] = self.to_email
+        msg.attach(MIMEText(self.html, 'html'))
+        return msg
+
+
+class MailTransport:
+    """Async mail transport with a concurrency limit and a per-send timeout.
+
+    Subclasses implement _send(); anything blocking in there must go through
+    asyncio.to_thread so the event loop never waits on the network.
+    """
+
+    name = "base"
+
+    def __init__(self, max_concurrency: int = MAIL_MAX_CONCURRENCY, timeout: float = MAIL_SEND_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def send(self, email: OutgoingEmail):
+        async with self._semaphore:
+            await asyncio.wait_for(self._send(email), timeout=self.timeout)
+
+    async def _send(self, email: OutgoingEmail):
+        raise NotImplementedError
+
+    def close(self):
+        """Release connections; blocking, so call it from a thread"""
+
+
+class SMTPTransport(MailTransport):
+    """Gmail (or any SMTP server) over a pool of long-lived sessions"""
+
+    name = "smtp"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.username = os.environ.get('GMAIL_EMAIL', '')
+        self.password = os.environ.get('GMAIL_APP_PASSWORD', '')
+        self.pool = SMTPPool(
+            host=os.environ.get('SMTP_HOST', 'smtp.gmail.com'),
+            port=int(os.environ.get('SMTP_PORT', '465')),
+            use_ssl=os.environ.get('SMTP_USE_SSL', 'true').lower() == 'true',
+            username=self.username,
+            password=self.password,
+            size=int(os.environ.get('SMTP_POOL_SIZE', str(MAIL_MAX_CONCURRENCY))),
+            timeout=self.timeout
+        )
+
+    async def _send(self, email: OutgoingEmail):
+        if not self.username or not self.password:
+            raise MailNotConfigured("Gmail credentials not configured")
+        await asyncio.to_thread(self.pool.send_message, email.to_mime(self.username))
+
+    def close(self):
+        self.pool.close()
+
+
+class SendGridTransport(MailTransport):
+    """SendGrid's HTTP API; the client is synchronous, so each call runs in a thread"""
+
+    name = "sendgrid"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.api_key = os.environ.get('SENDGRID_API_KEY', '')
+        self.from_email = os.environ.get('FROM_EMAIL', 'noreply@ananthalakshmi.com')
+        self._client = None
+
+    async def _send(self, email: OutgoingEmail):
+        if not self.api_key:
+            raise MailNotConfigured("SendGrid API key not configured")
+        await asyncio.to_thread(self._send_blocking, email)
+
+    def _send_blocking(self, email: OutgoingEmail):
+        from sendgrid import SendGridAPIClient
+        from sendgrid.helpers.mail import Mail
+
+        if self._client is None:
+            self._client = SendGridAPIClient(self.api_key)
+        response = self._client.send(Mail(
+            from_email=(self.from_email, SENDER_NAME),
+            to_emails=email.to_email,
+            subject=email.subject,
+            html_content=email.html
+        ))
+        if response.status_code >= 300:
+            raise RuntimeError(f"SendGrid returned status {response.status_code}")
+
+
+class FileTransport(MailTransport):
+    """Writes each email as an .eml file - for local development"""
+
+    name = "file"
+
+    def __init__(self, directory: str = None, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = Path(directory or os.environ.get('MAIL_FILE_DIR', '/tmp/anantha-mail'))
+
+    async def _send(self, email: OutgoingEmail):
+        await asyncio.to_thread(self._write, email)
+
+    def _write(self, email: OutgoingEmail):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        filename = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.eml"
+        (self.directory / filename).write_bytes(email.to_mime('noreply@localhost').as_bytes())
+
+
+class MemoryTransport(MailTransport):
+    """Keeps sent emails in a list - a zero-latency fake for tests and load tests"""
+
+    name = "memory"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.outbox = []
+
+    async def _send(self, email: OutgoingEmail):
+        self.outbox.append(email)
+
+
+TRANSPORTS = {transport.name: transport for transport in (SMTPTransport, SendGridTransport, FileTransport, MemoryTransport)}
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(name: str = None) -> MailTransport:
+    """The shared transport for name, or for MAIL_TRANSPORT (default smtp) when name is None"""
+    name = name or os.environ.get('MAIL_TRANSPORT', 'smtp').lower()
+    with _transports_lock:
+        if name not in _transports:
+            if name not in TRANSPORTS:
+                raise ValueError(f"Unknown MAIL_TRANSPORT: {name}")
+            _transports[name] = TRANSPORTS[name]()
+            logger.info(f"Using {name} mail transport")
+        return _transports[name]
+
+
+def set_transport(transport: MailTransport, name: str = None):
+    """Install a transport (e.g. a MemoryTransport in tests) in place of the configured one"""
+    name = name or os.environ.get('MAIL_TRANSPORT', 'smtp').lower()
+    with _transports_lock:
+        _transports[name] = transport
+
+
+def close_transports():
+    """Close every transport that was created; blocking, so call it from a thread"""
+    with _transports_lock:
+        transports = list(_transports.values())
+        _transports.clear()
+    for transport in transports:
+        transport.close()
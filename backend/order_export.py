@@ -0,0 +1,232 @@
+"""Order export for accounting: one row per order line item, as CSV or Parquet.
+
+Orders are read in date-range chunks with a cursor and written out batch by batch, so
+memory use does not grow with the number of orders exported.
+
+    python order_export.py --month 2026-03 --format parquet --output orders-2026-03.parquet
+    python order_export.py --from 2026-01-01 --to 2026-04-01 --output q1.csv
+"""
+import argparse
+import asyncio
+import csv
+import io
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from timestamps import as_utc
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_DAYS = int(os.environ.get('EXPORT_CHUNK_DAYS', '7'))
+EXPORT_BATCH_ROWS = int(os.environ.get('EXPORT_BATCH_ROWS', '1000'))
+
+EXPORT_FORMATS = ("csv", "parquet")
+
+# (column, pyarrow type name) - order fields first, then the line item
+EXPORT_COLUMNS = [
+    ("order_id", "string"),
+    ("created_at", "timestamp"),
+    ("customer_name", "string"),
+    ("email", "string"),
+    ("phone", "string"),
+    ("city", "string"),
+    ("state", "string"),
+    ("pincode", "string"),
+    ("payment_method", "string"),
+    ("payment_sub_method", "string"),
+    ("payment_status", "string"),
+    ("order_status", "string"),
+    ("cancelled", "bool"),
+    ("subtotal", "float64"),
+    ("delivery_charge", "float64"),
+    ("total", "float64"),
+    ("product_id", "string"),
+    ("product_name", "string"),
+    ("weight", "string"),
+    ("unit_price", "float64"),
+    ("quantity", "int64"),
+    ("line_total", "float64")
+]
+COLUMN_NAMES = [name for name, _ in EXPORT_COLUMNS]
+
+ORDER_FIELDS = COLUMN_NAMES[:COLUMN_NAMES.index("product_id")]
+EXPORT_PROJECTION = {"_id": 0, "items": 1, **{field: 1 for field in ORDER_FIELDS}}
+
+
+class ExportUnavailable(RuntimeError):
+    pass
+
+
+def order_rows(order: dict) -> list:
+    """Flatten an order to one row per line item (one row with empty item columns if it has none)"""
+    base = {field: order.get(field) for field in ORDER_FIELDS}
+    base["cancelled"] = bool(base["cancelled"])
+    items = order.get("items") or [None]
+
+    rows = []
+    for item in items:
+        row = dict(base)
+        if item:
+            price = item.get("price") or 0
+            quantity = item.get("quantity") or 0
+            row.update({
+                "product_id": item.get("product_id"),
+                "product_name": item.get("name"),
+                "weight": item.get("weight"),
+                "unit_price": price,
+                "quantity": quantity,
+                "line_total": round(price * quantity, 2)
+            })
+        else:
+            row.update({"product_id": None, "product_name": None, "weight": None,
+                        "unit_price": None, "quantity": None, "line_total": None})
+        rows.append(row)
+    return rows
+
+
+def date_chunks(date_from: datetime, date_to: datetime, days: int = EXPORT_CHUNK_DAYS):
+    """Consecutive [start, end) windows covering [date_from, date_to)"""
+    start = date_from
+    while start < date_to:
+        end = min(start + timedelta(days=days), date_to)
+        yield start, end
+        start = end
+
+
+async def export_bounds(db, date_from: datetime = None, date_to: datetime = None) -> tuple:
+    """Resolve open-ended bounds to the first order and now"""
+    if date_from is None:
+        first = await db.orders.find_one({"created_at": {"$type": "date"}}, {"_id": 0, "created_at": 1}, sort=[("created_at", 1)])
+        date_from = first["created_at"] if first else datetime.now(timezone.utc)
+    if date_to is None:
+        date_to = datetime.now(timezone.utc) + timedelta(seconds=1)
+    return as_utc(date_from), as_utc(date_to)
+
+
+async def iter_row_batches(db, date_from: datetime, date_to: datetime, batch_rows: int = EXPORT_BATCH_ROWS):
+    """Yield lists of at most ~batch_rows export rows, oldest order first"""
+    batch = []
+    for start, end in date_chunks(date_from, date_to):
+        cursor = db.orders.find(
+            {"created_at": {"$gte": start, "$lt": end}}, EXPORT_PROJECTION
+        ).sort([("created_at", 1), ("order_id", 1)]).batch_size(batch_rows)
+        async for order in cursor:
+            batch.extend(order_rows(order))
+            if len(batch) >= batch_rows:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+# ============= CSV =============
+
+def _csv_text(rows: list, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMN_NAMES)
+    if header:
+        writer.writeheader()
+    for row in rows:
+        writer.writerow({**row, "created_at": row["created_at"].isoformat() if row["created_at"] else ""})
+    return buffer.getvalue()
+
+
+async def stream_csv(db, date_from: datetime, date_to: datetime):
+    """Async iterator of CSV text chunks, header first"""
+    yield _csv_text([], header=True)
+    async for rows in iter_row_batches(db, date_from, date_to):
+        yield _csv_text(rows)
+
+# ============= PARQUET =============
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportUnavailable("Parquet export needs pyarrow - install it or export as CSV")
+    return pyarrow
+
+
+def parquet_schema():
+    pa = _pyarrow()
+    types = {
+        "string": pa.string(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+        "bool": pa.bool_(),
+        "float64": pa.float64(),
+        "int64": pa.int64()
+    }
+    return pa.schema([(name, types[type_name]) for name, type_name in EXPORT_COLUMNS])
+
+
+async def write_parquet(db, date_from: datetime, date_to: datetime, path) -> int:
+    """Write the export to a Parquet file, one row group per batch; returns the row count"""
+    pa = _pyarrow()
+    schema = parquet_schema()
+    count = 0
+    writer = pa.parquet.ParquetWriter(str(path), schema)
+    try:
+        async for rows in iter_row_batches(db, date_from, date_to):
+            table = pa.Table.from_pylist(rows, schema=schema)
+            await asyncio.to_thread(writer.write_table, table)
+            count += len(rows)
+    finally:
+        writer.close()
+    return count
+
+
+async def write_csv(db, date_from: datetime, date_to: datetime, path) -> int:
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as output:
+        output.write(_csv_text([], header=True))
+        async for rows in iter_row_batches(db, date_from, date_to):
+            output.write(_csv_text(rows))
+            count += len(rows)
+    return count
+
+# ============= CLI =============
+
+def _parse_date(value: str) -> datetime:
+    return as_utc(datetime.fromisoformat(value))
+
+
+def _month_bounds(month: str) -> tuple:
+    start = _parse_date(f"{month}-01")
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+async def _main(args):
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    db = client[os.environ['DB_NAME']]
+    try:
+        if args.month:
+            date_from, date_to = _month_bounds(args.month)
+        else:
+            date_from, date_to = await export_bounds(
+                db, _parse_date(args.date_from) if args.date_from else None, _parse_date(args.date_to) if args.date_to else None
+            )
+        output = args.output or f"orders-{date_from:%Y%m%d}-{date_to:%Y%m%d}.{args.format}"
+        writer = write_parquet if args.format == "parquet" else write_csv
+        count = await writer(db, date_from, date_to, output)
+        print(f"Exported {count} line items ({date_from:%Y-%m-%d} to {date_to:%Y-%m-%d}) to {output}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    window = parser.add_mutually_exclusive_group()
+    window.add_argument("--month", help="calendar month, YYYY-MM")
+    window.add_argument("--from", dest="date_from", help="first day included, YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", help="first day excluded, YYYY-MM-DD")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--output", help="file to write (default: orders-<from>-<to>.<format>)")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,91 @@
+import base64
+import json
+import os
+from datetime import datetime
+
+from timestamps import as_utc
+
+ORDER_PAGE_SIZE = int(os.environ.get('ORDER_PAGE_SIZE', '50'))
+# A customer's order history returned up to 100 orders before paging existed, and its callers don't follow the cursor
+USER_ORDER_PAGE_SIZE = int(os.environ.get('USER_ORDER_PAGE_SIZE', '100'))
+MAX_ORDER_PAGE_SIZE = int(os.environ.get('MAX_ORDER_PAGE_SIZE', '200'))
+
+# Newest first; order_id breaks ties between orders created in the same instant
+ORDER_SORT = [("created_at", -1), ("order_id", -1)]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(order: dict) -> str:
+    """Opaque cursor pointing just past this order in ORDER_SORT order"""
+    created_at = order.get("created_at")
+    if isinstance(created_at, datetime):
+        position = {"t": created_at.isoformat(), "o": order["order_id"]}
+    else:
+        position = {"c": created_at, "o": order["order_id"]}
+    raw = json.dumps(position, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """(created_at, order_id) from a cursor made by encode_cursor"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        created_at = datetime.fromisoformat(position["t"]) if "t" in position else position["c"]
+        return created_at, position["o"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def after_cursor(cursor: str) -> dict:
+    """Filter matching the orders that sort after the cursor"""
+    created_at, order_id = decode_cursor(cursor)
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "order_id": {"$lt": order_id}}
+    ]}
+
+
+def order_filter(
+    status: str = None,
+    payment_status: str = None,
+    city: str = None,
+    date_from: datetime = None,
+    date_to: datetime = None,
+    custom_city: bool = None,
+    cursor: str = None
+) -> dict:
+    """Mongo filter for an order listing page; every field leads a (field, created_at, order_id) index"""
+    query = {}
+    if status:
+        query["order_status"] = status
+    if payment_status:
+        query["payment_status"] = payment_status
+    if city:
+        query["city"] = city
+    if custom_city is not None:
+        query["custom_city_request"] = custom_city
+
+    created_at = {}
+    if date_from:
+        created_at["$gte"] = as_utc(date_from)
+    if date_to:
+        created_at["$lt"] = as_utc(date_to)
+    if created_at:
+        query["created_at"] = created_at
+
+    if cursor:
+        query = {"$and": [query, after_cursor(cursor)]} if query else after_cursor(cursor)
+    return query
+
+
+async def fetch_order_page(db, query: dict, limit: int = ORDER_PAGE_SIZE, projection: dict = None) -> tuple:
+    """(orders, next_cursor) - next_cursor is None on the last page"""
+    limit = max(1, min(limit, MAX_ORDER_PAGE_SIZE))
+    orders = await db.orders.find(query, projection or {"_id": 0}).sort(ORDER_SORT).limit(limit + 1).to_list(limit + 1)
+    if len(orders) <= limit:
+        return orders, None
+    orders = orders[:limit]
+    return orders, encode_cursor(orders[-1])
@@ -0,0 +1,34 @@
+"""Order status state machine used by bulk status transitions"""
+
+# Status -> statuses an order may move to next
+TRANSITIONS = {
+    "pending": {"confirmed", "processing", "cancelled"},
+    "confirmed": {"processing", "shipped", "cancelled"},
+    "processing": {"shipped", "cancelled"},
+    "shipped": {"out for delivery", "delivered"},
+    "out for delivery": {"delivered"},
+    "delivered": set(),
+    "cancelled": set()
+}
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def check_transition(old_status: str, new_status: str):
+    """Raise InvalidTransition unless an order in old_status may move to new_status"""
+    if new_status not in TRANSITIONS:
+        raise InvalidTransition(f"Unknown status '{new_status}'")
+    allowed = TRANSITIONS.get(old_status or "pending")
+    if allowed is None:
+        raise InvalidTransition(f"Order has unknown status '{old_status}'")
+    if new_status not in allowed:
+        if allowed:
+            raise InvalidTransition(f"Cannot move from '{old_status}' to '{new_status}' (allowed: {', '.join(sorted(allowed))})")
+        raise InvalidTransition(f"Order is already '{old_status}'")
+
+
+def commits_stock(status: str) -> bool:
+    """Whether an order in this status has sold its stock for good, so its inventory holds must not expire"""
+    return (status or "pending") not in ("pending", "cancelled")
@@ -0,0 +1,58 @@
+import os
+
+from cachetools import TTLCache
+
+TRACKING_CACHE_SIZE = int(os.environ.get('TRACKING_CACHE_SIZE', '5000'))
+# Short, so other workers' status changes show up quickly on a refreshing tracking page
+TRACKING_CACHE_TTL_SECONDS = int(os.environ.get('TRACKING_CACHE_TTL_SECONDS', '15'))
+
+TRACKING_RESULT_LIMIT = 100
+
+
+def tracking_query(identifier: str) -> dict:
+    """One $or over the four indexed identifiers a customer can track with"""
+    return {"$or": [
+        {"order_id": identifier},
+        {"tracking_code": identifier},
+        {"phone": identifier},
+        {"email": identifier}
+    ]}
+
+
+class TrackingCache:
+    """Short-TTL cache of tracking results keyed by the identifier the customer typed.
+
+    invalidate_order() drops every cached result containing an order as soon as this
+    process changes it; the TTL bounds staleness for changes made by other workers.
+    """
+
+    def __init__(self, maxsize: int = TRACKING_CACHE_SIZE, ttl: int = TRACKING_CACHE_TTL_SECONDS):
+        self._results = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def lookup(self, db, identifier: str) -> list:
+        """Orders for an order ID or tracking code (just that order), or a phone/email (newest first)"""
+        orders = self._results.get(identifier)
+        if orders is None:
+            orders = await db.orders.find(
+                tracking_query(identifier), {"_id": 0}
+            ).sort("created_at", -1).limit(TRACKING_RESULT_LIMIT).to_list(TRACKING_RESULT_LIMIT)
+
+            exact = [order for order in orders if identifier in (order.get("order_id"), order.get("tracking_code"))]
+            if exact:
+                orders = exact[:1]
+            if orders:
+                self._results[identifier] = orders
+        return [dict(order) for order in orders]
+
+    def invalidate_order(self, order_id: str):
+        for identifier, orders in list(self._results.items()):
+            if any(order.get("order_id") == order_id for order in orders):
+                self._results.pop(identifier, None)
+
+    def invalidate_identifiers(self, *identifiers):
+        """Drop results a new order would join (its customer's phone and email)"""
+        for identifier in identifiers:
+            self._results.pop(identifier, None)
+
+    def clear(self):
+        self._results.clear()
@@ -0,0 +1,111 @@
+import os
+from datetime import datetime
+
+from cachetools import TTLCache
+
+from timestamps import as_utc, parse_timestamp
+
+ANALYTICS_CACHE_SIZE = int(os.environ.get('ANALYTICS_CACHE_SIZE', '256'))
+# Safety net for writes made by other workers, which this process never sees
+ANALYTICS_CACHE_TTL_SECONDS = int(os.environ.get('ANALYTICS_CACHE_TTL_SECONDS', '300'))
+
+# Breakdown name -> order field it groups on
+DIMENSIONS = {
+    "city": "city",
+    "state": "state",
+    "payment_method": "payment_method",
+    "product": "items.product_id"
+}
+
+# Equality filters accepted next to the date range; each leads a (field, created_at) index
+FILTER_FIELDS = ("city", "state", "payment_method")
+
+
+class InvalidBreakdown(ValueError):
+    pass
+
+
+def build_pipeline(group_by: str, date_from: datetime = None, date_to: datetime = None,
+                   filters: dict = None, include_cancelled: bool = False) -> list:
+    """Compile a breakdown request into a $match/$group pipeline over orders"""
+    if group_by not in DIMENSIONS:
+        raise InvalidBreakdown(f"group_by must be one of: {', '.join(DIMENSIONS)}")
+
+    filters = filters or {}
+    match = {field: filters[field] for field in FILTER_FIELDS if filters.get(field)}
+    created_at = {}
+    if date_from:
+        created_at["$gte"] = as_utc(date_from)
+    if date_to:
+        created_at["$lt"] = as_utc(date_to)
+    if created_at:
+        match["created_at"] = created_at
+    if not include_cancelled:
+        match["cancelled"] = {"$ne": True}
+        match["order_status"] = {"$ne": "cancelled"}
+
+    pipeline = [{"$match": match}]
+    if group_by == "product":
+        pipeline += [
+            {"$unwind": "$items"},
+            {"$group": {
+                "_id": "$items.product_id",
+                "name": {"$first": "$items.name"},
+                "orders": {"$sum": 1},
+                "quantity": {"$sum": "$items.quantity"},
+                "sales": {"$sum": {"$multiply": ["$items.price", "$items.quantity"]}}
+            }}
+        ]
+    else:
+        pipeline.append({"$group": {
+            "_id": f"${DIMENSIONS[group_by]}",
+            "orders": {"$sum": 1},
+            "sales": {"$sum": "$total"}
+        }})
+    pipeline.append({"$sort": {"sales": -1, "_id": 1}})
+    return pipeline
+
+
+class AnalyticsCache:
+    """Breakdown results keyed by query signature.
+
+    An order write drops only the entries whose date window contains the order's
+    creation time, so a new order today leaves last quarter's reports cached.
+    """
+
+    def __init__(self, maxsize: int = ANALYTICS_CACHE_SIZE, ttl: int = ANALYTICS_CACHE_TTL_SECONDS):
+        self._results = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def signature(group_by, date_from, date_to, filters, include_cancelled) -> tuple:
+        return (
+            group_by,
+            as_utc(date_from) if date_from else None,
+            as_utc(date_to) if date_to else None,
+            tuple(sorted((field, value) for field, value in (filters or {}).items() if value)),
+            include_cancelled
+        )
+
+    async def breakdown(self, db, group_by: str, date_from: datetime = None, date_to: datetime = None,
+                        filters: dict = None, include_cancelled: bool = False) -> list:
+        cache_key = self.signature(group_by, date_from, date_to, filters, include_cancelled)
+        rows = self._results.get(cache_key)
+        if rows is None:
+            pipeline = build_pipeline(group_by, date_from, date_to, filters, include_cancelled)
+            results = await db.orders.aggregate(pipeline).to_list(None)
+            rows = []
+            for result in results:
+                rows.append({"key": result.pop("_id"), **result, "sales": round(result["sales"], 2)})
+            self._results[cache_key] = rows
+        return [dict(row) for row in rows]
+
+    def invalidate_order(self, order: dict):
+        """Drop cached breakdowns whose date window contains this order"""
+        created = parse_timestamp(order.get("created_at"))
+        for key in list(self._results.keys()):
+            _, date_from, date_to, _, _ = key
+            if created is None or ((date_from is None or created >= date_from) and (date_to is None or created < date_to)):
+                self._results.pop(key, None)
+
+    def clear(self):
+        self._results.clear()
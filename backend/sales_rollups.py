@@ -0,0 +1,213 @@
+"""Daily and monthly sales rollups, kept current as orders change.
+
+Every order contributes a fixed set of counters to the rollup documents for the day and
+month it was placed in. When an order changes, the difference between its old and new
+contribution is $inc'ed into those documents, so the analytics summary reads a few
+small monthly documents instead of every order.
+
+    python sales_rollups.py backfill   # rebuild all rollups from the orders collection
+"""
+import asyncio
+import logging
+import os
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+from pymongo import ReturnDocument, ReplaceOne, UpdateOne
+
+from timestamps import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Order fields that decide what an order contributes to the rollups
+ROLLUP_FIELDS = {"_id": 0, "created_at": 1, "cancelled": 1, "order_status": 1, "total": 1, "items.name": 1, "items.quantity": 1}
+
+BACKFILL_BATCH_SIZE = 1000
+TOP_PRODUCTS = 10
+
+
+def _encode_product(name: str) -> str:
+    # Product names become field names - keep them clear of MongoDB's path syntax
+    return (name or "Unknown").replace(".", "．").replace("$", "＄")
+
+
+def _decode_product(key: str) -> str:
+    return key.replace("．", ".").replace("＄", "$")
+
+
+def rollup_ids(order: dict) -> list:
+    """IDs of the daily and monthly rollup documents an order counts towards"""
+    placed = parse_timestamp(order.get("created_at"))
+    if placed is None:
+        return ["month:unknown"]
+    return [f"day:{placed.strftime('%Y-%m-%d')}", f"month:{placed.strftime('%Y-%m')}"]
+
+
+def is_cancelled(order: dict) -> bool:
+    return bool(order.get("cancelled", False)) or order.get("order_status") == "cancelled"
+
+
+def contribution(order: dict) -> dict:
+    """Counters this order adds to each of its rollup documents"""
+    if is_cancelled(order):
+        return {"orders": 1, "cancelled": 1}
+
+    delivered = order.get("order_status") == "delivered"
+    counters = defaultdict(float)
+    counters.update({
+        "orders": 1,
+        "sales": order.get("total", 0) or 0,
+        "active": 0 if delivered else 1,
+        "completed": 1 if delivered else 0
+    })
+    for item in order.get("items", []):
+        counters[f"products.{_encode_product(item.get('name'))}"] += item.get("quantity", 0) or 0
+    return dict(counters)
+
+
+def rollup_changes(before: dict = None, after: dict = None) -> dict:
+    """rollup _id -> {counter: delta} turning before's contribution into after's"""
+    return merged_rollup_changes([(before, after)])
+
+
+def merged_rollup_changes(versions: list) -> dict:
+    """rollup_changes summed over many (before, after) order pairs"""
+    changes = defaultdict(lambda: defaultdict(float))
+    for before, after in versions:
+        for order, sign in ((before, -1), (after, 1)):
+            if order is None:
+                continue
+            counters = contribution(order)
+            for rollup_id in rollup_ids(order):
+                for counter, value in counters.items():
+                    changes[rollup_id][counter] += sign * value
+    return {
+        rollup_id: {counter: delta for counter, delta in counters.items() if delta}
+        for rollup_id, counters in changes.items()
+        if any(counters.values())
+    }
+
+
+async def apply_rollup_changes(db, before: dict = None, after: dict = None):
+    """$inc the difference between two versions of an order into its rollups"""
+    for rollup_id, deltas in rollup_changes(before, after).items():
+        period, key = rollup_id.split(":", 1)
+        await db.sales_rollups.update_one(
+            {"_id": rollup_id},
+            {"$inc": deltas, "$set": {"period": period, "key": key}},
+            upsert=True
+        )
+
+
+async def apply_many_rollup_changes(db, versions: list):
+    """Carry a batch of (before, after) order changes into the rollups with one bulk_write"""
+    operations = []
+    for rollup_id, deltas in merged_rollup_changes(versions).items():
+        period, key = rollup_id.split(":", 1)
+        operations.append(UpdateOne(
+            {"_id": rollup_id}, {"$inc": deltas, "$set": {"period": period, "key": key}}, upsert=True
+        ))
+    if operations:
+        await db.sales_rollups.bulk_write(operations, ordered=False)
+
+
+async def record_new_order(db, order: dict):
+    await apply_rollup_changes(db, after=order)
+
+
+async def update_order(db, query: dict, fields: dict):
+    """$set fields on one order and carry the change into the rollups.
+
+    Returns the rollup-relevant fields of the order as it was before the update, or
+    None if no order matched.
+    """
+    before = await db.orders.find_one_and_update(
+        query, {"$set": fields}, projection=ROLLUP_FIELDS, return_document=ReturnDocument.BEFORE
+    )
+    if before is not None:
+        await apply_rollup_changes(db, before, {**before, **fields})
+    return before
+
+
+async def sales_summary(db) -> dict:
+    """Order analytics summary built from the monthly rollups"""
+    months = await db.sales_rollups.find({"period": "month"}).to_list(None)
+
+    summary = {"total_orders": 0, "total_sales": 0.0, "active_orders": 0, "cancelled_orders": 0, "completed_orders": 0}
+    monthly_sales = {}
+    monthly_orders = {}
+    product_counts = defaultdict(float)
+    for month in months:
+        summary["total_orders"] += int(month.get("orders", 0))
+        summary["total_sales"] += month.get("sales", 0)
+        summary["active_orders"] += int(month.get("active", 0))
+        summary["cancelled_orders"] += int(month.get("cancelled", 0))
+        summary["completed_orders"] += int(month.get("completed", 0))
+        if month["key"] != "unknown":
+            monthly_sales[month["key"]] = round(month.get("sales", 0), 2)
+            monthly_orders[month["key"]] = int(month.get("orders", 0) - month.get("cancelled", 0))
+        for product, count in month.get("products", {}).items():
+            product_counts[_decode_product(product)] += count
+
+    top_products = sorted(product_counts.items(), key=lambda x: x[1], reverse=True)[:TOP_PRODUCTS]
+    summary["total_sales"] = round(summary["total_sales"], 2)
+    summary["monthly_sales"] = dict(sorted(monthly_sales.items()))
+    summary["monthly_orders"] = dict(sorted(monthly_orders.items()))
+    summary["top_products"] = [{"name": name, "count": int(count)} for name, count in top_products]
+    return summary
+
+
+async def backfill_rollups(db) -> int:
+    """Rebuild every rollup document from the orders collection; returns the number of orders read"""
+    totals = defaultdict(lambda: defaultdict(float))
+    count = 0
+    async for order in db.orders.find({}, ROLLUP_FIELDS).batch_size(BACKFILL_BATCH_SIZE):
+        count += 1
+        for rollup_id, deltas in rollup_changes(after=order).items():
+            for counter, delta in deltas.items():
+                totals[rollup_id][counter] += delta
+
+    replacements = []
+    for rollup_id, counters in totals.items():
+        period, key = rollup_id.split(":", 1)
+        document = {"_id": rollup_id, "period": period, "key": key, "products": {}}
+        for counter, value in counters.items():
+            if counter.startswith("products."):
+                document["products"][counter[len("products."):]] = value
+            else:
+                document[counter] = value
+        replacements.append(ReplaceOne({"_id": rollup_id}, document, upsert=True))
+
+    if replacements:
+        await db.sales_rollups.bulk_write(replacements, ordered=False)
+    await db.sales_rollups.delete_many({"_id": {"$nin": list(totals)}})
+    logger.info(f"Rebuilt {len(totals)} sales rollups from {count} orders")
+    return count
+
+
+async def ensure_rollups(db):
+    """Backfill on first start after the rollups were introduced"""
+    if await db.sales_rollups.estimated_document_count() == 0 and await db.orders.estimated_document_count() > 0:
+        await backfill_rollups(db)
+
+
+async def _main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        count = await backfill_rollups(client[os.environ['DB_NAME']])
+        print(f"Rebuilt sales rollups from {count} orders")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["backfill"]:
+        print(__doc__)
+        sys.exit(2)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(_main())
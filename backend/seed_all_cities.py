@@ -7,6 +7,7 @@ import os
 import sys
 from pymongo import MongoClient
 from cities_data import ANDHRA_PRADESH_CITIES, TELANGANA_CITIES, DEFAULT_DELIVERY_CHARGES
+from location_index import location_keys
 
 def seed_all_cities():
     """Seed all cities from cities_data.py into database"""
@@ -38,7 +39,8 @@ def seed_all_cities():
             "state": "Andhra Pradesh",
             "charge": charge,
             "free_delivery_threshold": None,  # Can be set by admin later
-            "enabled": True
+            "enabled": True,
+            **location_keys(city, "Andhra Pradesh")
         }
         
         locations_collection.insert_one(city_doc)
@@ -57,7 +59,8 @@ def seed_all_cities():
             "state": "Telangana",
             "charge": charge,
             "free_delivery_threshold": None,  # Can be set by admin later
-            "enabled": True
+            "enabled": True,
+            **location_keys(city, "Telangana")
         }
         
         locations_collection.insert_one(city_doc)
@@ -2,6 +2,7 @@ import asyncio
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
 from cities_data import ANDHRA_PRADESH_CITIES, TELANGANA_CITIES, DEFAULT_DELIVERY_CHARGES, DEFAULT_OTHER_CITY_CHARGE
+from location_index import location_keys
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -31,7 +32,8 @@ async def seed_cities():
             "state": "Andhra Pradesh",
             "charge": delivery_charge,
             "free_delivery_threshold": None,
-            "enabled": True
+            "enabled": True,
+            **location_keys(city, "Andhra Pradesh")
         }
         cities_to_add.append(city_data)
     
@@ -43,7 +45,8 @@ async def seed_cities():
             "state": "Telangana",
             "charge": delivery_charge,
             "free_delivery_threshold": None,
-            "enabled": True
+            "enabled": True,
+            **location_keys(city, "Telangana")
         }
         cities_to_add.append(city_data)
     
@@ -1,10 +1,12 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, File, UploadFile, Header, Request, Form
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, File, UploadFile, Header, Request, Response, Form, Query
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
+from starlette.background import BackgroundTask
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr, ConfigDict, ValidationError
@@ -13,25 +15,72 @@ import uuid
 from datetime import datetime, timezone, timedelta
 import aiofiles
 import base64
-from auth import create_access_token, decode_token, get_password_hash, verify_password
+from auth import create_access_token, get_password_hash_async, verify_password_async, shutdown_hash_executor
 from email_service import send_order_confirmation_email
-from gmail_service import send_order_confirmation_email_gmail, send_order_status_update_email, send_city_approval_email, send_city_rejection_email
+from email_outbox import EmailOutbox
+from mail_transport import close_transports
+from catalog_cache import get_or_build_catalog, get_or_build_catalog_body, bump_catalog_version, catalog_version
+from http_cache import encoded_response, get_or_build_body, invalidate_body
+from discount_scheduler import DiscountScheduler, parse_discount_date, materialize_discount
+from availability_index import AvailabilityIndex
+from location_index import LocationIndex, default_state, location_keys
+from order_pagination import ORDER_PAGE_SIZE, USER_ORDER_PAGE_SIZE, InvalidCursor, order_filter, fetch_order_page
+from sales_rollups import ensure_rollups, record_new_order, sales_summary, apply_many_rollup_changes, update_order as update_order_and_rollups
+from order_state import InvalidTransition, check_transition, commits_stock
+from sales_analytics import AnalyticsCache, InvalidBreakdown
+from timestamps import parse_timestamp, run_migration
+from order_tracking import TrackingCache
+from order_export import EXPORT_FORMATS, ExportUnavailable, export_bounds, stream_csv, write_parquet
+from inventory import PRODUCT_PROJECTION, InsufficientInventory, aggregate_quantities, fetch_products_by_id, decrement_inventory, restore_inventory
+from inventory_reservations import (
+    ReservationSweeper, place_holds, commit_holds, commit_many_holds, discard_holds, reclaim_lapsed_holds, release_holds
+)
+from user_cache import UserCache
+from db_indexes import ensure_indexes
 from cities_data import ALL_CITIES, DEFAULT_DELIVERY_CHARGES, DEFAULT_OTHER_CITY_CHARGE, ANDHRA_PRADESH_CITIES, TELANGANA_CITIES
 import random
 import string
+import tempfile
 from math import radians, sin, cos, sqrt, atan2
 import razorpay
 import hmac
 import hashlib
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# tz_aware: stored datetimes come back as aware UTC values, comparable with datetime.now(timezone.utc)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
 db = client[os.environ['DB_NAME']]
 
+# Flips discount_active at each discount's start/expiry instant
+discount_scheduler = DiscountScheduler(db, on_change=lambda: bump_catalog_version("discount schedule"))
+
+# City -> product IDs index used to filter the catalog without $or/$in queries
+availability_index = AvailabilityIndex()
+
+# (city, state) -> delivery charge settings, so checkout never runs regex scans over locations
+location_index = LocationIndex()
+
+# Returns stock held by unpaid orders once their hold expires
+reservation_sweeper = ReservationSweeper(db, on_change=lambda: bump_catalog_version("expired inventory holds released"))
+
+# Decoded tokens and user documents for the auth dependencies
+user_cache = UserCache()
+
+# Sales breakdowns by city/state/payment method/product, dropped when an order in their window changes
+analytics_cache = AnalyticsCache()
+
+# Public tracking page results - customers refresh it constantly after a status email
+tracking_cache = TrackingCache()
+
+# Transactional emails are queued here and sent by background workers
+email_outbox = EmailOutbox(db)
+
 # Razorpay client initialization
 razorpay_client = razorpay.Client(auth=(os.environ.get('RAZORPAY_KEY_ID', ''), os.environ.get('RAZORPAY_KEY_SECRET', '')))
 
@@ -102,6 +151,7 @@ class Product(BaseModel):
     tag: str = "Traditional"
     discount_percentage: Optional[float] = None
     discount_expiry_date: Optional[str] = None
+    discount_start_date: Optional[str] = None
     inventory_count: Optional[int] = None
     out_of_stock: bool = False
     available_cities: Optional[List[str]] = None  # Cities where product can be delivered
@@ -109,6 +159,35 @@ class Product(BaseModel):
 class DiscountUpdate(BaseModel):
     discount_percentage: float
     discount_expiry_date: str
+    discount_start_date: Optional[str] = None  # Future-dated discounts start at this instant
+
+class ProductPatch(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+    id: str
+    name: Optional[str] = None
+    name_telugu: Optional[str] = None
+    category: Optional[str] = None
+    description: Optional[str] = None
+    description_telugu: Optional[str] = None
+    image: Optional[str] = None
+    prices: Optional[List[dict]] = None
+    isBestSeller: Optional[bool] = None
+    isNew: Optional[bool] = None
+    isFestival: Optional[bool] = None
+    tag: Optional[str] = None
+    discount_percentage: Optional[float] = None
+    discount_expiry_date: Optional[str] = None
+    discount_start_date: Optional[str] = None
+    inventory_count: Optional[int] = None
+    out_of_stock: Optional[bool] = None
+    available_cities: Optional[List[str]] = None
+
+class BulkProductUpdate(BaseModel):
+    updates: List[ProductPatch]
+
+class BulkOrderStatusUpdate(BaseModel):
+    order_ids: List[str]
+    status: str
 
 class OrderItem(BaseModel):
     product_id: str
@@ -264,87 +343,56 @@ def generate_tracking_code():
     """Generate tracking code"""
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
 
-async def get_current_user(authorization: Optional[str] = Header(None)):
-    """Dependency to get current user from JWT token"""
+GUEST_USER = {
+    "id": "guest",
+    "email": "guest@ananthalakshmi.com",
+    "name": "Guest",
+    "is_admin": False
+}
+
+ADMIN_USER = {
+    "id": "admin",
+    "email": "admin@ananthalakshmi.com",
+    "name": "Admin",
+    "is_admin": True
+}
+
+async def _resolve_user(authorization: Optional[str]):
+    """Resolve the bearer token to a user, raising 401 if that is not possible"""
     if not authorization:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
+    token = authorization.replace("Bearer ", "")
+    payload = user_cache.decode(token)
+    if not payload:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    
+    # Check if it's an admin user
+    if payload.get("is_admin") or payload.get("sub") == "admin":
+        return dict(ADMIN_USER)
+    
+    user = await user_cache.get_user(db, payload.get("sub"))
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    
+    return user
+
+async def get_current_user(authorization: Optional[str] = Header(None)):
+    """Dependency to get current user from JWT token"""
     try:
-        token = authorization.replace("Bearer ", "")
-        payload = decode_token(token)
-        if not payload:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        # Check if it's an admin user
-        if payload.get("is_admin") or payload.get("sub") == "admin":
-            return {
-                "id": "admin",
-                "email": "admin@ananthalakshmi.com",
-                "name": "Admin",
-                "is_admin": True
-            }
-        
-        user = await db.users.find_one({"id": payload.get("sub")}, {"_id": 0, "password": 0})
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        
-        return user
+        return await _resolve_user(authorization)
     except HTTPException:
         raise
-    except Exception as e:
+    except Exception:
         raise HTTPException(status_code=401, detail="Invalid authentication")
 
 async def get_current_user_optional(authorization: Optional[str] = Header(None)):
     """Dependency to get current user from JWT token - allows guest users"""
-    if not authorization:
-        # Return guest user
-        return {
-            "id": "guest",
-            "email": "guest@ananthalakshmi.com",
-            "name": "Guest",
-            "is_admin": False
-        }
-    
     try:
-        token = authorization.replace("Bearer ", "")
-        payload = decode_token(token)
-        if not payload:
-            # Return guest user if token is invalid
-            return {
-                "id": "guest",
-                "email": "guest@ananthalakshmi.com",
-                "name": "Guest",
-                "is_admin": False
-            }
-        
-        # Check if it's an admin user
-        if payload.get("is_admin") or payload.get("sub") == "admin":
-            return {
-                "id": "admin",
-                "email": "admin@ananthalakshmi.com",
-                "name": "Admin",
-                "is_admin": True
-            }
-        
-        user = await db.users.find_one({"id": payload.get("sub")}, {"_id": 0, "password": 0})
-        if not user:
-            # Return guest user if user not found
-            return {
-                "id": "guest",
-                "email": "guest@ananthalakshmi.com",
-                "name": "Guest",
-                "is_admin": False
-            }
-        
-        return user
-    except Exception as e:
-        # Return guest user for any authentication error
-        return {
-            "id": "guest",
-            "email": "guest@ananthalakshmi.com",
-            "name": "Guest",
-            "is_admin": False
-        }
+        return await _resolve_user(authorization)
+    except Exception:
+        # No token, an invalid one or an unknown user all fall back to guest checkout
+        return dict(GUEST_USER)
 
 # ============= AUTHENTICATION APIS =============
 
@@ -357,7 +405,7 @@ async def register(user_data: UserRegister):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Hash password
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     
     # Create user
     user = {
@@ -367,7 +415,7 @@ async def register(user_data: UserRegister):
         "phone": user_data.phone,
         "password": hashed_password,
         "auth_provider": "email",
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
     
     await db.users.insert_one(user)
@@ -389,10 +437,18 @@ async def register(user_data: UserRegister):
 async def login(user_data: UserLogin):
     """Login with email and password"""
     user = await db.users.find_one({"email": user_data.email}, {"_id": 0})
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    if not user or not verify_password(user_data.password, user.get("password", "")):
+    password_valid, new_hash = await verify_password_async(user_data.password, user.get("password", ""))
+    if not password_valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
+    # Stored hash used an outdated bcrypt cost - replace it now that we know the password
+    if new_hash:
+        await db.users.update_one({"id": user["id"]}, {"$set": {"password": new_hash}})
+        user_cache.invalidate_user(user["id"])
+    
     # Create token
     token = create_access_token({"sub": user["id"], "email": user["email"]})
     
@@ -425,7 +481,7 @@ async def google_auth(auth_data: GoogleAuth):
             "email": user_email,
             "name": user_name,
             "auth_provider": "google",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
         await db.users.insert_one(user)
         user.pop("_id", None)
@@ -456,7 +512,7 @@ async def phone_auth(auth_data: PhoneAuth):
             "name": f"User {auth_data.phone}",
             "phone": auth_data.phone,
             "auth_provider": "phone",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
         await db.users.insert_one(user)
         user.pop("_id", None)
@@ -486,7 +542,9 @@ async def admin_login(login_data: AdminLogin):
         # Verify email matches
         email_valid = login_data.email.lower() == admin_profile["email"].lower()
         # Verify password
-        password_valid = verify_password(login_data.password, admin_profile["password_hash"])
+        password_valid, new_hash = await verify_password_async(login_data.password, admin_profile["password_hash"])
+        if email_valid and password_valid and new_hash:
+            await db.admin_profile.update_one({"id": "admin_profile"}, {"$set": {"password_hash": new_hash}})
         admin_email = admin_profile["email"]
     else:
         # Fall back to default credentials
@@ -531,76 +589,120 @@ async def get_saved_user_details(identifier: str):
 
 # ============= PRODUCTS APIS =============
 
-@api_router.get("/products")
-async def get_products(city: Optional[str] = None, state: Optional[str] = None):
-    """Get all products with discount calculation, optionally filtered by city/state availability"""
-    # Build query filter
-    query_filter = {}
-    if city:
-        # Filter products that either have no city restriction or include the requested city
-        query_filter = {
-            "$or": [
-                {"available_cities": None},
-                {"available_cities": []},
-                {"available_cities": city}
-            ]
-        }
-    elif state:
-        # Filter products by state - get all cities in that state and filter
-        state_cities = await db.locations.find({"state": state}, {"name": 1, "_id": 0}).to_list(1000)
-        city_names = [city_doc["name"] for city_doc in state_cities]
-        query_filter = {
-            "$or": [
-                {"available_cities": None},
-                {"available_cities": []},
-                {"available_cities": {"$in": city_names}}
-            ]
-        }
-    
-    products = await db.products.find(query_filter, {"_id": 0}).to_list(1000)
+# Fields a product grid card needs - descriptions and city lists are left out
+CARD_VIEW_FIELDS = (
+    "id", "name", "name_telugu", "category", "image", "prices", "isBestSeller", "isNew", "isFestival",
+    "tag", "discount_percentage", "discount_active", "discounted_prices", "inventory_count", "out_of_stock"
+)
+
+# Fields a client may request with ?fields= (model fields plus flags/discounts stored on the document)
+PRODUCT_LISTING_FIELDS = set(Product.model_fields) | {
+    "isFestival", "discount_active", "discounted_prices", "discount_starts_at", "discount_expires_at"
+}
+
+TELUGU_FIELDS = {"name_telugu": "name", "description_telugu": "description"}
+
+def _catalog_shape(view: Optional[str], fields: Optional[str], lang: Optional[str]):
+    """Normalize listing parameters into a hashable (fields, lang) shape - fields None means all"""
+    if lang not in (None, "en", "te"):
+        raise HTTPException(status_code=400, detail="lang must be 'en' or 'te'")
+    
+    if fields:
+        requested = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = requested - PRODUCT_LISTING_FIELDS
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown product fields: {', '.join(sorted(unknown))}")
+        # id is always needed for availability filtering
+        selected = requested | {"id"}
+    elif view in (None, "full"):
+        selected = None
+    elif view == "card":
+        selected = set(CARD_VIEW_FIELDS)
+    else:
+        raise HTTPException(status_code=400, detail="view must be 'card' or 'full'")
+    
+    if selected is not None and lang == "te":
+        # Telugu strings fall back to English, so both are read from MongoDB
+        selected |= {english for telugu, english in TELUGU_FIELDS.items() if telugu in selected or english in selected}
+        selected |= {telugu for telugu, english in TELUGU_FIELDS.items() if english in selected}
+    
+    return (tuple(sorted(selected)) if selected is not None else None, lang)
+
+def _catalog_projection(shape) -> dict:
+    """MongoDB projection for a catalog shape, so unused fields are never read or decoded"""
+    fields, lang = shape
+    if fields is None:
+        projection = dict(PRODUCT_PROJECTION)
+        if lang == "en":
+            projection.update({telugu: 0 for telugu in TELUGU_FIELDS})
+        return projection
+    
+    selected = set(fields)
+    if lang == "en":
+        selected -= set(TELUGU_FIELDS)
+    return {"_id": 0, **{field: 1 for field in selected}}
+
+async def _build_product_catalog(shape=(None, None)):
+    """Load the product list from MongoDB - used on catalog cache misses"""
+    fields, lang = shape
+    products = await db.products.find({}, _catalog_projection(shape)).to_list(1000)
     
-    # Calculate discounted prices for each product
     for product in products:
-        discount_percentage = product.get('discount_percentage')
-        discount_expiry = product.get('discount_expiry_date')
+        # discount_active and discounted_prices are materialized by the discount scheduler
+        if fields is None or "discount_active" in fields:
+            product.setdefault('discount_active', False)
         
-        # Check if discount is valid
-        discount_active = False
-        if discount_percentage and discount_expiry:
-            try:
-                # Parse the date string
-                expiry_date_str = discount_expiry.replace('Z', '+00:00')
-                if 'T' in expiry_date_str:
-                    expiry_date = datetime.fromisoformat(expiry_date_str)
-                else:
-                    # If only date is provided (YYYY-MM-DD), add time and timezone
-                    expiry_date = datetime.fromisoformat(expiry_date_str + "T23:59:59+00:00")
-                
-                # Ensure timezone awareness for comparison
-                if expiry_date.tzinfo is None:
-                    expiry_date = expiry_date.replace(tzinfo=timezone.utc)
-                
-                if expiry_date > datetime.now(timezone.utc):
-                    discount_active = True
-            except:
-                pass
-        
-        product['discount_active'] = discount_active
-        
-        # Calculate discounted prices if discount is active
-        if discount_active and discount_percentage:
-            discounted_prices = []
-            for price_item in product.get('prices', []):
-                original_price = price_item['price']
-                discounted_price = round(original_price * (1 - discount_percentage / 100), 2)
-                discounted_prices.append({
-                    **price_item,
-                    'original_price': original_price,
-                    'discounted_price': discounted_price
-                })
-            product['discounted_prices'] = discounted_prices
+        if lang == "te":
+            # Send a single language - Telugu strings replace English ones where present
+            for telugu, english in TELUGU_FIELDS.items():
+                telugu_value = product.pop(telugu, None)
+                if telugu_value and english in product:
+                    product[english] = telugu_value
     
-    return products
+    return products, None
+
+async def _build_filtered_catalog(city: Optional[str], state: Optional[str], shape=(None, None)):
+    """Filter the cached catalog by city/state availability using the in-memory index"""
+    products = await get_or_build_catalog((None, None, shape), lambda: _build_product_catalog(shape))
+    
+    await availability_index.refresh_if_stale(db)
+    
+    if city:
+        cities = [city]
+    else:
+        # A product is available in a state if it is available in any of the state's cities
+        state_cities = await db.locations.find({"state": state}, {"name": 1, "_id": 0}).to_list(None)
+        cities = [city_doc["name"] for city_doc in state_cities]
+    
+    product_ids = availability_index.product_ids_for_cities(cities)
+    return [product for product in products if product["id"] in product_ids], None
+
+@api_router.get("/products")
+async def get_products(
+    request: Request,
+    city: Optional[str] = None,
+    state: Optional[str] = None,
+    view: Optional[str] = None,
+    fields: Optional[str] = None,
+    lang: Optional[str] = None
+):
+    """Get all products with discount calculation, optionally filtered by city/state availability.
+    
+    view=card returns only the fields a product card needs, fields= selects an explicit
+    comma-separated field list, and lang=en|te sends only one language's strings.
+    """
+    shape = _catalog_shape(view, fields, lang)
+    
+    # Served from the in-process catalog cache; product writes bump the catalog version
+    if not city and not state:
+        body = await get_or_build_catalog_body((None, None, shape), lambda: _build_product_catalog(shape))
+    else:
+        body = await get_or_build_catalog_body(
+            (city, None, shape) if city else (None, state, shape),
+            lambda: _build_filtered_catalog(city, state, shape)
+        )
+    
+    return encoded_response(request, body)
 
 @api_router.post("/products")
 async def create_product(product: Product, current_user: dict = Depends(get_current_user)):
@@ -608,6 +710,9 @@ async def create_product(product: Product, current_user: dict = Depends(get_curr
     product_dict = product.model_dump()
     await db.products.insert_one(product_dict)
     product_dict.pop("_id", None)
+    availability_index.set_product(product_dict["id"], product_dict.get("available_cities"))
+    await discount_scheduler.refresh_product(product_dict["id"])
+    bump_catalog_version("product created")
     return {"message": "Product created successfully", "product": product_dict}
 
 @api_router.put("/products/{product_id}")
@@ -619,6 +724,11 @@ async def update_product(product_id: str, product: Product, current_user: dict =
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    availability_index.set_product(product_id, product_dict.get("available_cities"))
+    
+    # Prices or discount fields may have changed - recompute the materialized discount
+    await discount_scheduler.refresh_product(product_id)
+    bump_catalog_version("product updated")
     return {"message": "Product updated successfully"}
 
 @api_router.delete("/products/{product_id}")
@@ -629,6 +739,9 @@ async def delete_product(product_id: str, current_user: dict = Depends(get_curre
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    availability_index.remove_product(product_id)
+    await discount_scheduler.reschedule()
+    bump_catalog_version("product deleted")
     return {"message": "Product deleted successfully"}
 
 # ============= DISCOUNT APIS =============
@@ -640,37 +753,41 @@ async def add_discount(product_id: str, discount: DiscountUpdate, current_user:
     if discount.discount_percentage < 0 or discount.discount_percentage > 70:
         raise HTTPException(status_code=400, detail="Discount must be between 0% and 70%")
     
-    # Validate expiry date is in the future
+    # Parse dates once here; reads use the stored datetimes and precomputed prices
     try:
-        # Parse the date string
-        expiry_date_str = discount.discount_expiry_date.replace('Z', '+00:00')
-        if 'T' in expiry_date_str:
-            expiry_date = datetime.fromisoformat(expiry_date_str)
-        else:
-            # If only date is provided (YYYY-MM-DD), add time and timezone
-            expiry_date = datetime.fromisoformat(expiry_date_str + "T23:59:59+00:00")
-        
-        # Ensure timezone awareness for comparison
-        if expiry_date.tzinfo is None:
-            expiry_date = expiry_date.replace(tzinfo=timezone.utc)
-        
-        if expiry_date <= datetime.now(timezone.utc):
-            raise HTTPException(status_code=400, detail="Expiry date must be in the future")
+        expiry_date = parse_discount_date(discount.discount_expiry_date)
+        start_date = parse_discount_date(discount.discount_start_date) if discount.discount_start_date else None
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format")
     
+    if expiry_date <= datetime.now(timezone.utc):
+        raise HTTPException(status_code=400, detail="Expiry date must be in the future")
+    
+    if start_date and start_date >= expiry_date:
+        raise HTTPException(status_code=400, detail="Start date must be before expiry date")
+    
+    product = await db.products.find_one({"id": product_id}, {"_id": 0, "id": 1, "prices": 1})
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    discount_fields = {
+        "discount_percentage": discount.discount_percentage,
+        "discount_expiry_date": discount.discount_expiry_date,
+        "discount_start_date": discount.discount_start_date
+    }
+    set_fields, unset_fields = materialize_discount({**product, **discount_fields})
+    update = {"$set": {**discount_fields, **set_fields}}
+    if unset_fields:
+        update["$unset"] = unset_fields
+    
     # Update product
-    result = await db.products.update_one(
-        {"id": product_id},
-        {"$set": {
-            "discount_percentage": discount.discount_percentage,
-            "discount_expiry_date": discount.discount_expiry_date
-        }}
-    )
+    result = await db.products.update_one({"id": product_id}, update)
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    await discount_scheduler.reschedule()
+    bump_catalog_version("discount added")
     return {"message": "Discount added successfully"}
 
 @api_router.delete("/admin/products/{product_id}/discount")
@@ -678,18 +795,29 @@ async def remove_discount(product_id: str, current_user: dict = Depends(get_curr
     """Remove discount from a product (Admin only)"""
     result = await db.products.update_one(
         {"id": product_id},
-        {"$unset": {"discount_percentage": "", "discount_expiry_date": ""}}
+        {
+            "$set": {"discount_active": False},
+            "$unset": {
+                "discount_percentage": "",
+                "discount_expiry_date": "",
+                "discount_start_date": "",
+                "discounted_prices": "",
+                "discount_starts_at": "",
+                "discount_expires_at": ""
+            }
+        }
     )
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    bump_catalog_version("discount removed")
     return {"message": "Discount removed successfully"}
 
 @api_router.get("/admin/products/discounts")
 async def get_products_with_discounts(current_user: dict = Depends(get_current_user)):
     """Get all products with discount information (Admin only)"""
-    products = await db.products.find({}, {"_id": 0}).to_list(1000)
+    products = await db.products.find({}, PRODUCT_PROJECTION).to_list(1000)
     return products
 
 # ============= INVENTORY MANAGEMENT APIS =============
@@ -710,14 +838,16 @@ async def update_inventory(product_id: str, data: dict, current_user: dict = Dep
         "out_of_stock": inventory_count == 0
     }
     
+    # A manual stock change overrides any sold-out flag set automatically by orders
     result = await db.products.update_one(
         {"id": product_id},
-        {"$set": update_data}
+        {"$set": update_data, "$unset": {"out_of_stock_auto": ""}}
     )
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    bump_catalog_version("inventory updated")
     return {"message": "Inventory updated successfully"}
 
 @api_router.get("/admin/products/{product_id}/stock-status")
@@ -740,12 +870,13 @@ async def toggle_stock_status(product_id: str, data: dict, current_user: dict =
     
     result = await db.products.update_one(
         {"id": product_id},
-        {"$set": {"out_of_stock": out_of_stock}}
+        {"$set": {"out_of_stock": out_of_stock}, "$unset": {"out_of_stock_auto": ""}}
     )
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    bump_catalog_version("stock status updated")
     return {"message": "Stock status updated successfully"}
 
 @api_router.put("/admin/products/{product_id}/available-cities")
@@ -765,31 +896,169 @@ async def update_available_cities(product_id: str, data: dict, current_user: dic
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    availability_index.set_product(product_id, available_cities)
+    bump_catalog_version("available cities updated")
     return {"message": "Available cities updated successfully"}
 
+# ============= BULK PRODUCT APIS =============
+
+MAX_BULK_PRODUCT_UPDATES = 500
+
+# Required (or defaulted) on Product, so a patch may change them but not clear them;
+# discount_* and available_cities are the only fields a patch can null out
+NON_NULLABLE_PATCH_FIELDS = (
+    "name", "category", "description", "image", "prices", "isBestSeller", "isNew", "isFestival",
+    "tag", "inventory_count", "out_of_stock"
+)
+
+# Patching any of these means discounted_prices / discount_active must be recomputed
+DISCOUNT_INPUT_FIELDS = {"prices", "discount_percentage", "discount_expiry_date", "discount_start_date"}
+
+def _validate_product_patch(patch: ProductPatch) -> dict:
+    """Turn a partial product patch into $set fields, applying the single-product endpoint rules"""
+    update_data = patch.model_dump(exclude_unset=True)
+    update_data.pop("id", None)
+    
+    if not update_data:
+        raise ValueError("No fields to update")
+    
+    for field in NON_NULLABLE_PATCH_FIELDS:
+        if field in update_data and update_data[field] is None:
+            raise ValueError(f"{field} cannot be null")
+    
+    if "inventory_count" in update_data:
+        inventory_count = update_data["inventory_count"]
+        if inventory_count < 0:
+            raise ValueError("Inventory count cannot be negative")
+        # Same rule as the inventory endpoint unless the patch sets the flag explicitly
+        update_data.setdefault("out_of_stock", inventory_count == 0)
+    
+    if "available_cities" in update_data:
+        update_data["available_cities"] = update_data["available_cities"] or None
+    
+    if "discount_percentage" in update_data and update_data["discount_percentage"] is not None:
+        if update_data["discount_percentage"] < 0 or update_data["discount_percentage"] > 70:
+            raise ValueError("Discount must be between 0% and 70%")
+    
+    for date_field in ("discount_expiry_date", "discount_start_date"):
+        if update_data.get(date_field):
+            try:
+                parse_discount_date(update_data[date_field])
+            except ValueError:
+                raise ValueError(f"Invalid date format for {date_field}")
+    
+    return update_data
+
+@api_router.post("/admin/products/bulk")
+async def bulk_update_products(data: BulkProductUpdate, current_user: dict = Depends(get_current_user)):
+    """Apply many partial product patches in one unordered bulk_write (Admin only)"""
+    if len(data.updates) > MAX_BULK_PRODUCT_UPDATES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_PRODUCT_UPDATES} products can be updated at once")
+    
+    results = [{"id": patch.id, "status": "pending"} for patch in data.updates]
+    operations = []
+    operation_items = []  # index into results for each queued operation
+    patches = {}
+    
+    for index, patch in enumerate(data.updates):
+        if patch.id in patches:
+            results[index].update({"status": "error", "detail": "Duplicate product id in request"})
+            continue
+        try:
+            patches[patch.id] = _validate_product_patch(patch)
+        except ValueError as e:
+            results[index].update({"status": "error", "detail": str(e)})
+            continue
+        operation_items.append(index)
+    
+    # One read tells us which IDs exist, so missing products get a per-item result
+    existing = await db.products.find({"id": {"$in": list(patches)}}, {"_id": 0, "id": 1}).to_list(None)
+    existing_ids = {product["id"] for product in existing}
+    
+    queued_items = []
+    for index in operation_items:
+        product_id = results[index]["id"]
+        if product_id not in existing_ids:
+            results[index].update({"status": "not_found", "detail": "Product not found"})
+            continue
+        update = {"$set": patches[product_id]}
+        if "out_of_stock" in patches[product_id]:
+            update["$unset"] = {"out_of_stock_auto": ""}
+        operations.append(UpdateOne({"id": product_id}, update))
+        queued_items.append(index)
+    
+    failed_items = set()
+    if operations:
+        try:
+            await db.products.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                index = queued_items[write_error["index"]]
+                failed_items.add(index)
+                results[index].update({"status": "error", "detail": write_error.get("errmsg", "Write failed")})
+    
+    updated_ids = []
+    for index in queued_items:
+        if index not in failed_items:
+            results[index]["status"] = "updated"
+            updated_ids.append(results[index]["id"])
+    
+    if updated_ids:
+        for product_id in updated_ids:
+            if "available_cities" in patches[product_id]:
+                availability_index.set_product(product_id, patches[product_id]["available_cities"])
+        
+        discount_ids = [product_id for product_id in updated_ids if DISCOUNT_INPUT_FIELDS & patches[product_id].keys()]
+        if discount_ids:
+            await discount_scheduler.refresh_products(discount_ids)
+        
+        bump_catalog_version(f"bulk update of {len(updated_ids)} products")
+    
+    return {
+        "message": f"{len(updated_ids)} of {len(results)} products updated",
+        "updated": len(updated_ids),
+        "failed": len(results) - len(updated_ids),
+        "results": results
+    }
+
 # ============= BEST SELLER APIS =============
 
+async def _sync_product_flag(flag: str, product_ids: List[str]) -> dict:
+    """Make exactly product_ids carry flag, writing only to products whose flag actually changes"""
+    wanted_ids = set(product_ids)
+    # One read covers both the currently flagged products and which of the wanted IDs exist
+    products = await db.products.find(
+        {"$or": [{flag: True}, {"id": {"$in": list(wanted_ids)}}]},
+        {"_id": 0, "id": 1, flag: 1}
+    ).to_list(None)
+    existing_ids = {product["id"] for product in products}
+    flagged_ids = {product["id"] for product in products if product.get(flag) is True}
+    
+    added = (wanted_ids & existing_ids) - flagged_ids
+    removed = flagged_ids - wanted_ids
+    
+    if removed:
+        await db.products.update_many({"id": {"$in": list(removed)}}, {"$set": {flag: False}})
+    if added:
+        await db.products.update_many({"id": {"$in": list(added)}}, {"$set": {flag: True}})
+    
+    return {"added": sorted(added), "removed": sorted(removed)}
+
 @api_router.post("/admin/best-sellers")
 async def update_best_sellers(data: dict, current_user: dict = Depends(get_current_user)):
     """Bulk update best sellers (Admin only)"""
     product_ids = data.get("product_ids", [])
     
-    # Remove best seller flag from all products
-    await db.products.update_many({}, {"$set": {"isBestSeller": False}})
-    
-    # Set best seller flag for selected products
-    if product_ids:
-        await db.products.update_many(
-            {"id": {"$in": product_ids}},
-            {"$set": {"isBestSeller": True}}
-        )
+    changes = await _sync_product_flag("isBestSeller", product_ids)
     
-    return {"message": "Best sellers updated successfully"}
+    if changes["added"] or changes["removed"]:
+        bump_catalog_version("best sellers updated")
+    return {"message": "Best sellers updated successfully", **changes}
 
 @api_router.get("/admin/best-sellers")
 async def get_best_sellers(current_user: dict = Depends(get_current_user)):
     """Get all best seller products (Admin only)"""
-    products = await db.products.find({"isBestSeller": True}, {"_id": 0}).to_list(1000)
+    products = await db.products.find({"isBestSeller": True}, PRODUCT_PROJECTION).to_list(1000)
     return products
 
 # ============= FESTIVAL PRODUCT APIS =============
@@ -806,25 +1075,32 @@ async def set_festival_product(data: dict, current_user: dict = Depends(get_curr
             {"$set": {"key": "festival_product", "product_id": product_id}},
             upsert=True
         )
+        invalidate_body("festival_product")
         return {"message": "Festival product set successfully"}
     else:
         # Remove festival product
         await db.settings.delete_one({"key": "festival_product"})
+        invalidate_body("festival_product")
         return {"message": "Festival product removed successfully"}
 
-@api_router.get("/admin/festival-product")
-async def get_festival_product():
-    """Get current festival product (Public API)"""
+async def _load_festival_product():
     setting = await db.settings.find_one({"key": "festival_product"}, {"_id": 0})
     
     if not setting:
         return None
     
     product_id = setting.get("product_id")
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
+    product = await db.products.find_one({"id": product_id}, PRODUCT_PROJECTION)
     
     return product
 
+@api_router.get("/admin/festival-product")
+async def get_festival_product(request: Request):
+    """Get current festival product (Public API)"""
+    # The body embeds a product document, so it is also stale after any catalog write
+    body = await get_or_build_body("festival_product", _load_festival_product, version=catalog_version())
+    return encoded_response(request, body)
+
 # ============= FESTIVAL PRODUCTS (BULK SELECTION LIKE BEST SELLERS) =============
 
 @api_router.post("/admin/festival-products")
@@ -832,22 +1108,16 @@ async def update_festival_products(data: dict, current_user: dict = Depends(get_
     """Bulk update festival products (Admin only) - Similar to best sellers"""
     product_ids = data.get("product_ids", [])
     
-    # Remove festival flag from all products
-    await db.products.update_many({}, {"$set": {"isFestival": False}})
-    
-    # Set festival flag for selected products
-    if product_ids:
-        await db.products.update_many(
-            {"id": {"$in": product_ids}},
-            {"$set": {"isFestival": True}}
-        )
+    changes = await _sync_product_flag("isFestival", product_ids)
     
-    return {"message": "Festival products updated successfully"}
+    if changes["added"] or changes["removed"]:
+        bump_catalog_version("festival products updated")
+    return {"message": "Festival products updated successfully", **changes}
 
 @api_router.get("/admin/festival-products")
 async def get_festival_products(current_user: dict = Depends(get_current_user)):
     """Get all festival products (Admin only)"""
-    products = await db.products.find({"isFestival": True}, {"_id": 0}).to_list(1000)
+    products = await db.products.find({"isFestival": True}, PRODUCT_PROJECTION).to_list(1000)
     return products
 
 @api_router.put("/admin/products/{product_id}/festival")
@@ -863,6 +1133,7 @@ async def toggle_product_festival(product_id: str, data: dict, current_user: dic
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
     
+    bump_catalog_version("product festival status updated")
     return {"message": f"Product festival status updated to {is_festival}"}
 
 # ============= FREE DELIVERY SETTINGS API =============
@@ -882,11 +1153,10 @@ async def set_free_delivery_threshold(data: dict, current_user: dict = Depends(g
         {"$set": {"key": "free_delivery", "threshold": float(threshold), "enabled": bool(enabled)}},
         upsert=True
     )
+    invalidate_body("free_delivery")
     return {"message": "Free delivery settings updated successfully", "threshold": threshold, "enabled": enabled}
 
-@api_router.get("/settings/free-delivery")
-async def get_free_delivery_settings():
-    """Get free delivery settings (Public API)"""
+async def _load_free_delivery_settings():
     setting = await db.settings.find_one({"key": "free_delivery"}, {"_id": 0})
     
     if not setting:
@@ -895,6 +1165,12 @@ async def get_free_delivery_settings():
     
     return {"enabled": setting.get("enabled", True), "threshold": setting.get("threshold", 1000)}
 
+@api_router.get("/settings/free-delivery")
+async def get_free_delivery_settings(request: Request):
+    """Get free delivery settings (Public API)"""
+    body = await get_or_build_body("free_delivery", _load_free_delivery_settings)
+    return encoded_response(request, body)
+
 # ============= IMAGE UPLOAD API =============
 
 @api_router.post("/upload/image")
@@ -934,6 +1210,30 @@ async def upload_image_alias(file: UploadFile = File(...), current_user: dict =
 
 # ============= ORDERS APIS =============
 
+async def update_order(order_id: str, fields: dict):
+    """$set fields on an order, keeping the sales rollups and cached breakdowns/tracking results in step"""
+    before = await update_order_and_rollups(db, {"order_id": order_id}, fields)
+    if before is not None:
+        analytics_cache.invalidate_order(before)
+        tracking_cache.invalidate_order(order_id)
+    return before
+
+async def commit_order_stock(order_id: str):
+    """Make an order's held stock permanent, taking it again if the sweeper already returned it.
+
+    Raises InsufficientInventory when stock from a lapsed hold has been sold since.
+    """
+    if await reclaim_lapsed_holds(db, order_id):
+        bump_catalog_version("lapsed hold reclaimed")
+    await commit_holds(db, order_id)
+
+async def cancel_order_stock(order_id: str, reason: str = "order cancelled"):
+    """Return everything an order reserved, paid or not - the release path for every cancellation"""
+    if await release_holds(db, order_id, include_committed=True):
+        bump_catalog_version(reason)
+
+LAPSED_STOCK_DETAIL = "Stock for this order was released when its reservation expired and is no longer available"
+
 @api_router.post("/orders")
 async def create_order(order_data: OrderCreate, current_user: dict = Depends(get_current_user_optional)):
     """Create new order - allows guest checkout"""
@@ -941,10 +1241,18 @@ async def create_order(order_data: OrderCreate, current_user: dict = Depends(get
         print(f"DEBUG: Received order data: {order_data.model_dump()}")
         print(f"DEBUG: Current user: {current_user}")
         
+        # Load every product in the cart with one query and reuse it for the whole checkout
+        products_by_id = await fetch_products_by_id(
+            db,
+            [item.product_id for item in order_data.items],
+            {"_id": 0, "id": 1, "available_cities": 1, "out_of_stock": 1, "inventory_count": 1}
+        )
+        
         # Check city availability and inventory for all items
         unavailable_products = []
+        tracked_product_ids = set()
         for item in order_data.items:
-            product = await db.products.find_one({"id": item.product_id})
+            product = products_by_id.get(item.product_id)
             if product:
                 # Check if product is available for delivery to the customer's city
                 available_cities = product.get("available_cities")
@@ -960,6 +1268,8 @@ async def create_order(order_data: OrderCreate, current_user: dict = Depends(get
                 inventory_count = product.get("inventory_count")
                 if inventory_count is not None and inventory_count < item.quantity:
                     raise HTTPException(status_code=400, detail=f"Insufficient inventory for {item.name}")
+                if inventory_count is not None:
+                    tracked_product_ids.add(item.product_id)
         
         # If any products are not available for delivery to this city, return error
         if unavailable_products:
@@ -983,13 +1293,11 @@ async def create_order(order_data: OrderCreate, current_user: dict = Depends(get
         
         # Detect if this is a custom city request (city not in our delivery locations)
         custom_city_request = False
+        city_location = None
         if not is_custom_location and order_data.city and order_data.state:
-            # Check if city exists by matching both city name AND state (CASE-INSENSITIVE)
-            city_exists = await db.locations.find_one({
-                "name": {"$regex": f"^{order_data.city}$", "$options": "i"},
-                "state": {"$regex": f"^{order_data.state}$", "$options": "i"}
-            })
-            if not city_exists:
+            # Match both city name AND state on their normalized (case-insensitive) keys
+            city_location = await location_index.resolve(db, order_data.city, order_data.state)
+            if not city_location:
                 custom_city_request = True
                 print(f"🆕 CUSTOM CITY REQUEST: {order_data.city}, {order_data.state} - Awaiting approval")
             else:
@@ -1007,13 +1315,7 @@ async def create_order(order_data: OrderCreate, current_user: dict = Depends(get
             else:
                 print(f"📍 CUSTOM LOCATION: {custom_city}, {custom_state} - Delivery charge to be calculated by admin")
         else:
-            # Find the city's delivery settings from database
-            # Match by both city name AND state for accuracy (CASE-INSENSITIVE)
-            city_location = await db.locations.find_one({
-                "name": {"$regex": f"^{order_data.city}$", "$options": "i"},
-                "state": {"$regex": f"^{order_data.state}$", "$options": "i"}
-            })
-            
+            # City delivery settings were resolved above
             if city_location:
                 base_charge = city_location.get("charge", 99.0)
                 free_delivery_threshold = city_location.get("free_delivery_threshold") or 0
@@ -1067,8 +1369,8 @@ async def create_order(order_data: OrderCreate, current_user: dict = Depends(get
             "payment_status": payment_status,
             "order_status": order_status,
             "custom_city_request": custom_city_request,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "estimated_delivery": (datetime.now(timezone.utc)).isoformat(),
+            "created_at": datetime.now(timezone.utc),
+            "estimated_delivery": datetime.now(timezone.utc),
             "admin_notes": None,
             "delivery_days": None,
             "cancelled": False,
@@ -1081,6 +1383,21 @@ async def create_order(order_data: OrderCreate, current_user: dict = Depends(get
             "distance_from_guntur": order_data.distance_from_guntur if hasattr(order_data, 'distance_from_guntur') else None
         }
         
+        # Take stock atomically before anything is written for this order - a concurrent
+        # checkout that drained a product makes the whole decrement roll back
+        inventory_quantities = {
+            product_id: quantity
+            for product_id, quantity in aggregate_quantities(order["items"]).items()
+            if product_id in tracked_product_ids
+        }
+        # A random transaction ID, not the order ID - it is stored on the products
+        inventory_txn_id = str(uuid.uuid4())
+        try:
+            await decrement_inventory(db, inventory_quantities, inventory_txn_id)
+        except InsufficientInventory as e:
+            short_names = list(dict.fromkeys(item.name for item in order_data.items if item.product_id in e.product_ids))
+            raise HTTPException(status_code=400, detail=f"Insufficient inventory for {', '.join(short_names)}")
+        
         # If custom city request, create a city suggestion entry
         if custom_city_request:
             suggestion_id = str(uuid.uuid4())
@@ -1098,23 +1415,27 @@ async def create_order(order_data: OrderCreate, current_user: dict = Depends(get
             await db.city_suggestions.insert_one(city_suggestion)
             print(f"📝 City suggestion created: {suggestion_id} for {order_data.city}, {order_data.state}")
         
-        await db.orders.insert_one(order)
+        # Hold the stock until payment is verified; abandoned checkouts get it back from the sweeper.
+        # Holds go in before the order, so stock is never taken without a hold to return it
+        try:
+            await place_holds(db, order_id, inventory_quantities)
+            await db.orders.insert_one(order)
+        except Exception:
+            # Give the stock back if the holds or the order itself could not be stored
+            await discard_holds(db, order_id)
+            await restore_inventory(db, inventory_quantities, inventory_txn_id)
+            raise
+        
+        await record_new_order(db, order)
+        analytics_cache.invalidate_order(order)
+        tracking_cache.invalidate_identifiers(order_data.phone, order_data.email)
         
-        # Update inventory for each item
-        for item in order_data.items:
-            product = await db.products.find_one({"id": item.product_id})
-            if product and product.get("inventory_count") is not None:
-                new_count = product["inventory_count"] - item.quantity
-                update_data = {"inventory_count": max(0, new_count)}
-                
-                # Mark as out of stock if inventory reaches 0
-                if new_count <= 0:
-                    update_data["out_of_stock"] = True
-                
-                await db.products.update_one(
-                    {"id": item.product_id},
-                    {"$set": update_data}
-                )
+        if custom_city_request:
+            # These wait on admin approval before payment, which can take longer than a hold lasts
+            await commit_holds(db, order_id)
+        
+        if inventory_quantities:
+            bump_catalog_version("inventory decremented by order")
         
         # Save user details for future orders
         saved_details = {
@@ -1129,7 +1450,7 @@ async def create_order(order_data: OrderCreate, current_user: dict = Depends(get
             "state": order_data.state,
             "pincode": order_data.pincode,
             "location": location_value,
-            "updated_at": datetime.now(timezone.utc).isoformat()
+            "updated_at": datetime.now(timezone.utc)
         }
         await db.saved_user_details.update_one(
             {"identifier": order_data.phone},
@@ -1172,17 +1493,17 @@ async def create_order(order_data: OrderCreate, current_user: dict = Depends(get
             "items": items_list
         }
         
-        # Send order confirmation email immediately when order is created
-        # Customer will receive confirmation that order has been placed
+        # Queue the order confirmation email - the outbox workers send it in the background
         if order_data.email:
             try:
-                email_sent = await send_order_confirmation_email_gmail(order_data.email, {**email_data, "order_status": order_status, "payment_status": payment_status})
-                if email_sent:
-                    logger.info(f"✅ Order confirmation email sent successfully to {order_data.email} for order {order_id}")
-                else:
-                    logger.warning(f"⚠️ Order confirmation email failed for {order_data.email}")
+                await email_outbox.enqueue(
+                    "order_confirmation",
+                    order_data.email,
+                    {"order": {**email_data, "order_status": order_status, "payment_status": payment_status}},
+                    ref_id=order_id
+                )
             except Exception as email_error:
-                logger.error(f"❌ Failed to send order confirmation email: {str(email_error)}")
+                logger.error(f"❌ Failed to queue order confirmation email: {str(email_error)}")
         
         # Remove MongoDB _id field before returning
         order.pop("_id", None)
@@ -1210,26 +1531,8 @@ async def create_order(order_data: OrderCreate, current_user: dict = Depends(get
 @api_router.get("/orders/track/{identifier}")
 async def track_order(identifier: str):
     """Track order by order_id, tracking_code, phone number, or email (public API)"""
-    # Check if identifier is order_id or tracking_code (return single order)
-    order = await db.orders.find_one(
-        {"$or": [
-            {"order_id": identifier}, 
-            {"tracking_code": identifier}
-        ]},
-        {"_id": 0}
-    )
-    
-    if order:
-        return {"orders": [order], "total": 1}
-    
-    # If not found by order_id/tracking_code, search by phone or email (return all orders)
-    orders = await db.orders.find(
-        {"$or": [
-            {"phone": identifier},
-            {"email": identifier}
-        ]},
-        {"_id": 0}
-    ).sort("order_date", -1).to_list(length=100)  # Sort by newest first, limit 100
+    # A single order for an order_id/tracking_code, otherwise every order for the phone or email
+    orders = await tracking_cache.lookup(db, identifier)
     
     if not orders:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -1296,31 +1599,53 @@ async def verify_razorpay_payment(data: dict):
             logger.error(f"Payment signature verification failed for order {order_id}")
             raise HTTPException(status_code=400, detail="Invalid payment signature")
         
+        # Paid - the held stock now belongs to this order (taken again if its hold already lapsed)
+        try:
+            await commit_order_stock(order_id)
+        except InsufficientInventory:
+            # The money is already captured, so record the payment and leave the order for a refund
+            await update_order(
+                order_id, {
+                    "payment_status": "completed",
+                    "razorpay_order_id": razorpay_order_id,
+                    "razorpay_payment_id": razorpay_payment_id,
+                    "payment_verified_at": datetime.now(timezone.utc),
+                    "refund_required": True,
+                    "refund_reason": LAPSED_STOCK_DETAIL
+                }
+            )
+            logger.error(f"Order {order_id} was paid after its stock was released - flagged for refund")
+            raise HTTPException(status_code=409, detail=f"{LAPSED_STOCK_DETAIL}. Your payment will be refunded.")
+        
         # Update order payment status and order status
-        result = await db.orders.update_one(
-            {"order_id": order_id},
-            {"$set": {
+        updated = await update_order(
+            order_id, {
                 "payment_status": "completed",
                 "order_status": "confirmed",
                 "razorpay_order_id": razorpay_order_id,
                 "razorpay_payment_id": razorpay_payment_id,
-                "payment_verified_at": datetime.now(timezone.utc).isoformat()
-            }}
+                "payment_verified_at": datetime.now(timezone.utc)
+            }
         )
         
-        if result.matched_count == 0:
+        if updated is None:
             raise HTTPException(status_code=404, detail="Order not found")
         
         # Get updated order
         order = await db.orders.find_one({"order_id": order_id}, {"_id": 0})
         
-        # Send confirmation email
+        # Queue the confirmation email (a no-op if checkout already queued it)
         if order and order.get("email"):
             try:
-                send_order_confirmation_email_gmail(order)
-                logger.info(f"Order confirmation email sent to {order.get('email')} for order {order_id}")
+                order_date = parse_timestamp(order.get("created_at")) or datetime.now(timezone.utc)
+                await email_outbox.enqueue(
+                    "order_confirmation",
+                    order["email"],
+                    {"order": {**order, "order_date": order_date.strftime("%B %d, %Y")}},
+                    ref_id=order_id
+                )
             except Exception as email_error:
-                logger.error(f"Failed to send confirmation email: {str(email_error)}")
+                logger.error(f"Failed to queue confirmation email: {str(email_error)}")
         
         logger.info(f"Payment verified and order {order_id} updated successfully")
         
@@ -1337,18 +1662,50 @@ async def verify_razorpay_payment(data: dict):
         raise HTTPException(status_code=500, detail=f"Failed to verify payment: {str(e)}")
 
 @api_router.get("/orders/user/{user_id}")
-async def get_user_orders(user_id: str, current_user: dict = Depends(get_current_user)):
-    """Get all orders for a user"""
+async def get_user_orders(
+    user_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = USER_ORDER_PAGE_SIZE,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a user's orders, newest first - the next page's cursor is in the X-Next-Cursor header"""
     if user_id != current_user["id"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    orders = await db.orders.find({"user_id": user_id}, {"_id": 0}).sort("created_at", -1).to_list(100)
+    try:
+        query = order_filter(cursor=cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    query = {"$and": [{"user_id": user_id}, query]} if query else {"user_id": user_id}
+    
+    orders, next_cursor = await fetch_order_page(db, query, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return orders
 
 @api_router.get("/orders")
-async def get_all_orders(current_user: dict = Depends(get_current_user)):
-    """Get all orders (Admin only)"""
-    orders = await db.orders.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
+async def get_all_orders(
+    response: Response,
+    status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    city: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    custom_city: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    limit: int = ORDER_PAGE_SIZE,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get orders, newest first, one page at a time (Admin only) - the next page's cursor is in the X-Next-Cursor header"""
+    try:
+        query = order_filter(status, payment_status, city, date_from, date_to, custom_city, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    orders, next_cursor = await fetch_order_page(db, query, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return orders
 
 @api_router.put("/orders/{order_id}/status")
@@ -1365,29 +1722,38 @@ async def update_order_status(order_id: str, data: dict, current_user: dict = De
     
     old_status = order.get("order_status", "")
     
-    result = await db.orders.update_one(
-        {"order_id": order_id},
-        {"$set": {"order_status": status}}
-    )
+    if commits_stock(status):
+        # Moved on from pending by hand - the sweeper must not hand this stock back
+        try:
+            await commit_order_stock(order_id)
+        except InsufficientInventory:
+            raise HTTPException(status_code=409, detail=LAPSED_STOCK_DETAIL)
     
-    if result.matched_count == 0:
+    fields = {"order_status": status}
+    if status == "cancelled":
+        fields["cancelled"] = True
+    updated = await update_order(order_id, fields)
+    
+    if updated is None:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    # Send email notification if status changed and email exists
+    if status == "cancelled":
+        await cancel_order_stock(order_id)
+    
+    # Queue an email notification if status changed and email exists
     if old_status != status and order.get("email"):
         try:
-            logger.info(f"Attempting to send order status update email to {order.get('email')} for order {order_id}")
             # Update order data with new status for email
             order["order_status"] = status
-            email_sent = await send_order_status_update_email(order["email"], order, old_status, status)
-            if email_sent:
-                logger.info(f"✅ Order status update email sent successfully to {order.get('email')}")
-            else:
-                logger.warning(f"⚠️ Order status update email function returned False for {order.get('email')}")
+            await email_outbox.enqueue(
+                "order_status_update",
+                order["email"],
+                {"order": order, "old_status": old_status, "new_status": status},
+                ref_id=order_id,
+                variant=status
+            )
         except Exception as e:
-            logger.error(f"❌ Failed to send order status update email: {str(e)}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            logger.error(f"❌ Failed to queue order status update email: {str(e)}")
             # Don't fail the request if email fails
     
     return {"message": "Order status updated successfully"}
@@ -1397,18 +1763,19 @@ async def cancel_order(order_id: str, data: dict, current_user: dict = Depends(g
     """Cancel order (Admin only)"""
     cancel_reason = data.get("cancel_reason", "")
     
-    result = await db.orders.update_one(
-        {"order_id": order_id},
-        {"$set": {
+    updated = await update_order(
+        order_id, {
             "cancelled": True,
             "cancel_reason": cancel_reason,
             "order_status": "cancelled"
-        }}
+        }
     )
     
-    if result.matched_count == 0:
+    if updated is None:
         raise HTTPException(status_code=404, detail="Order not found")
     
+    await cancel_order_stock(order_id)
+    
     return {"message": "Order cancelled successfully"}
 
 @api_router.post("/orders/{order_id}/cancel-customer")
@@ -1429,9 +1796,7 @@ async def cancel_order_customer(order_id: str, data: dict):
             raise HTTPException(status_code=400, detail="Cannot cancel order that is already delivered or shipped")
         
         # Check 20-minute window
-        created_at = order.get("created_at")
-        if isinstance(created_at, str):
-            created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+        created_at = parse_timestamp(order.get("created_at"))
         
         time_diff = datetime.now(timezone.utc) - created_at
         minutes_passed = time_diff.total_seconds() / 60
@@ -1445,28 +1810,29 @@ async def cancel_order_customer(order_id: str, data: dict):
         cancel_reason = data.get("cancel_reason", "Customer requested cancellation")
         
         # Update order with cancellation info
-        result = await db.orders.update_one(
-            {"order_id": order_id},
-            {"$set": {
+        updated = await update_order(
+            order_id, {
                 "cancelled": True,
                 "cancelled_at": datetime.now(timezone.utc),
                 "cancel_reason": cancel_reason,
                 "order_status": "cancelled",
                 "cancellation_fee": 20.0
-            }}
+            }
         )
         
-        if result.matched_count == 0:
+        if updated is None:
             raise HTTPException(status_code=404, detail="Order not found")
         
-        # Send cancellation email
+        await cancel_order_stock(order_id)
+        
+        # Queue cancellation email
         if order.get("email"):
             try:
-                # Import email function if needed
-                from gmail_service import send_order_cancellation_email
-                await send_order_cancellation_email(order["email"], order, cancellation_fee=20.0)
+                await email_outbox.enqueue(
+                    "order_cancellation", order["email"], {"order": order, "cancellation_fee": 20.0}, ref_id=order_id
+                )
             except Exception as e:
-                logger.error(f"Failed to send cancellation email: {str(e)}")
+                logger.error(f"Failed to queue cancellation email: {str(e)}")
         
         return {
             "message": "Order cancelled successfully",
@@ -1496,31 +1862,35 @@ async def complete_payment(order_id: str, data: dict):
         if order.get("payment_status") == "completed":
             raise HTTPException(status_code=400, detail="Payment is already completed")
         
+        # Paid - the held stock now belongs to this order (taken again if its hold already lapsed)
+        try:
+            await commit_order_stock(order_id)
+        except InsufficientInventory:
+            raise HTTPException(status_code=409, detail=LAPSED_STOCK_DETAIL)
+        
         # Get payment details from request
         payment_method = data.get("payment_method", order.get("payment_method", "online"))
         payment_sub_method = data.get("payment_sub_method", order.get("payment_sub_method"))
         
         # Update order with payment completion
-        result = await db.orders.update_one(
-            {"order_id": order_id},
-            {"$set": {
+        updated = await update_order(
+            order_id, {
                 "payment_status": "completed",
                 "payment_method": payment_method,
                 "payment_sub_method": payment_sub_method,
                 "order_status": "confirmed"
-            }}
+            }
         )
         
-        if result.matched_count == 0:
+        if updated is None:
             raise HTTPException(status_code=404, detail="Order not found")
         
-        # Send payment confirmation email
+        # Queue payment confirmation email
         if order.get("email"):
             try:
-                from gmail_service import send_payment_completion_email
-                await send_payment_completion_email(order["email"], order)
+                await email_outbox.enqueue("payment_completion", order["email"], {"order": order}, ref_id=order_id)
             except Exception as e:
-                logger.error(f"Failed to send payment completion email: {str(e)}")
+                logger.error(f"Failed to queue payment completion email: {str(e)}")
         
         return {
             "message": "Payment completed successfully",
@@ -1550,33 +1920,32 @@ async def cancel_order_payment(order_id: str, data: dict = {}):
         cancel_reason = data.get("cancel_reason", "Payment cancelled by customer")
         
         # Update order to cancelled status
-        result = await db.orders.update_one(
-            {"order_id": order_id},
-            {"$set": {
+        updated = await update_order(
+            order_id, {
                 "cancelled": True,
                 "cancel_reason": cancel_reason,
-                "cancelled_at": datetime.now(timezone.utc).isoformat(),
+                "cancelled_at": datetime.now(timezone.utc),
                 "order_status": "cancelled",
                 "payment_status": "cancelled"
-            }}
+            }
         )
         
-        if result.matched_count == 0:
+        if updated is None:
             raise HTTPException(status_code=404, detail="Order not found")
         
         logger.info(f"🚫 ORDER CANCELLED: {order_id} - Reason: {cancel_reason}")
         
-        # Send cancellation email
+        if await release_holds(db, order_id):
+            bump_catalog_version("order payment cancelled")
+        
+        # Queue cancellation email - payment never completed, so there is no fee or refund
         if order.get("email"):
             try:
-                from gmail_service import send_order_cancellation_email
-                email_sent = await send_order_cancellation_email(order.get("email"), order, cancel_reason)
-                if email_sent:
-                    logger.info(f"✅ Cancellation email sent successfully to {order.get('email')} for order {order_id}")
-                else:
-                    logger.warning(f"⚠️ Cancellation email failed for {order.get('email')}")
+                await email_outbox.enqueue(
+                    "order_cancellation", order["email"], {"order": order, "cancellation_fee": 0.0}, ref_id=order_id
+                )
             except Exception as email_error:
-                logger.error(f"❌ Failed to send cancellation email: {str(email_error)}")
+                logger.error(f"❌ Failed to queue cancellation email: {str(email_error)}")
         
         return {"message": "Order cancelled successfully"}
     except HTTPException:
@@ -1606,90 +1975,229 @@ async def update_order_admin_fields(order_id: str, data: dict, current_user: dic
         raise HTTPException(status_code=404, detail="Order not found")
     
     old_status = order.get("order_status", "")
+    new_status = update_fields.get("order_status")
     
-    result = await db.orders.update_one(
-        {"order_id": order_id},
-        {"$set": update_fields}
-    )
+    if new_status is not None and commits_stock(new_status):
+        # Moved on from pending by hand - the sweeper must not hand this stock back
+        try:
+            await commit_order_stock(order_id)
+        except InsufficientInventory:
+            raise HTTPException(status_code=409, detail=LAPSED_STOCK_DETAIL)
+    if new_status == "cancelled":
+        update_fields["cancelled"] = True
     
-    if result.matched_count == 0:
+    updated = await update_order(order_id, update_fields)
+    
+    if updated is None:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    # Send email notification if order status was changed and email exists
+    if new_status == "cancelled":
+        await cancel_order_stock(order_id)
+    
+    # Queue an email notification if order status was changed and email exists
     if "order_status" in update_fields and old_status != update_fields["order_status"] and order.get("email"):
         try:
-            logger.info(f"Attempting to send order status update email to {order.get('email')} for order {order_id}")
             # Update order data with new status for email
             order["order_status"] = update_fields["order_status"]
-            email_sent = await send_order_status_update_email(order["email"], order, old_status, update_fields["order_status"])
-            if email_sent:
-                logger.info(f"✅ Order status update email sent successfully to {order.get('email')}")
-            else:
-                logger.warning(f"⚠️ Order status update email function returned False for {order.get('email')}")
+            await email_outbox.enqueue(
+                "order_status_update",
+                order["email"],
+                {"order": order, "old_status": old_status, "new_status": update_fields["order_status"]},
+                ref_id=order_id,
+                variant=update_fields["order_status"]
+            )
         except Exception as e:
-            logger.error(f"❌ Failed to send order status update email: {str(e)}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            logger.error(f"❌ Failed to queue order status update email: {str(e)}")
             # Don't fail the request if email fails
     
     return {"message": "Order updated successfully"}
 
+# ============= BULK ORDER APIS =============
+
+MAX_BULK_ORDER_UPDATES = 500
+
+@api_router.post("/admin/orders/bulk-status")
+async def bulk_update_order_status(data: BulkOrderStatusUpdate, current_user: dict = Depends(get_current_user)):
+    """Move many orders to a new status in one bulk_write, validating each transition (Admin only)"""
+    new_status = data.status
+    if len(data.order_ids) > MAX_BULK_ORDER_UPDATES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_ORDER_UPDATES} orders can be updated at once")
+    if new_status == "cancelled":
+        # Cancelling also returns stock and may charge a fee - that goes through the cancel endpoint
+        raise HTTPException(status_code=400, detail="Use the cancel endpoint to cancel orders")
+    
+    results = [{"order_id": order_id, "status": "pending"} for order_id in data.order_ids]
+    
+    # One read for every order in the request
+    orders = await db.orders.find({"order_id": {"$in": list(set(data.order_ids))}}, {"_id": 0}).to_list(None)
+    orders_by_id = {order["order_id"]: order for order in orders}
+    
+    operations = []
+    queued_items = []  # index into results for each queued operation
+    seen = set()
+    for index, result in enumerate(results):
+        order_id = result["order_id"]
+        if order_id in seen:
+            result.update({"status": "error", "detail": "Duplicate order id in request"})
+            continue
+        seen.add(order_id)
+        
+        order = orders_by_id.get(order_id)
+        if order is None:
+            result.update({"status": "not_found", "detail": "Order not found"})
+            continue
+        old_status = order.get("order_status", "")
+        result["old_status"] = old_status
+        if old_status == new_status:
+            result["status"] = "unchanged"
+            continue
+        try:
+            check_transition(old_status, new_status)
+        except InvalidTransition as e:
+            result.update({"status": "error", "detail": str(e)})
+            continue
+        if order.get("inventory_hold_lapsed") and commits_stock(new_status):
+            # Paid or approved after the sweeper returned its stock - take it again first
+            try:
+                await commit_order_stock(order_id)
+            except InsufficientInventory:
+                result.update({"status": "error", "detail": LAPSED_STOCK_DETAIL})
+                continue
+        
+        # Only applies if nobody changed the status since we read it
+        operations.append(UpdateOne({"order_id": order_id, "order_status": old_status}, {"$set": {"order_status": new_status}}))
+        queued_items.append(index)
+    
+    failed_items = set()
+    if operations:
+        try:
+            write = await db.orders.bulk_write(operations, ordered=False)
+            matched = write.matched_count
+        except BulkWriteError as e:
+            matched = e.details.get("nMatched", 0)
+            for write_error in e.details.get("writeErrors", []):
+                index = queued_items[write_error["index"]]
+                failed_items.add(index)
+                results[index].update({"status": "error", "detail": write_error.get("errmsg", "Write failed")})
+        
+        if matched < len(operations) - len(failed_items):
+            # Some orders changed under us - find out which ones
+            current = await db.orders.find(
+                {"order_id": {"$in": [results[index]["order_id"] for index in queued_items]}},
+                {"_id": 0, "order_id": 1, "order_status": 1}
+            ).to_list(None)
+            current_status = {order["order_id"]: order.get("order_status") for order in current}
+            for index in queued_items:
+                if index not in failed_items and current_status.get(results[index]["order_id"]) != new_status:
+                    failed_items.add(index)
+                    results[index].update({"status": "conflict", "detail": "Order status changed during the update - retry"})
+    
+    updated = []
+    for index in queued_items:
+        if index not in failed_items:
+            results[index]["status"] = "updated"
+            updated.append(orders_by_id[results[index]["order_id"]])
+    
+    if updated:
+        if commits_stock(new_status):
+            await commit_many_holds(db, [order["order_id"] for order in updated])
+        await apply_many_rollup_changes(db, [(order, {**order, "order_status": new_status}) for order in updated])
+        for order in updated:
+            analytics_cache.invalidate_order(order)
+            tracking_cache.invalidate_order(order["order_id"])
+        
+        # Every customer notification goes into the outbox in one insert
+        try:
+            await email_outbox.enqueue_many([
+                (
+                    "order_status_update",
+                    order.get("email"),
+                    {"order": {**order, "order_status": new_status}, "old_status": order.get("order_status", ""), "new_status": new_status},
+                    order["order_id"],
+                    new_status
+                )
+                for order in updated
+            ])
+        except Exception as e:
+            logger.error(f"❌ Failed to queue bulk order status update emails: {str(e)}")
+    
+    return {
+        "message": f"{len(updated)} of {len(results)} orders moved to {new_status}",
+        "updated": len(updated),
+        "failed": sum(1 for result in results if result["status"] not in ("updated", "unchanged")),
+        "results": results
+    }
+
 @api_router.get("/orders/analytics/summary")
 async def get_orders_analytics(current_user: dict = Depends(get_current_user)):
-    """Get order analytics and statistics"""
+    """Get order analytics and statistics from the daily/monthly sales rollups"""
     try:
-        # Get all orders
-        all_orders = await db.orders.find({}, {"_id": 0}).to_list(10000)
-        
-        # Filter out cancelled orders for sales calculations
-        non_cancelled_orders = [o for o in all_orders if not o.get("cancelled", False) and o.get("order_status") != "cancelled"]
-        
-        # Calculate statistics
-        total_orders = len(all_orders)
-        # Only sum sales from non-cancelled orders
-        total_sales = sum(order.get("total", 0) for order in non_cancelled_orders)
-        active_orders = len([o for o in non_cancelled_orders if o.get("order_status") != "delivered"])
-        cancelled_orders = len([o for o in all_orders if o.get("cancelled", False) or o.get("order_status") == "cancelled"])
-        completed_orders = len([o for o in non_cancelled_orders if o.get("order_status") == "delivered"])
-        
-        # Monthly sales - only include non-cancelled orders
-        from collections import defaultdict
-        monthly_sales = defaultdict(float)
-        monthly_orders = defaultdict(int)
-        
-        for order in non_cancelled_orders:
-            created_at = order.get("created_at", "")
-            if created_at:
-                try:
-                    order_date = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                    month_key = order_date.strftime("%Y-%m")
-                    monthly_sales[month_key] += order.get("total", 0)
-                    monthly_orders[month_key] += 1
-                except:
-                    pass
-        
-        # Top products - only include non-cancelled orders
-        product_counts = defaultdict(int)
-        for order in non_cancelled_orders:
-            for item in order.get("items", []):
-                product_counts[item.get("name", "Unknown")] += item.get("quantity", 0)
-        
-        top_products = sorted(product_counts.items(), key=lambda x: x[1], reverse=True)[:10]
-        
-        return {
-            "total_orders": total_orders,
-            "total_sales": total_sales,
-            "active_orders": active_orders,
-            "cancelled_orders": cancelled_orders,
-            "completed_orders": completed_orders,
-            "monthly_sales": dict(monthly_sales),
-            "monthly_orders": dict(monthly_orders),
-            "top_products": [{"name": name, "count": count} for name, count in top_products]
-        }
+        return await sales_summary(db)
     except Exception as e:
         logger.error(f"Error getting analytics: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get analytics: {str(e)}")
 
+@api_router.get("/orders/analytics/breakdown")
+async def get_orders_breakdown(
+    group_by: str,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    city: Optional[str] = None,
+    state: Optional[str] = None,
+    payment_method: Optional[str] = None,
+    include_cancelled: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """Sales grouped by city, state, payment_method or product over a date range (Admin only)"""
+    filters = {"city": city, "state": state, "payment_method": payment_method}
+    try:
+        rows = await analytics_cache.breakdown(db, group_by, date_from, date_to, filters, include_cancelled)
+    except InvalidBreakdown as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "group_by": group_by,
+        "date_from": date_from,
+        "date_to": date_to,
+        "filters": {field: value for field, value in filters.items() if value},
+        "rows": rows
+    }
+
+@api_router.get("/admin/orders/export")
+async def export_orders(
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    file_format: str = Query("csv", alias="format"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Download orders as CSV or Parquet, one row per line item (Admin only)"""
+    if file_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    
+    date_from, date_to = await export_bounds(db, date_from, date_to)
+    filename = f"orders-{date_from:%Y%m%d}-{date_to:%Y%m%d}.{file_format}"
+    
+    if file_format == "csv":
+        return StreamingResponse(
+            stream_csv(db, date_from, date_to),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+    
+    # Parquet's footer is written last, so the file is built on disk and then streamed back
+    fd, path = tempfile.mkstemp(suffix=".parquet")
+    os.close(fd)
+    try:
+        await write_parquet(db, date_from, date_to, path)
+    except ExportUnavailable as e:
+        os.unlink(path)
+        raise HTTPException(status_code=501, detail=str(e))
+    except Exception:
+        os.unlink(path)
+        raise
+    return FileResponse(
+        path, media_type="application/vnd.apache.parquet", filename=filename, background=BackgroundTask(os.unlink, path)
+    )
+
 # ============= USER DETAILS API =============
 
 @api_router.get("/user-details/{identifier}")
@@ -1724,11 +2232,9 @@ async def get_user_details(identifier: str):
 
 # ============= LOCATIONS API =============
 
-@api_router.get("/locations")
-async def get_locations():
-    """Get delivery locations with state information"""
+async def _load_locations():
     # Check if custom locations exist in database
-    locations = await db.locations.find({}, {"_id": 0}).to_list(1000)
+    locations = await db.locations.find({}, {"_id": 0, "name_key": 0, "state_key": 0}).to_list(1000)
     
     if not locations:
         # Return default cities with charges and state information
@@ -1753,16 +2259,16 @@ async def get_locations():
         for loc in locations:
             if "state" not in loc or not loc["state"]:
                 # Determine state based on city name
-                city_name = loc["name"]
-                if city_name in ANDHRA_PRADESH_CITIES:
-                    loc["state"] = "Andhra Pradesh"
-                elif city_name in TELANGANA_CITIES:
-                    loc["state"] = "Telangana"
-                else:
-                    loc["state"] = "Andhra Pradesh"  # Default
+                loc["state"] = default_state(loc["name"])
     
     return locations
 
+@api_router.get("/locations")
+async def get_locations(request: Request):
+    """Get delivery locations with state information"""
+    body = await get_or_build_body("locations", _load_locations)
+    return encoded_response(request, body)
+
 @api_router.post("/admin/locations")
 async def update_locations(locations: List[Location], current_user: dict = Depends(get_current_user)):
     """Update delivery locations (Admin only)"""
@@ -1771,9 +2277,12 @@ async def update_locations(locations: List[Location], current_user: dict = Depen
     
     # Insert new locations
     if locations:
-        location_dicts = [loc.model_dump() for loc in locations]
+        location_dicts = [{**loc.model_dump(), **location_keys(loc.name, loc.state)} for loc in locations]
         await db.locations.insert_many(location_dicts)
     
+    await location_index.load(db)
+    bump_catalog_version("locations replaced")
+    invalidate_body("locations")
     return {"message": "Locations updated successfully"}
 
 @api_router.put("/admin/locations/{city_name}")
@@ -1798,6 +2307,7 @@ async def update_city_settings(
             update_data["free_delivery_threshold"] = free_delivery_threshold
         if state is not None:
             update_data["state"] = state
+            update_data.update(location_keys(city_name, state))
         
         if update_data:
             await db.locations.update_one({"name": city_name}, {"$set": update_data})
@@ -1810,17 +2320,15 @@ async def update_city_settings(
             city_data["free_delivery_threshold"] = free_delivery_threshold
         
         # Determine state - use provided state or auto-detect
-        if state:
-            city_data["state"] = state
-        elif city_name in ANDHRA_PRADESH_CITIES:
-            city_data["state"] = "Andhra Pradesh"
-        elif city_name in TELANGANA_CITIES:
-            city_data["state"] = "Telangana"
-        else:
-            city_data["state"] = "Andhra Pradesh"
+        city_data["state"] = state or default_state(city_name)
+        city_data.update(location_keys(city_name, city_data["state"]))
         
         await db.locations.insert_one(city_data)
     
+    await location_index.load(db)
+    # City state may have changed - state-filtered catalogs depend on it
+    bump_catalog_version("city settings updated")
+    invalidate_body("locations")
     return {"message": f"Settings updated for {city_name}"}
 
 @api_router.delete("/admin/locations/{city_name}")
@@ -1831,6 +2339,9 @@ async def delete_location(city_name: str, current_user: dict = Depends(get_curre
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Location not found")
     
+    await location_index.load(db)
+    bump_catalog_version("location deleted")
+    invalidate_body("locations")
     return {"message": f"Location '{city_name}' deleted successfully"}
 
 # ============= CUSTOM CITY API =============
@@ -1919,13 +2430,17 @@ async def approve_custom_city(data: dict, current_user: dict = Depends(get_curre
     city_data = {
         "name": city_name,
         "state": state_name,
-        "charge": delivery_charge
+        "charge": delivery_charge,
+        **location_keys(city_name, state_name)
     }
     
     if free_delivery_threshold:
         city_data["free_delivery_threshold"] = free_delivery_threshold
     
     await db.locations.insert_one(city_data)
+    await location_index.load(db)
+    bump_catalog_version("custom city approved")
+    invalidate_body("locations")
     
     # Check if there's a matching city suggestion and update its status + send email
     try:
@@ -1942,13 +2457,12 @@ async def approve_custom_city(data: dict, current_user: dict = Depends(get_curre
                 {"$set": {"status": "approved", "updated_at": datetime.now(timezone.utc)}}
             )
             
-            # Send approval email if customer provided email
+            # Queue approval email if customer provided email
             if suggestion.get("email"):
                 try:
-                    await send_city_approval_email(suggestion["email"], suggestion)
-                    logger.info(f"City approval email sent to {suggestion['email']} for {city_name}, {state_name}")
+                    await email_outbox.enqueue("city_approval", suggestion["email"], {"suggestion": suggestion}, ref_id=suggestion["id"])
                 except Exception as e:
-                    logger.error(f"Failed to send city approval email: {str(e)}")
+                    logger.error(f"Failed to queue city approval email: {str(e)}")
     except Exception as e:
         logger.error(f"Error updating city suggestion: {str(e)}")
         # Don't fail the approval if email/suggestion update fails
@@ -1963,9 +2477,7 @@ async def approve_custom_city(data: dict, current_user: dict = Depends(get_curre
 
 # ============= STATES API =============
 
-@api_router.get("/states")
-async def get_states():
-    """Get available states"""
+async def _load_states():
     # Check if custom states exist in database
     states = await db.states.find({}, {"_id": 0}).to_list(1000)
     
@@ -1979,6 +2491,12 @@ async def get_states():
     
     return states
 
+@api_router.get("/states")
+async def get_states(request: Request):
+    """Get available states"""
+    body = await get_or_build_body("states", _load_states)
+    return encoded_response(request, body)
+
 @api_router.get("/admin/states")
 async def get_admin_states(current_user: dict = Depends(get_current_user)):
     """Get all states for admin management"""
@@ -2003,6 +2521,7 @@ async def add_state(state: State, current_user: dict = Depends(get_current_user)
         raise HTTPException(status_code=400, detail="State already exists")
     
     await db.states.insert_one(state.model_dump())
+    invalidate_body("states")
     return {"message": f"State '{state.name}' added successfully"}
 
 @api_router.put("/admin/states/{state_name}")
@@ -2017,6 +2536,7 @@ async def update_state(state_name: str, state: State, current_user: dict = Depen
         # If state doesn't exist, create it
         await db.states.insert_one({"name": state_name, "enabled": state.enabled})
     
+    invalidate_body("states")
     return {"message": f"State '{state_name}' updated successfully"}
 
 @api_router.delete("/admin/states/{state_name}")
@@ -2027,6 +2547,7 @@ async def delete_state(state_name: str, current_user: dict = Depends(get_current
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="State not found")
     
+    invalidate_body("states")
     return {"message": f"State '{state_name}' deleted successfully"}
 
 
@@ -2037,6 +2558,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # City Suggestion endpoint
@@ -2051,7 +2573,7 @@ async def suggest_city(data: dict):
             "customer_name": data.get("customer_name"),
             "phone": data.get("phone"),
             "email": data.get("email"),
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": datetime.now(timezone.utc),
             "status": "pending"
         }
         
@@ -2073,7 +2595,7 @@ async def create_city_suggestion(data: dict):
             "customer_name": data.get("customer_name", ""),
             "phone": data.get("phone"),
             "email": data.get("email"),
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": datetime.now(timezone.utc),
             "status": "pending"
         }
         
@@ -2291,13 +2813,17 @@ async def update_city_suggestion_status(
                 city_data = {
                     "name": suggestion.get("city"),
                     "state": suggestion.get("state"),
-                    "charge": delivery_charge
+                    "charge": delivery_charge,
+                    **location_keys(suggestion.get("city"), suggestion.get("state"))
                 }
                 
                 if free_delivery_threshold:
                     city_data["free_delivery_threshold"] = free_delivery_threshold
                 
                 await db.locations.insert_one(city_data)
+                await location_index.load(db)
+                bump_catalog_version("city suggestion approved")
+                invalidate_body("locations")
                 logger.info(f"City {suggestion.get('city')}, {suggestion.get('state')} added to locations with charge Rs.{delivery_charge}")
         
         # Update suggestion status
@@ -2309,17 +2835,15 @@ async def update_city_suggestion_status(
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="City suggestion not found")
         
-        # Send email notifications based on status
+        # Queue email notifications based on status
         if suggestion.get("email"):
             try:
                 if status == "approved":
-                    await send_city_approval_email(suggestion["email"], suggestion)
-                    logger.info(f"City approval email sent to {suggestion['email']} for {suggestion.get('city')}, {suggestion.get('state')}")
+                    await email_outbox.enqueue("city_approval", suggestion["email"], {"suggestion": suggestion}, ref_id=suggestion_id)
                 elif status == "rejected":
-                    await send_city_rejection_email(suggestion["email"], suggestion)
-                    logger.info(f"City rejection email sent to {suggestion['email']} for {suggestion.get('city')}, {suggestion.get('state')}")
+                    await email_outbox.enqueue("city_rejection", suggestion["email"], {"suggestion": suggestion}, ref_id=suggestion_id)
             except Exception as e:
-                logger.error(f"Failed to send city status email: {str(e)}")
+                logger.error(f"Failed to queue city status email: {str(e)}")
                 # Don't fail the request if email fails
         
         return {"message": "City suggestion status updated successfully"}
@@ -2672,7 +3196,7 @@ async def verify_otp_and_change_password(
         
         # For now, we'll update the ADMIN_PASSWORD environment variable
         # Note: This only persists in the .env file
-        new_password_hash = get_password_hash(verify_request.new_password)
+        new_password_hash = await get_password_hash_async(verify_request.new_password)
         
         # Update admin profile with new password hash
         await db.admin_profile.update_one(
@@ -2746,7 +3270,7 @@ async def report_issue(
             "description": description,
             "page": page,
             "screenshot": screenshot_path,
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": datetime.now(timezone.utc),
             "status": "open"
         }
         
@@ -2756,6 +3280,52 @@ async def report_issue(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to submit issue report: {str(e)}")
 
+# ============= EMAIL OUTBOX APIS =============
+
+@api_router.get("/admin/email-outbox")
+async def get_email_outbox(status: Optional[str] = "dead", limit: int = 100, current_user: dict = Depends(get_current_user)):
+    """List queued emails by status - dead-lettered ones by default (Admin only)"""
+    query = {"status": status} if status else {}
+    messages = await db.email_outbox.find(query, {"_id": 0, "payload": 0}).sort("created_at", -1).to_list(min(limit, 500))
+    return messages
+
+@api_router.post("/admin/email-outbox/{message_id}/retry")
+async def retry_email(message_id: str, current_user: dict = Depends(get_current_user)):
+    """Requeue a dead-lettered email (Admin only)"""
+    if not await email_outbox.retry(message_id):
+        raise HTTPException(status_code=404, detail="No dead-lettered email with this id")
+    return {"message": "Email requeued"}
+
+# ============= LIFECYCLE =============
+
+# Converts ISO-string timestamps written by older releases to native datetimes (see timestamps.py)
+timestamp_migration = None
+
+@app.on_event("startup")
+async def start_background_services():
+    """Provision indexes, materialize discounts, arm the discount scheduler, build the availability and location indexes and start background workers"""
+    global timestamp_migration
+    await ensure_indexes(db)
+    timestamp_migration = asyncio.create_task(run_migration(db))
+    await discount_scheduler.start()
+    await availability_index.load(db)
+    await location_index.load(db)
+    await ensure_rollups(db)
+    await reservation_sweeper.start()
+    await email_outbox.start()
+    bump_catalog_version("startup")
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    if timestamp_migration and not timestamp_migration.done():
+        timestamp_migration.cancel()
+    discount_scheduler.stop()
+    reservation_sweeper.stop()
+    email_outbox.stop()
+    await asyncio.to_thread(close_transports)
+    shutdown_hash_executor()
+    client.close()
+
 # Include router
 app.include_router(api_router)
 
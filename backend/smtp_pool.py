@@ -0,0 +1,137 @@
+import logging
+import queue
+import smtplib
+import ssl
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Errors after which a session is thrown away and the send retried on a fresh one
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+
+class _Session:
+    __slots__ = ("smtp", "opened_at", "last_used")
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.opened_at = time.monotonic()
+        self.last_used = self.opened_at
+
+
+class SMTPPool:
+    """A small pool of authenticated, long-lived SMTP sessions shared by sending threads.
+
+    Sessions idle for longer than idle_check_seconds are checked with NOOP before reuse,
+    sessions older than max_age_seconds are retired, and a send that hits a dropped
+    connection is retried once on a fresh session. The API is blocking - call it from a
+    worker thread (asyncio.to_thread), never from the event loop.
+    """
+
+    def __init__(self, host: str, port: int, use_ssl: bool = True, username: str = "", password: str = "",
+                 size: int = 4, timeout: float = 30, idle_check_seconds: float = 30, max_age_seconds: float = 600):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.username = username
+        self.password = password
+        self.size = size
+        self.timeout = timeout
+        self.idle_check_seconds = idle_check_seconds
+        self.max_age_seconds = max_age_seconds
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.connections_opened = 0
+
+    def _connect(self) -> _Session:
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout, context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if not self.use_ssl:
+                smtp.ehlo()
+                # Never send credentials in the clear - login() requires the upgrade to succeed
+                if self.username or smtp.has_extn("starttls"):
+                    smtp.starttls(context=ssl.create_default_context())
+                    smtp.ehlo()
+            if self.username:
+                smtp.login(self.username, self.password)
+        except Exception:
+            self._close(smtp)
+            raise
+        self.connections_opened += 1
+        logger.info(f"Opened SMTP session to {self.host}:{self.port} ({self.connections_opened} opened so far)")
+        return _Session(smtp)
+
+    @staticmethod
+    def _close(smtp):
+        try:
+            smtp.quit()
+        except Exception:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+
+    def _is_healthy(self, session: _Session) -> bool:
+        now = time.monotonic()
+        if now - session.opened_at > self.max_age_seconds:
+            return False
+        if now - session.last_used < self.idle_check_seconds:
+            return True
+        try:
+            return session.smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _acquire(self) -> _Session:
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if self._is_healthy(session):
+                return session
+            self._close(session.smtp)
+
+    def send_message(self, msg):
+        """Send msg on a pooled session, reconnecting once if the server dropped it"""
+        with self._slots:
+            session = self._acquire()
+            try:
+                try:
+                    session.smtp.send_message(msg)
+                except RECONNECT_ERRORS as e:
+                    logger.warning(f"SMTP session dropped ({type(e).__name__}), reconnecting")
+                    self._close(session.smtp)
+                    session = self._connect()
+                    session.smtp.send_message(msg)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException):
+                # The server rejected this message, but the session itself is still usable
+                self._release(session)
+                raise
+            except BaseException:
+                self._close(session.smtp)
+                raise
+            session.last_used = time.monotonic()
+            self._idle.put(session)
+
+    def _release(self, session: _Session):
+        try:
+            session.smtp.rset()
+        except Exception:
+            self._close(session.smtp)
+            return
+        session.last_used = time.monotonic()
+        self._idle.put(session)
+
+    def close(self):
+        """Log out of every idle session"""
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(session.smtp)
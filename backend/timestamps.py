@@ -0,0 +1,154 @@
+"""Native BSON datetimes for stored timestamps, and the migration that converts old ISO strings.
+
+    python timestamps.py migrate   # convert every registered field, resuming where it stopped
+    python timestamps.py status    # show the recorded schema version and progress
+"""
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Schema version once every field below holds a native datetime
+TIMESTAMP_SCHEMA_VERSION = 2
+
+TIMESTAMP_FIELDS = {
+    "orders": ["created_at", "estimated_delivery", "payment_verified_at", "cancelled_at"],
+    "city_suggestions": ["created_at", "updated_at"],
+    "bug_reports": ["created_at", "updated_at"],
+    "issue_reports": ["created_at"],
+    "users": ["created_at"],
+    "saved_user_details": ["updated_at"]
+}
+
+MIGRATION_ID = "timestamps"
+MIGRATION_BATCH_SIZE = int(os.environ.get('TIMESTAMP_MIGRATION_BATCH_SIZE', '500'))
+
+
+def as_utc(value: datetime) -> datetime:
+    """Aware UTC datetime - naive values are taken to be UTC already"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def parse_timestamp(value):
+    """Aware UTC datetime from a stored timestamp (datetime or ISO string), or None"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return as_utc(value)
+
+# ============= MIGRATION =============
+
+async def _migrate_collection(db, collection: str, fields: list, checkpoint: dict) -> int:
+    """Convert string timestamps in one collection, batch by batch in _id order; returns documents updated"""
+    has_strings = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    converted = 0
+    while True:
+        query = dict(has_strings)
+        if checkpoint.get(collection) is not None:
+            query["_id"] = {"$gt": checkpoint[collection]}
+        batch = await db[collection].find(
+            query, {field: 1 for field in fields}
+        ).sort("_id", 1).limit(MIGRATION_BATCH_SIZE).to_list(MIGRATION_BATCH_SIZE)
+        if not batch:
+            break
+
+        updates = []
+        for document in batch:
+            parsed = {
+                field: parse_timestamp(document[field])
+                for field in fields
+                if isinstance(document.get(field), str)
+            }
+            unparseable = [field for field, value in parsed.items() if value is None]
+            if unparseable:
+                logger.warning(f"{collection} {document['_id']}: cannot parse {', '.join(unparseable)} - left as is")
+            converted_fields = {field: value for field, value in parsed.items() if value is not None}
+            if converted_fields:
+                updates.append(UpdateOne({"_id": document["_id"]}, {"$set": converted_fields}))
+
+        if updates:
+            await db[collection].bulk_write(updates, ordered=False)
+            converted += len(updates)
+
+        # Record progress so an interrupted run picks up after the last finished batch
+        checkpoint[collection] = batch[-1]["_id"]
+        await db.schema_migrations.update_one(
+            {"_id": MIGRATION_ID}, {"$set": {f"checkpoint.{collection}": batch[-1]["_id"]}}, upsert=True
+        )
+        if len(batch) < MIGRATION_BATCH_SIZE:
+            break
+    return converted
+
+
+async def migrate_timestamps(db) -> int:
+    """Convert every registered timestamp field to a native datetime; returns documents updated"""
+    state = await db.schema_migrations.find_one({"_id": MIGRATION_ID}) or {}
+    if state.get("version", 0) >= TIMESTAMP_SCHEMA_VERSION:
+        return 0
+
+    checkpoint = state.get("checkpoint", {})
+    converted = 0
+    for collection, fields in TIMESTAMP_FIELDS.items():
+        count = await _migrate_collection(db, collection, fields, checkpoint)
+        if count:
+            logger.info(f"Converted timestamps on {count} {collection} documents")
+        converted += count
+
+    await db.schema_migrations.update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {"version": TIMESTAMP_SCHEMA_VERSION, "completed_at": datetime.now(timezone.utc)},
+         "$unset": {"checkpoint": ""}},
+        upsert=True
+    )
+    logger.info(f"Timestamp schema at version {TIMESTAMP_SCHEMA_VERSION} ({converted} documents converted)")
+    return converted
+
+
+async def run_migration(db):
+    """Background-task wrapper for startup - never lets a failure take the app down"""
+    try:
+        await migrate_timestamps(db)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Timestamp migration failed, rerun with 'python timestamps.py migrate': {str(e)}")
+
+# ============= CLI =============
+
+async def _main(command: str):
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    db = client[os.environ['DB_NAME']]
+    try:
+        if command == "migrate":
+            converted = await migrate_timestamps(db)
+            print(f"Converted {converted} documents")
+        state = await db.schema_migrations.find_one({"_id": MIGRATION_ID}) or {}
+        print(f"Timestamp schema version {state.get('version', 1)} (current {TIMESTAMP_SCHEMA_VERSION})")
+        if state.get("checkpoint"):
+            print(f"  resumable from {state['checkpoint']}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in ("migrate", "status"):
+        print(__doc__)
+        sys.exit(2)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(_main(sys.argv[1]))
@@ -0,0 +1,69 @@
+import hashlib
+import logging
+import os
+import time
+
+from cachetools import TTLCache
+
+from auth import decode_token
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '10000'))
+USER_CACHE_TTL_SECONDS = int(os.environ.get('USER_CACHE_TTL_SECONDS', '60'))
+
+
+class UserCache:
+    """Bounded TTL caches of decoded JWTs (keyed by token hash) and of user documents.
+
+    The token cache skips JWT verification for tokens seen recently; the user cache skips
+    the users lookup. Entries live at most ttl seconds, and invalidate_user() drops a
+    user as soon as their document changes.
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: int = USER_CACHE_TTL_SECONDS):
+        self._payloads = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._users = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._invalidations = 0
+
+    @staticmethod
+    def _token_key(token: str) -> str:
+        # Never keep raw bearer tokens in memory longer than the request
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def decode(self, token: str):
+        """Decoded JWT payload, or None if the token is invalid or expired"""
+        key = self._token_key(token)
+        payload = self._payloads.get(key)
+        if payload is not None:
+            if payload.get("exp", 0) > time.time():
+                return payload
+            self._payloads.pop(key, None)
+            return None
+
+        payload = decode_token(token)
+        if payload:
+            self._payloads[key] = payload
+        return payload
+
+    async def get_user(self, db, user_id: str):
+        """User document without password, or None if there is no such user"""
+        user = self._users.get(user_id)
+        if user is None:
+            invalidations = self._invalidations
+            user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+            if user is None:
+                return None
+            # Don't cache a document that was invalidated while we were reading it
+            if invalidations == self._invalidations:
+                self._users[user_id] = user
+        # Callers may modify what they get back
+        return dict(user)
+
+    def invalidate_user(self, user_id: str):
+        self._invalidations += 1
+        self._users.pop(user_id, None)
+
+    def clear(self):
+        self._payloads.clear()
+        self._users.clear()
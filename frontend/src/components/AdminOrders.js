@@ -28,6 +28,8 @@ const AdminOrders = () => {
   const [loading, setLoading] = useState(true);
   const [cancelModalOpen, setCancelModalOpen] = useState(false);
   const [orderToCancel, setOrderToCancel] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     fetchOrders();
@@ -38,9 +40,11 @@ const AdminOrders = () => {
     try {
       const token = localStorage.getItem('token');
       const response = await axios.get(`${API}/orders`, {
+        params: { limit: 200 },
         headers: { Authorization: `Bearer ${token}` }
       });
       setOrders(response.data);
+      setNextCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       toast({
         title: "Error",
@@ -52,6 +56,28 @@ const AdminOrders = () => {
     }
   };
 
+  const fetchMoreOrders = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const token = localStorage.getItem('token');
+      const response = await axios.get(`${API}/orders`, {
+        params: { limit: 200, cursor: nextCursor },
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      setOrders(prev => [...prev, ...response.data]);
+      setNextCursor(response.headers['x-next-cursor'] || null);
+    } catch (error) {
+      toast({
+        title: "Error",
+        description: "Failed to load more orders",
+        variant: "destructive"
+      });
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const fetchAnalytics = async () => {
     try {
       const token = localStorage.getItem('token');
@@ -111,6 +137,7 @@ const AdminOrders = () => {
       setEditingOrder(null);
       setEditData({});
       fetchOrders();
+      fetchAnalytics();
     } catch (error) {
       toast({
         title: "Error",
@@ -164,6 +191,32 @@ const AdminOrders = () => {
     );
   }, [filteredOrders]);
 
+  // The list only holds the pages loaded so far - with no filters set, the cards use the
+  // server-side sales summary so they cover every order, not just the loaded ones
+  const orderStats = useMemo(() => {
+    const unfiltered = !searchTerm && statusFilter === 'all' && !dateFilter.start && !dateFilter.end &&
+      cityFilter === 'all' && stateFilter === 'all';
+    if (unfiltered && analytics) {
+      return {
+        count: analytics.total_orders,
+        sales: analytics.total_sales,
+        active: analytics.active_orders,
+        delivered: analytics.completed_orders,
+        cancelled: analytics.cancelled_orders,
+        scope: 'All orders'
+      };
+    }
+    const live = sortedOrders.filter(o => !o.cancelled && o.order_status !== 'cancelled');
+    return {
+      count: sortedOrders.length,
+      sales: live.reduce((sum, order) => sum + (order.total || 0), 0),
+      active: sortedOrders.filter(o => !o.cancelled && o.order_status !== 'delivered').length,
+      delivered: sortedOrders.filter(o => o.order_status === 'delivered').length,
+      cancelled: sortedOrders.filter(o => o.cancelled).length,
+      scope: nextCursor ? `Loaded orders only (${orders.length} loaded)` : null
+    };
+  }, [sortedOrders, orders, analytics, nextCursor, searchTerm, statusFilter, dateFilter, cityFilter, stateFilter]);
+
   const formatAddress = (order) => {
     if (order.doorNo) {
       return `${order.doorNo}, ${order.building}, ${order.street}, ${order.city}, ${order.state} - ${order.pincode}`;
@@ -195,12 +248,12 @@ const AdminOrders = () => {
               <div className="flex items-center justify-between">
                 <div>
                   <p className="text-sm text-blue-600 font-medium mb-1">Total Orders</p>
-                  <p className="text-3xl font-bold text-blue-700">{sortedOrders.length}</p>
+                  <p className="text-3xl font-bold text-blue-700">{orderStats.count}</p>
                 </div>
                 <Package className="h-10 w-10 text-blue-400 opacity-50" />
               </div>
               <p className="text-xs text-blue-600 mt-2">
-                {sortedOrders.length === orders.length ? 'All orders' : `Filtered from ${orders.length} total`}
+                {orderStats.scope || (sortedOrders.length === orders.length ? 'All orders' : `Filtered from ${orders.length} total`)}
               </p>
             </div>
 
@@ -210,20 +263,21 @@ const AdminOrders = () => {
                 <div>
                   <p className="text-sm text-green-600 font-medium mb-1">Total Sales</p>
                   <p className="text-3xl font-bold text-green-700">
-                    ₹{sortedOrders
-                      .filter(order => !order.cancelled && order.order_status !== 'cancelled')
-                      .reduce((sum, order) => sum + (order.total || 0), 0)
-                      .toLocaleString()}
+                    ₹{orderStats.sales.toLocaleString()}
                   </p>
                 </div>
                 <TrendingUp className="h-10 w-10 text-green-400 opacity-50" />
               </div>
-              <p className="text-xs text-green-600 mt-2">Excluding cancelled orders</p>
+              <p className="text-xs text-green-600 mt-2">
+                Excluding cancelled orders{orderStats.scope ? ` · ${orderStats.scope}` : ''}
+              </p>
             </div>
 
             {/* Count by Status */}
             <div className="bg-gradient-to-br from-orange-50 to-orange-100 rounded-lg p-4 border border-orange-200">
-              <p className="text-sm text-orange-600 font-medium mb-3">By Status</p>
+              <p className="text-sm text-orange-600 font-medium mb-3">
+                By Status{orderStats.scope ? ` (${orderStats.scope})` : ''}
+              </p>
               <div className="space-y-2">
                 <div className="flex items-center justify-between text-sm">
                   <span className="text-gray-700 flex items-center gap-2">
@@ -231,7 +285,7 @@ const AdminOrders = () => {
                     Active
                   </span>
                   <span className="font-bold text-blue-700">
-                    {sortedOrders.filter(o => !o.cancelled && o.order_status !== 'delivered').length}
+                    {orderStats.active}
                   </span>
                 </div>
                 <div className="flex items-center justify-between text-sm">
@@ -240,7 +294,7 @@ const AdminOrders = () => {
                     Delivered
                   </span>
                   <span className="font-bold text-green-700">
-                    {sortedOrders.filter(o => o.order_status === 'delivered').length}
+                    {orderStats.delivered}
                   </span>
                 </div>
                 <div className="flex items-center justify-between text-sm">
@@ -249,7 +303,7 @@ const AdminOrders = () => {
                     Cancelled
                   </span>
                   <span className="font-bold text-red-700">
-                    {sortedOrders.filter(o => o.cancelled).length}
+                    {orderStats.cancelled}
                   </span>
                 </div>
               </div>
@@ -484,6 +538,11 @@ const AdminOrders = () => {
                       }`}>
                         {order.cancelled ? 'Cancelled' : order.order_status}
                       </span>
+                      {order.refund_required && (
+                        <span className="px-3 py-1 rounded-full text-xs font-medium bg-yellow-100 text-yellow-800" title={order.refund_reason}>
+                          Refund due
+                        </span>
+                      )}
                       {expandedOrder === order.id ? 
                         <ChevronUp className="h-5 w-5 text-gray-400" /> : 
                         <ChevronDown className="h-5 w-5 text-gray-400" />
@@ -534,6 +593,11 @@ const AdminOrders = () => {
                     }`}>
                       {order.cancelled ? 'Cancelled' : order.order_status}
                     </span>
+                    {order.refund_required && (
+                      <span className="inline-block ml-2 px-3 py-1 rounded-full text-xs font-medium bg-yellow-100 text-yellow-800" title={order.refund_reason}>
+                        Refund due
+                      </span>
+                    )}
                   </div>
                 </div>
               </div>
@@ -762,6 +826,18 @@ const AdminOrders = () => {
         )}
       </div>
 
+      {nextCursor && (
+        <div className="flex justify-center">
+          <button
+            onClick={fetchMoreOrders}
+            disabled={loadingMore}
+            className="px-6 py-2 bg-orange-600 text-white rounded-lg hover:bg-orange-700 disabled:opacity-50 font-medium"
+          >
+            {loadingMore ? 'Loading...' : 'Load older orders'}
+          </button>
+        </div>
+      )}
+
       {/* Cancel Order Modal */}
       <CancelOrderModal
         isOpen={cancelModalOpen}
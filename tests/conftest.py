@@ -0,0 +1,525 @@
+import copy
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+# Backend modules use flat imports (e.g. `from auth import ...`), as when run from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# server.py only connects to MongoDB on first use, so importing it in tests just needs these set
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+
+# ============= IN-MEMORY MONGODB =============
+
+_MISSING = object()
+
+
+def _get_path(doc, path):
+    """Values at a dotted path - lists fan out, as they do in MongoDB queries"""
+    values = [doc]
+    for part in path.split("."):
+        found = []
+        for value in values:
+            if isinstance(value, dict):
+                if part in value:
+                    found.append(value[part])
+            elif isinstance(value, list):
+                found.extend(item[part] for item in value if isinstance(item, dict) and part in item)
+        values = found
+    return values
+
+
+def _candidates(values):
+    # A field matches if it, or any element of an array it holds, matches
+    for value in values:
+        yield value
+        if isinstance(value, list):
+            yield from value
+
+
+def _compare(op, value, operand):
+    try:
+        if op == "$gt":
+            return value > operand
+        if op == "$gte":
+            return value >= operand
+        if op == "$lt":
+            return value < operand
+        return value <= operand
+    except TypeError:
+        return False  # MongoDB never matches across types
+
+
+def _matches_operator(values, op, operand):
+    if op == "$eq":
+        return any(value == operand for value in _candidates(values)) or (operand is None and not values)
+    if op == "$ne":
+        return not _matches_operator(values, "$eq", operand)
+    if op in ("$gt", "$gte", "$lt", "$lte"):
+        return any(value is not None and _compare(op, value, operand) for value in _candidates(values))
+    if op == "$in":
+        return any(_matches_operator(values, "$eq", option) for option in operand)
+    if op == "$nin":
+        return not _matches_operator(values, "$in", operand)
+    if op == "$exists":
+        return bool(values) == bool(operand)
+    if op == "$type":
+        types = {"date": datetime, "string": str, "bool": bool, "array": list, "object": dict}
+        return any(isinstance(value, types[operand]) for value in values)
+    raise NotImplementedError(f"Fake MongoDB does not support {op}")
+
+
+def matches(doc, query) -> bool:
+    for field, condition in query.items():
+        if field == "$and":
+            if not all(matches(doc, part) for part in condition):
+                return False
+        elif field == "$or":
+            if not any(matches(doc, part) for part in condition):
+                return False
+        elif field == "$nor":
+            if any(matches(doc, part) for part in condition):
+                return False
+        else:
+            values = _get_path(doc, field)
+            if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+                if not all(_matches_operator(values, op, operand) for op, operand in condition.items()):
+                    return False
+            elif not _matches_operator(values, "$eq", condition):
+                return False
+    return True
+
+
+def _parent(doc, path, create=True):
+    *parents, field = path.split(".")
+    target = doc
+    for part in parents:
+        if part not in target:
+            if not create:
+                return None, field
+            target[part] = {}
+        target = target[part]
+    return target, field
+
+
+def apply_update(doc, update, inserting=False):
+    if not any(key.startswith("$") for key in update):
+        kept_id = doc.get("_id", _MISSING)
+        doc.clear()
+        doc.update(copy.deepcopy(update))
+        if kept_id is not _MISSING:
+            doc.setdefault("_id", kept_id)
+        return
+    for op, fields in update.items():
+        if op == "$setOnInsert" and not inserting:
+            continue
+        for path, value in fields.items():
+            if op in ("$set", "$setOnInsert"):
+                target, field = _parent(doc, path)
+                target[field] = copy.deepcopy(value)
+            elif op == "$unset":
+                target, field = _parent(doc, path, create=False)
+                if target is not None:
+                    target.pop(field, None)
+            elif op == "$inc":
+                target, field = _parent(doc, path)
+                target[field] = target.get(field, 0) + value
+            elif op == "$push":
+                target, field = _parent(doc, path)
+                items = target.get(field, []) + (value["$each"] if isinstance(value, dict) and "$each" in value else [value])
+                if isinstance(value, dict) and "$slice" in value:
+                    items = items[value["$slice"]:] if value["$slice"] < 0 else items[:value["$slice"]]
+                target[field] = items
+            elif op == "$pull":
+                target, field = _parent(doc, path)
+                target[field] = [item for item in target.get(field, []) if item != value]
+            elif op == "$addToSet":
+                target, field = _parent(doc, path)
+                items = target.setdefault(field, [])
+                if value not in items:
+                    items.append(value)
+            else:
+                raise NotImplementedError(f"Fake MongoDB does not support {op}")
+
+
+def project(doc, projection):
+    doc = copy.deepcopy(doc)
+    if not projection:
+        return doc
+    include_id = projection.get("_id", 1)
+    fields = {field: value for field, value in projection.items() if field != "_id"}
+    if fields and all(fields.values()):
+        projected = {}
+        for path in fields:
+            head, _, rest = path.partition(".")
+            if head not in doc:
+                continue
+            if not rest:
+                projected[head] = doc[head]
+            elif isinstance(doc[head], list):
+                existing = projected.setdefault(head, [{} for _ in doc[head]])
+                for item, target in zip(doc[head], existing):
+                    if isinstance(item, dict) and rest in item:
+                        target[rest] = item[rest]
+            elif isinstance(doc[head], dict):
+                projected.setdefault(head, {}).update(project(doc[head], {rest: 1, "_id": 0}))
+        if include_id and "_id" in doc:
+            projected["_id"] = doc["_id"]
+        return projected
+    for path in fields:
+        target, field = _parent(doc, path, create=False)
+        if target is not None:
+            target.pop(field, None)
+    if not include_id:
+        doc.pop("_id", None)
+    return doc
+
+
+def _sort_key(value):
+    # None/missing sorts before every other value, as in MongoDB
+    return (0,) if value is None else (1, value)
+
+
+def _sorted(docs, keys):
+    docs = list(docs)
+    for field, direction in reversed(keys):
+        docs.sort(key=lambda doc: _sort_key((_get_path(doc, field) or [None])[0]), reverse=direction < 0)
+    return docs
+
+
+def _sort_keys(key_or_list, direction=None):
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    return list(key_or_list.items()) if isinstance(key_or_list, dict) else list(key_or_list)
+
+
+class FakeResult:
+    def __init__(self, matched=0, modified=0, deleted=0, inserted_ids=(), upserted_id=None, upserted=0):
+        self.matched_count = matched
+        self.modified_count = modified
+        self.deleted_count = deleted
+        self.inserted_ids = list(inserted_ids)
+        self.inserted_id = self.inserted_ids[0] if self.inserted_ids else None
+        self.upserted_id = upserted_id
+        self.upserted_count = upserted
+        self.acknowledged = True
+
+
+class FakeCursor:
+    def __init__(self, docs, projection=None):
+        self._docs = docs
+        self._projection = projection
+        self._skip = 0
+        self._limit = None
+
+    def sort(self, key_or_list, direction=None):
+        self._docs = _sorted(self._docs, _sort_keys(key_or_list, direction))
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count or None
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def _results(self):
+        docs = self._docs[self._skip:]
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        return [project(doc, self._projection) for doc in docs]
+
+    async def to_list(self, length=None):
+        results = self._results()
+        return results[:length] if length else results
+
+    def __aiter__(self):
+        self._iterator = iter(self._results())
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+def _group_value(expression, doc):
+    if isinstance(expression, str) and expression.startswith("$"):
+        return (_get_path(doc, expression[1:]) or [None])[0]
+    if isinstance(expression, dict) and "$multiply" in expression:
+        result = 1
+        for part in expression["$multiply"]:
+            result *= _group_value(part, doc) or 0
+        return result
+    return expression
+
+
+def _run_pipeline(docs, pipeline):
+    docs = [copy.deepcopy(doc) for doc in docs]
+    for stage in pipeline:
+        (op, spec), = stage.items()
+        if op == "$match":
+            docs = [doc for doc in docs if matches(doc, spec)]
+        elif op == "$unwind":
+            field = spec[1:]
+            docs = [{**doc, field: item} for doc in docs for item in doc.get(field) or []]
+        elif op == "$group":
+            groups = {}
+            for doc in docs:
+                key = _group_value(spec["_id"], doc)
+                group = groups.setdefault(key, {"_id": key})
+                for name, accumulator in spec.items():
+                    if name == "_id":
+                        continue
+                    (kind, expression), = accumulator.items()
+                    value = _group_value(expression, doc)
+                    if kind == "$sum":
+                        group[name] = group.get(name, 0) + (value or 0)
+                    elif kind == "$first":
+                        group.setdefault(name, value)
+            docs = list(groups.values())
+        elif op == "$sort":
+            docs = _sorted(docs, list(spec.items()))
+        elif op == "$limit":
+            docs = docs[:spec]
+        else:
+            raise NotImplementedError(f"Fake MongoDB does not support the {op} stage")
+    return docs
+
+
+class FakeCollection:
+    """An in-memory stand-in for a Motor collection - enough of the query language for these tests.
+
+    Every call is recorded in calls, so tests can assert how many round trips a code path makes.
+    """
+
+    def __init__(self, name="", docs=()):
+        self.name = name
+        self.docs = []
+        self.calls = []
+        # Fields with a unique index, e.g. {"dedupe_key"}
+        self.unique_fields = set()
+        # Index into a bulk_write's operations -> errmsg for writes that should fail
+        self.write_errors = {}
+        self.last_bulk_write = []
+        self._next_id = 1
+        self.seed(docs)
+
+    # ----- test helpers -----
+
+    def seed(self, docs):
+        for doc in docs:
+            self._insert(copy.deepcopy(doc))
+
+    def get(self, **fields):
+        """The stored document (not a copy) matching fields, or None"""
+        return next((doc for doc in self.docs if matches(doc, fields)), None)
+
+    def count_calls(self, method):
+        return sum(1 for call in self.calls if call == method)
+
+    def _insert(self, doc):
+        for field in self.unique_fields:
+            if field in doc and any(other.get(field) == doc[field] for other in self.docs):
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {field}")
+        if "_id" not in doc:
+            doc["_id"] = self._next_id
+            self._next_id += 1
+        elif isinstance(doc["_id"], int):
+            self._next_id = max(self._next_id, doc["_id"] + 1)
+        self.docs.append(doc)
+        return doc["_id"]
+
+    def _matching(self, query):
+        return [doc for doc in self.docs if matches(doc, query or {})]
+
+    def _upsert(self, query, update):
+        doc = {field: value for field, value in (query or {}).items()
+               if not field.startswith("$") and not isinstance(value, dict)}
+        apply_update(doc, update, inserting=True)
+        return self._insert(doc)
+
+    def _update(self, query, update, upsert, many):
+        targets = self._matching(query)
+        if not many:
+            targets = targets[:1]
+        modified = 0
+        for doc in targets:
+            before = copy.deepcopy(doc)
+            apply_update(doc, update)
+            modified += doc != before
+        if not targets and upsert:
+            return FakeResult(upserted_id=self._upsert(query, update), upserted=1)
+        return FakeResult(matched=len(targets), modified=modified)
+
+    # ----- reads -----
+
+    def find(self, query=None, projection=None, sort=None, limit=0):
+        self.calls.append("find")
+        cursor = FakeCursor(self._matching(query), projection)
+        if sort:
+            cursor.sort(sort)
+        return cursor.limit(limit)
+
+    async def find_one(self, query=None, projection=None, sort=None):
+        self.calls.append("find_one")
+        docs = self._matching(query)
+        if sort:
+            docs = _sorted(docs, _sort_keys(sort))
+        return project(docs[0], projection) if docs else None
+
+    async def count_documents(self, query):
+        self.calls.append("count_documents")
+        return len(self._matching(query))
+
+    async def estimated_document_count(self):
+        return len(self.docs)
+
+    async def distinct(self, field, query=None):
+        self.calls.append("distinct")
+        values = []
+        for doc in self._matching(query):
+            for value in _candidates(_get_path(doc, field)):
+                if not isinstance(value, list) and value not in values:
+                    values.append(value)
+        return values
+
+    def aggregate(self, pipeline):
+        self.calls.append("aggregate")
+        return FakeCursor(_run_pipeline(self.docs, pipeline))
+
+    # ----- writes -----
+
+    def _insert_copy(self, doc):
+        # Motor sets _id on the caller's document, but the stored copy is independent of it
+        inserted_id = self._insert(copy.deepcopy(doc))
+        doc.setdefault("_id", inserted_id)
+        return inserted_id
+
+    async def insert_one(self, doc):
+        self.calls.append("insert_one")
+        return FakeResult(inserted_ids=[self._insert_copy(doc)])
+
+    async def insert_many(self, docs, ordered=True):
+        self.calls.append("insert_many")
+        inserted, errors = [], []
+        for index, doc in enumerate(docs):
+            try:
+                inserted.append(self._insert_copy(doc))
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+        return FakeResult(inserted_ids=inserted)
+
+    async def update_one(self, query, update, upsert=False):
+        self.calls.append("update_one")
+        return self._update(query, update, upsert, many=False)
+
+    async def update_many(self, query, update, upsert=False):
+        self.calls.append("update_many")
+        return self._update(query, update, upsert, many=True)
+
+    async def replace_one(self, query, replacement, upsert=False):
+        self.calls.append("replace_one")
+        return self._update(query, replacement, upsert, many=False)
+
+    async def find_one_and_update(self, query, update, projection=None, sort=None, upsert=False,
+                                  return_document=ReturnDocument.BEFORE):
+        self.calls.append("find_one_and_update")
+        docs = self._matching(query)
+        if sort:
+            docs = _sorted(docs, _sort_keys(sort))
+        if not docs:
+            if upsert:
+                upserted_id = self._upsert(query, update)
+                if return_document == ReturnDocument.AFTER:
+                    return project(self.get(_id=upserted_id), projection)
+            return None
+        before = copy.deepcopy(docs[0])
+        apply_update(docs[0], update)
+        return project(before if return_document == ReturnDocument.BEFORE else docs[0], projection)
+
+    async def delete_one(self, query):
+        self.calls.append("delete_one")
+        targets = self._matching(query)[:1]
+        self.docs = [doc for doc in self.docs if doc not in targets]
+        return FakeResult(deleted=len(targets))
+
+    async def delete_many(self, query):
+        self.calls.append("delete_many")
+        targets = self._matching(query)
+        self.docs = [doc for doc in self.docs if not any(doc is target for target in targets)]
+        return FakeResult(deleted=len(targets))
+
+    async def bulk_write(self, operations, ordered=True):
+        self.calls.append("bulk_write")
+        self.last_bulk_write = list(operations)
+        totals = defaultdict(int)
+        errors = []
+        for index, operation in enumerate(operations):
+            if index in self.write_errors:
+                errors.append({"index": index, "code": 2, "errmsg": self.write_errors[index]})
+                if ordered:
+                    break
+                continue
+            if isinstance(operation, InsertOne):
+                self._insert_copy(operation._doc)
+                totals["nInserted"] += 1
+                continue
+            if isinstance(operation, (DeleteOne, DeleteMany)):
+                targets = self._matching(operation._filter)
+                if isinstance(operation, DeleteOne):
+                    targets = targets[:1]
+                self.docs = [doc for doc in self.docs if not any(doc is target for target in targets)]
+                totals["nRemoved"] += len(targets)
+                continue
+            many = isinstance(operation, UpdateMany)
+            if not isinstance(operation, (UpdateOne, UpdateMany, ReplaceOne)):
+                raise NotImplementedError(f"Fake MongoDB does not support {type(operation).__name__}")
+            result = self._update(operation._filter, operation._doc, operation._upsert, many)
+            totals["nMatched"] += result.matched_count
+            totals["nModified"] += result.modified_count
+            totals["nUpserted"] += result.upserted_count
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, **totals})
+        result = FakeResult(matched=totals["nMatched"], modified=totals["nModified"], deleted=totals["nRemoved"],
+                            upserted=totals["nUpserted"])
+        result.inserted_count = totals["nInserted"]
+        return result
+
+
+class FakeDB:
+    """Collections spring into existence on first access, as they do in MongoDB"""
+
+    def __init__(self):
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(name)
+        return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+
+@pytest.fixture
+def fake_db():
+    return FakeDB()
@@ -0,0 +1,23 @@
+import asyncio
+
+from passlib.context import CryptContext
+
+import auth
+from auth import verify_password_async
+
+
+def test_outdated_cost_is_rehashed_on_login():
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=4).hash("secret")
+
+    valid, new_hash = asyncio.run(verify_password_async("secret", old_hash))
+    assert valid
+    assert new_hash.startswith(f"$2b${auth.BCRYPT_ROUNDS:02d}$")
+
+    valid, newer_hash = asyncio.run(verify_password_async("secret", new_hash))
+    assert valid and newer_hash is None
+
+
+def test_wrong_or_missing_password_is_rejected():
+    stored = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=4).hash("secret")
+    assert asyncio.run(verify_password_async("wrong", stored)) == (False, None)
+    assert asyncio.run(verify_password_async("secret", "")) == (False, None)
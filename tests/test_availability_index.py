@@ -0,0 +1,60 @@
+import asyncio
+
+import availability_index
+from availability_index import AvailabilityIndex
+
+
+def build_index():
+    index = AvailabilityIndex()
+    index.set_product("laddu", None)
+    index.set_product("pickle", [])
+    index.set_product("chikki", ["Guntur", "Vijayawada"])
+    index.set_product("murukku", ["Hyderabad"])
+    return index
+
+
+def test_unrestricted_products_are_available_everywhere():
+    index = build_index()
+    assert index.product_ids_for_cities(["Nellore"]) == {"laddu", "pickle"}
+    assert index.product_ids_for_cities([]) == {"laddu", "pickle"}
+
+
+def test_city_and_state_filters_are_unions():
+    index = build_index()
+    assert index.product_ids_for_cities(["Guntur"]) == {"laddu", "pickle", "chikki"}
+    assert index.product_ids_for_cities(["Guntur", "Hyderabad"]) == {"laddu", "pickle", "chikki", "murukku"}
+
+
+def test_updates_replace_previous_cities():
+    index = build_index()
+    index.set_product("chikki", ["Hyderabad"])
+    assert "chikki" not in index.product_ids_for_cities(["Guntur"])
+    assert "Guntur" not in index.products_by_city
+
+    index.set_product("murukku", None)
+    assert "murukku" in index.product_ids_for_cities(["Nellore"])
+
+    index.remove_product("laddu")
+    assert "laddu" not in index.product_ids_for_cities(["Nellore"])
+
+
+def test_index_reloads_once_it_ages_out(monkeypatch, fake_db):
+    clock = [1000.0]
+    monkeypatch.setattr(availability_index.time, "monotonic", lambda: clock[0])
+    fake_db.products.seed([{"id": "laddu"}, {"id": "chikki", "available_cities": ["Guntur"]}])
+    index = AvailabilityIndex()
+
+    async def scenario():
+        await asyncio.gather(index.refresh_if_stale(fake_db), index.refresh_if_stale(fake_db))
+        assert fake_db.products.count_calls("find") == 1
+
+        # Another worker restricts laddu - seen here once the index is CACHE_MAX_AGE_SECONDS old
+        fake_db.products.get(id="laddu")["available_cities"] = ["Hyderabad"]
+        clock[0] += availability_index.CACHE_MAX_AGE_SECONDS - 1
+        await index.refresh_if_stale(fake_db)
+        assert "laddu" in index.product_ids_for_cities(["Guntur"])
+        clock[0] += 1
+        await index.refresh_if_stale(fake_db)
+        assert index.product_ids_for_cities(["Guntur"]) == {"chikki"}
+
+    asyncio.run(scenario())
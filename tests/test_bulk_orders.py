@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+import server
+from inventory_reservations import ReservationSweeper, place_holds
+from sales_rollups import record_new_order
+from server import BulkOrderStatusUpdate
+
+PLACED = "2026-03-05T10:00:00+00:00"
+
+
+class QueuedEmails:
+    def __init__(self):
+        self.queued = []
+
+    async def enqueue_many(self, emails):
+        self.queued.extend((template, order_id, variant) for template, _, _, order_id, variant in emails)
+        return len(emails)
+
+
+def order(order_id, status, **fields):
+    return {
+        "order_id": order_id, "order_status": status, "cancelled": status == "cancelled", "created_at": PLACED,
+        "total": 100, "email": f"{order_id.lower()}@example.com", "items": [{"name": "Mango Pickle", "quantity": 1}],
+        **fields
+    }
+
+
+@pytest.fixture
+def shop(monkeypatch, fake_db):
+    db = fake_db
+    db.products.seed([{"id": "p1", "inventory_count": 10}])
+    orders = [
+        order("AL1", "shipped"),
+        order("AL2", "out for delivery"),
+        order("AL3", "pending"),
+        order("AL4", "cancelled"),
+        order("AL5", "delivered"),
+        order("AL6", "out for delivery")
+    ]
+    db.orders.seed(orders)
+
+    async def setup():
+        for placed in orders:
+            await record_new_order(db, placed)
+        for order_id in ("AL1", "AL2", "AL3", "AL6"):
+            await place_holds(db, order_id, {"p1": 1})
+
+    asyncio.run(setup())
+    emails = QueuedEmails()
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "email_outbox", emails)
+    monkeypatch.setattr(server, "bump_catalog_version", lambda reason="": None)
+    return db, emails
+
+
+def bulk(order_ids, status):
+    data = BulkOrderStatusUpdate(order_ids=order_ids, status=status)
+    return asyncio.run(server.bulk_update_order_status(data, current_user={}))
+
+
+def hold_status(db, order_id):
+    return [doc["status"] for doc in db.inventory_reservations.docs if doc["order_id"] == order_id]
+
+
+def month(db):
+    return db.sales_rollups.get(_id="month:2026-03")
+
+
+def test_mixed_transitions_report_per_order_and_touch_only_what_changed(shop):
+    db, emails = shop
+    response = bulk(["AL1", "AL2", "AL3", "AL4", "AL5", "AL9", "AL1"], "delivered")
+
+    assert [(result["order_id"], result["status"]) for result in response["results"]] == [
+        ("AL1", "updated"), ("AL2", "updated"), ("AL3", "error"), ("AL4", "error"),
+        ("AL5", "unchanged"), ("AL9", "not_found"), ("AL1", "error")
+    ]
+    assert (response["updated"], response["failed"]) == (2, 4)
+    results = response["results"]
+    assert results[2]["detail"].startswith("Cannot move from 'pending' to 'delivered'")
+    assert results[3]["detail"] == "Order is already 'cancelled'"
+    assert results[6]["detail"] == "Duplicate order id in request"
+
+    assert [db.orders.get(order_id=order_id)["order_status"] for order_id in ("AL1", "AL2", "AL3", "AL4")] == [
+        "delivered", "delivered", "pending", "cancelled"
+    ]
+    # Only the two delivered orders move from active to completed, in one rollup write
+    assert (month(db)["active"], month(db)["completed"], month(db)["cancelled"]) == (2, 3, 1)
+    assert db.sales_rollups.count_calls("bulk_write") == 1
+    # Holds are committed for the orders that moved, and the rejected pending order keeps its expiring hold
+    assert hold_status(db, "AL1") == hold_status(db, "AL2") == ["committed"]
+    assert hold_status(db, "AL3") == ["held"]
+    assert emails.queued == [
+        ("order_status_update", "AL1", "delivered"), ("order_status_update", "AL2", "delivered")
+    ]
+
+
+def test_only_forbidden_transitions_write_nothing(shop):
+    db, emails = shop
+    response = bulk(["AL3", "AL4"], "shipped")
+
+    assert [result["status"] for result in response["results"]] == ["error", "error"]
+    assert response["updated"] == 0
+    assert db.orders.count_calls("bulk_write") == 0
+    assert db.sales_rollups.count_calls("bulk_write") == 0
+    assert (month(db)["active"], month(db)["completed"]) == (4, 1)
+    assert hold_status(db, "AL3") == ["held"]
+    assert emails.queued == []
+
+
+def test_lapsed_hold_without_stock_fails_only_its_order(shop):
+    db, _ = shop
+    # AL6 was never paid in time - its hold lapsed and the stock went to another order
+    for reservation in db.inventory_reservations.docs:
+        if reservation["order_id"] == "AL6":
+            reservation["expires_at"] = reservation["created_at"]
+    asyncio.run(ReservationSweeper(db).sweep())
+    db.products.get(id="p1")["inventory_count"] = 0
+
+    response = bulk(["AL2", "AL6"], "delivered")
+
+    assert [result["status"] for result in response["results"]] == ["updated", "error"]
+    assert "no longer available" in response["results"][1]["detail"]
+    assert db.orders.get(order_id="AL6")["order_status"] == "out for delivery"
+    assert hold_status(db, "AL6") == ["expired"]
+    assert (month(db)["active"], month(db)["completed"]) == (3, 2)
+
+
+def test_orders_whose_write_failed_are_left_out_of_rollups_and_holds(shop):
+    db, emails = shop
+    db.orders.write_errors = {0: "WriteConflict"}
+
+    response = bulk(["AL1", "AL2"], "delivered")
+
+    assert [(result["status"], result.get("detail")) for result in response["results"]] == [
+        ("error", "WriteConflict"), ("updated", None)
+    ]
+    assert (month(db)["active"], month(db)["completed"]) == (3, 2)
+    assert hold_status(db, "AL1") == ["held"]
+    assert hold_status(db, "AL2") == ["committed"]
+    assert [order_id for _, order_id, _ in emails.queued] == ["AL2"]
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+import server
+from server import BulkProductUpdate, ProductPatch, _validate_product_patch
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.refreshed = []
+
+    async def refresh_products(self, product_ids):
+        self.refreshed.extend(product_ids)
+
+
+@pytest.fixture
+def app_state(monkeypatch):
+    scheduler = FakeScheduler()
+    bumps = []
+    monkeypatch.setattr(server, "discount_scheduler", scheduler)
+    monkeypatch.setattr(server, "bump_catalog_version", bumps.append)
+    monkeypatch.setattr(server.availability_index, "set_product", lambda *args: None)
+    return scheduler, bumps
+
+
+def run_bulk(monkeypatch, db, updates):
+    monkeypatch.setattr(server, "db", db)
+    data = BulkProductUpdate(updates=[ProductPatch(**update) for update in updates])
+    return asyncio.run(server.bulk_update_products(data, current_user={}))
+
+
+def test_patch_validation_mirrors_single_product_rules():
+    assert _validate_product_patch(ProductPatch(id="p1", inventory_count=0)) == {"inventory_count": 0, "out_of_stock": True}
+    assert _validate_product_patch(ProductPatch(id="p1", available_cities=[])) == {"available_cities": None}
+
+    for patch, message in [
+        (ProductPatch(id="p1"), "No fields to update"),
+        (ProductPatch(id="p1", inventory_count=-1), "Inventory count cannot be negative"),
+        (ProductPatch(id="p1", discount_percentage=80), "Discount must be between 0% and 70%"),
+        (ProductPatch(id="p1", discount_expiry_date="next week"), "Invalid date format for discount_expiry_date")
+    ]:
+        with pytest.raises(ValueError, match=message):
+            _validate_product_patch(patch)
+
+
+@pytest.mark.parametrize("field", ["name", "category", "description", "image", "prices", "isBestSeller",
+                                   "isNew", "tag", "inventory_count", "out_of_stock"])
+def test_required_product_fields_cannot_be_nulled(field):
+    with pytest.raises(ValueError, match=f"{field} cannot be null"):
+        _validate_product_patch(ProductPatch(id="p1", **{field: None}))
+
+
+def test_discounts_and_city_restrictions_can_be_cleared():
+    patch = ProductPatch(id="p1", discount_percentage=None, discount_expiry_date=None, discount_start_date=None,
+                         available_cities=None)
+    assert _validate_product_patch(patch) == {
+        "discount_percentage": None, "discount_expiry_date": None, "discount_start_date": None, "available_cities": None
+    }
+
+
+def test_price_items_must_be_objects_as_on_product():
+    assert _validate_product_patch(ProductPatch(id="p1", prices=[{"weight": "1kg", "price": 550}])) == {
+        "prices": [{"weight": "1kg", "price": 550}]
+    }
+    with pytest.raises(ValidationError):
+        ProductPatch(id="p1", prices=["1kg", 550])
+
+
+def test_each_item_gets_its_own_result(monkeypatch, app_state, fake_db):
+    scheduler, bumps = app_state
+    products = fake_db.products
+    products.seed([{"id": "p1"}, {"id": "p2"}])
+    response = run_bulk(monkeypatch, fake_db, [
+        {"id": "p1", "inventory_count": 5},
+        {"id": "p2", "discount_percentage": 10, "discount_expiry_date": "2099-01-01"},
+        {"id": "p3", "name": "Missing"},
+        {"id": "p1", "name": "Duplicate"},
+        {"id": "p2x", "discount_percentage": 90}
+    ])
+
+    assert [result["status"] for result in response["results"]] == ["updated", "updated", "not_found", "error", "error"]
+    assert (response["updated"], response["failed"]) == (2, 3)
+    assert scheduler.refreshed == ["p2"]
+    assert len(bumps) == 1
+
+    # One unordered bulk_write with an op per valid, existing product
+    assert [op._filter for op in products.last_bulk_write] == [{"id": "p1"}, {"id": "p2"}]
+    assert products.last_bulk_write[0]._doc == {
+        "$set": {"inventory_count": 5, "out_of_stock": False}, "$unset": {"out_of_stock_auto": ""}
+    }
+    assert products.last_bulk_write[1]._doc == {"$set": {"discount_percentage": 10, "discount_expiry_date": "2099-01-01"}}
+
+
+def test_write_errors_fail_only_their_items(monkeypatch, app_state, fake_db):
+    _, bumps = app_state
+    fake_db.products.seed([{"id": "p1"}, {"id": "p2"}])
+    fake_db.products.write_errors = {1: "document too large"}
+    response = run_bulk(monkeypatch, fake_db, [{"id": "p1", "name": "A"}, {"id": "p2", "name": "B"}])
+
+    assert response["results"] == [
+        {"id": "p1", "status": "updated"},
+        {"id": "p2", "status": "error", "detail": "document too large"}
+    ]
+    assert len(bumps) == 1
+
+
+def test_nothing_written_leaves_the_catalog_version(monkeypatch, app_state, fake_db):
+    _, bumps = app_state
+    response = run_bulk(monkeypatch, fake_db, [{"id": "p1", "name": "A"}])
+    assert response["updated"] == 0
+    assert fake_db.products.count_calls("bulk_write") == 0
+    assert bumps == []
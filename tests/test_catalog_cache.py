@@ -0,0 +1,126 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import catalog_cache
+from catalog_cache import bump_catalog_version, catalog_version, get_or_build_catalog, get_or_build_catalog_body
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    catalog_cache._entries.clear()
+    catalog_cache._build_locks.clear()
+    yield
+    catalog_cache._entries.clear()
+    catalog_cache._build_locks.clear()
+
+
+def counting_builder(products, expires_at=None, delay=0):
+    calls = []
+
+    async def build():
+        calls.append(1)
+        if delay:
+            await asyncio.sleep(delay)
+        return list(products), expires_at
+    return build, calls
+
+
+def test_hits_until_the_version_is_bumped():
+    build, calls = counting_builder([{"id": "p1"}])
+
+    async def scenario():
+        first = await get_or_build_catalog(("Guntur", "AP", "full"), build)
+        second = await get_or_build_catalog(("Guntur", "AP", "full"), build)
+        assert first is second
+        assert len(calls) == 1
+
+        version = catalog_version()
+        bump_catalog_version("test")
+        assert catalog_version() == version + 1
+        assert catalog_cache._entries == {}
+        await get_or_build_catalog(("Guntur", "AP", "full"), build)
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
+
+
+def test_entry_expires_with_its_products():
+    build, calls = counting_builder([{"id": "p1"}], expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+
+    async def scenario():
+        await get_or_build_catalog("key", build)
+        await get_or_build_catalog("key", build)
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+
+
+def test_concurrent_misses_build_once_per_key():
+    build, calls = counting_builder([{"id": "p1"}], delay=0.01)
+
+    async def scenario():
+        results = await asyncio.gather(*(get_or_build_catalog("same", build) for _ in range(10)))
+        assert all(result is results[0] for result in results)
+        await asyncio.gather(get_or_build_catalog("a", build), get_or_build_catalog("b", build))
+
+    asyncio.run(scenario())
+    assert len(calls) == 3
+
+
+def test_write_during_build_is_not_cached():
+    async def build():
+        bump_catalog_version("write mid-build")
+        return [{"id": "stale"}], None
+
+    async def scenario():
+        await get_or_build_catalog("key", build)
+        body = await get_or_build_catalog_body("key", build)
+        assert body.identity == b'[{"id":"stale"}]'
+
+    asyncio.run(scenario())
+    assert "key" not in catalog_cache._entries
+
+
+def test_body_is_encoded_once_per_entry():
+    build, _ = counting_builder([{"id": "p1"}])
+
+    async def scenario():
+        first = await get_or_build_catalog_body("key", build)
+        second = await get_or_build_catalog_body("key", build)
+        assert first is second
+
+    asyncio.run(scenario())
+
+
+def test_entries_are_bounded():
+    build, _ = counting_builder([])
+
+    async def scenario():
+        for n in range(catalog_cache.MAX_CATALOG_ENTRIES + 10):
+            await get_or_build_catalog(("city", n), build)
+
+    asyncio.run(scenario())
+    assert len(catalog_cache._entries) == catalog_cache.MAX_CATALOG_ENTRIES
+    # Oldest entries are evicted first
+    assert ("city", 0) not in catalog_cache._entries
+    assert ("city", catalog_cache.MAX_CATALOG_ENTRIES + 9) in catalog_cache._entries
+    assert len(catalog_cache._build_locks) <= catalog_cache.MAX_CATALOG_ENTRIES + 1
+
+
+def test_entries_age_out_so_other_workers_writes_show_up(monkeypatch):
+    build, calls = counting_builder([{"id": "p1"}])
+    clock = [1000.0]
+    monkeypatch.setattr(catalog_cache.time, "monotonic", lambda: clock[0])
+
+    async def scenario():
+        await get_or_build_catalog("key", build)
+        clock[0] += catalog_cache.CACHE_MAX_AGE_SECONDS - 1
+        await get_or_build_catalog("key", build)
+        assert len(calls) == 1
+        clock[0] += 1
+        await get_or_build_catalog("key", build)
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
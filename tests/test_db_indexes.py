@@ -0,0 +1,44 @@
+import asyncio
+
+from pymongo.errors import OperationFailure
+
+from db_indexes import INDEXES, ensure_indexes, plan_stages, query_shapes
+
+
+def test_plan_stages_walks_nested_and_sbe_plans():
+    index_plan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "order_id"}}
+    or_plan = {"stage": "SUBPLAN", "inputStage": {"stage": "OR", "inputStages": [
+        {"stage": "IXSCAN"}, {"stage": "COLLSCAN"}
+    ]}}
+    sbe_plan = {"queryPlan": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}, "slotBasedPlan": {}}
+
+    assert set(plan_stages(index_plan)) == {"FETCH", "IXSCAN"}
+    assert "COLLSCAN" in set(plan_stages(or_plan))
+    assert "COLLSCAN" in set(plan_stages(sbe_plan))
+
+
+def test_every_query_shape_targets_an_indexed_collection():
+    assert {collection for collection, _, _ in query_shapes()} <= set(INDEXES)
+
+
+def test_ensure_indexes_reports_failures_without_raising():
+    class Collection:
+        def __init__(self, name, created):
+            self.name = name
+            self.created = created
+
+        async def create_indexes(self, indexes):
+            if self.name == "orders":
+                raise OperationFailure("IndexOptionsConflict")
+            self.created[self.name] = len(indexes)
+
+    class DB:
+        def __init__(self):
+            self.created = {}
+
+        def __getitem__(self, name):
+            return Collection(name, self.created)
+
+    db = DB()
+    assert asyncio.run(ensure_indexes(db)) == 1
+    assert set(db.created) == set(INDEXES) - {"orders"}
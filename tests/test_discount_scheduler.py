@@ -0,0 +1,72 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import discount_scheduler
+from discount_scheduler import DiscountScheduler, materialize_discount, parse_discount_date
+
+NOW = datetime(2025, 10, 18, 12, 0, tzinfo=timezone.utc)
+PRODUCT = {"id": "p1", "prices": [{"weight": "¼ kg", "price": 200}, {"weight": "½ kg", "price": 380}]}
+
+
+def test_parse_date_only_runs_until_end_of_day():
+    assert parse_discount_date("2025-10-20") == datetime(2025, 10, 20, 23, 59, 59, tzinfo=timezone.utc)
+    assert parse_discount_date("2025-10-20T10:00:00.000Z") == datetime(2025, 10, 20, 10, tzinfo=timezone.utc)
+
+
+def test_active_discount_materializes_prices():
+    set_fields, unset_fields = materialize_discount(
+        {**PRODUCT, "discount_percentage": 10, "discount_expiry_date": "2025-10-20"}, now=NOW
+    )
+    assert set_fields["discount_active"] is True
+    assert [p["discounted_price"] for p in set_fields["discounted_prices"]] == [180.0, 342.0]
+    assert set_fields["discounted_prices"][0]["original_price"] == 200
+    assert "discount_starts_at" in unset_fields
+
+
+def test_future_dated_discount_is_inactive_until_start():
+    set_fields, _ = materialize_discount({
+        **PRODUCT,
+        "discount_percentage": 20,
+        "discount_start_date": (NOW + timedelta(days=1)).isoformat(),
+        "discount_expiry_date": (NOW + timedelta(days=3)).isoformat()
+    }, now=NOW)
+    assert set_fields["discount_active"] is False
+    assert set_fields["discount_starts_at"] == NOW + timedelta(days=1)
+    assert set_fields["discounted_prices"][0]["discounted_price"] == 160.0
+
+
+def test_expired_or_missing_discount_is_cleared():
+    set_fields, _ = materialize_discount(
+        {**PRODUCT, "discount_percentage": 10, "discount_expiry_date": "2025-10-01"}, now=NOW
+    )
+    assert set_fields["discount_active"] is False
+
+    set_fields, unset_fields = materialize_discount(PRODUCT, now=NOW)
+    assert set_fields == {"discount_active": False}
+    assert set(unset_fields) == {"discounted_prices", "discount_starts_at", "discount_expires_at"}
+
+
+def test_cleared_expiry_ignores_the_stale_stored_bound():
+    # The product as it looks after a patch set discount_expiry_date to None
+    set_fields, unset_fields = materialize_discount({
+        **PRODUCT,
+        "discount_percentage": 10,
+        "discount_expiry_date": None,
+        "discount_expires_at": NOW + timedelta(days=3)
+    }, now=NOW)
+    assert set_fields == {"discount_active": False}
+    assert "discount_expires_at" in unset_fields
+
+
+def test_reconcile_covers_every_discounted_product(monkeypatch, fake_db):
+    monkeypatch.setattr(discount_scheduler, "RECONCILE_BATCH_SIZE", 100)
+    products = [
+        {**PRODUCT, "id": f"p{n}", "discount_percentage": 10, "discount_expiry_date": "2099-01-01"}
+        for n in range(1234)
+    ]
+    db = fake_db
+    db.products.seed(products)
+    asyncio.run(DiscountScheduler(db).reconcile())
+    assert db.products.count_calls("bulk_write") == 13
+    assert db.products.last_bulk_write[-1]._filter == {"id": "p1233"}
+    assert all(product["discount_active"] for product in db.products.docs)
@@ -0,0 +1,57 @@
+import asyncio
+
+import email_outbox
+from email_outbox import EmailOutbox, backoff_seconds
+
+
+def deliver(monkeypatch, db, result, attempts):
+    async def sender(to_email, payload):
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setitem(email_outbox.TEMPLATES, "order_confirmation", sender)
+    message = {
+        "id": "m1", "dedupe_key": "ORD1:order_confirmation", "template": "order_confirmation",
+        "to_email": "a@example.com", "payload": {}, "attempts": attempts
+    }
+    db.email_outbox.seed([message])
+    asyncio.run(EmailOutbox(db).deliver(message))
+    return db.email_outbox.get(id="m1")
+
+
+def test_backoff_doubles_and_is_capped():
+    assert 24 <= backoff_seconds(1) <= 36
+    assert 48 <= backoff_seconds(2) <= 72
+    assert backoff_seconds(30) <= email_outbox.BACKOFF_MAX_SECONDS * 1.2
+
+
+def test_successful_send_is_marked_sent(monkeypatch, fake_db):
+    assert deliver(monkeypatch, fake_db, True, attempts=1)["status"] == "sent"
+
+
+def test_failures_retry_then_dead_letter(monkeypatch, fake_db):
+    retry = deliver(monkeypatch, fake_db, False, attempts=1)
+    assert retry["status"] == "pending"
+    assert retry["last_error"]
+
+    fake_db.email_outbox.docs.clear()
+    dead = deliver(monkeypatch, fake_db, RuntimeError("SMTP timeout"), attempts=email_outbox.MAX_ATTEMPTS)
+    assert dead["status"] == "dead"
+    assert dead["last_error"] == "SMTP timeout"
+
+
+def test_enqueue_many_inserts_once_and_skips_duplicates(fake_db):
+    db = fake_db
+    db.email_outbox.unique_fields = {"dedupe_key"}
+    db.email_outbox.seed([{"id": "m0", "dedupe_key": "AL1:order_status_update:shipped"}])
+    emails = [
+        ("order_status_update", "a@example.com", {}, "AL1", "shipped"),
+        ("order_status_update", "b@example.com", {}, "AL2", "shipped"),
+        ("order_status_update", None, {}, "AL3", "shipped")
+    ]
+    assert asyncio.run(EmailOutbox(db).enqueue_many(emails)) == 1
+    assert db.email_outbox.count_calls("insert_many") == 1
+    assert [message["dedupe_key"] for message in db.email_outbox.docs] == [
+        "AL1:order_status_update:shipped", "AL2:order_status_update:shipped"
+    ]
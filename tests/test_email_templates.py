@@ -0,0 +1,47 @@
+import pytest
+
+from email_templates import compile_template, item_row_html, render_email
+
+ORDER = {
+    "order_id": "AL1",
+    "tracking_code": "TRK1",
+    "customer_name": "Ravi <Kumar> & Co",
+    "total": 500.0,
+    "address": "Main Road",
+    "location": "Guntur",
+    "phone": "9876543210",
+    "payment_status": "pending",
+    "items": [{"name": "Sunnundalu", "weight": "500g", "quantity": 2, "price": 250.0}]
+}
+
+
+def test_compiled_template_escapes_values_but_not_fragments():
+    render = compile_template("<p>{name}</p>{rows_html}")
+    assert render({"name": "<b>", "rows_html": "<i>x</i>"}) == "<p>&lt;b&gt;</p><i>x</i>"
+
+    with pytest.raises(ValueError):
+        compile_template("{total:.2f}")
+
+
+def test_order_confirmation_renders_order_fields():
+    subject, html = render_email("order_confirmation", ORDER)
+    assert subject == "Order Confirmation - #AL1"
+    assert "Ravi &lt;Kumar&gt; &amp; Co" in html
+    assert "Quantity: 2 × Rs.250.0 = Rs.500.0" in html
+    assert "{" not in html
+
+
+def test_item_rows_are_memoized():
+    item_row_html.cache_clear()
+    render_email("order_confirmation", ORDER)
+    render_email("order_confirmation", ORDER)
+    assert item_row_html.cache_info().hits == 1
+
+
+def test_refund_sections_only_when_paid():
+    assert "Refund Information" not in render_email("order_cancellation", ORDER)[1]
+    assert "Refund Amount:</strong> Rs.480.0" in render_email("order_cancellation", {**ORDER, "payment_status": "completed"})[1]
+
+    city = {"city": "Tenali", "state": "Andhra Pradesh"}
+    assert "Refund Information" not in render_email("city_rejection", city)[1]
+    assert "Refund Information" in render_email("city_rejection", city, True)[1]
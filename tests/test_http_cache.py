@@ -0,0 +1,60 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+import http_cache  # noqa: E402
+from http_cache import EncodedBody, encoded_response, get_or_build_body  # noqa: E402
+
+
+class FakeRequest:
+    def __init__(self, **headers):
+        self.headers = {name.replace("_", "-"): value for name, value in headers.items()}
+
+
+BODY = EncodedBody([{"id": "p1", "name": "Ragi Laddu", "name_telugu": "రాగి లడ్డు"}])
+
+
+def test_matching_etag_returns_304():
+    response = encoded_response(FakeRequest(if_none_match=BODY.etag), BODY)
+    assert response.status_code == 304
+    assert response.headers["etag"] == BODY.etag
+
+    response = encoded_response(FakeRequest(if_none_match=f'W/{BODY.etag}, "other"'), BODY)
+    assert response.status_code == 304
+
+
+def test_serves_precompressed_variant():
+    response = encoded_response(FakeRequest(accept_encoding="gzip, deflate"), BODY)
+    assert response.headers["content-encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.body))[0]["name_telugu"] == "రాగి లడ్డు"
+
+
+def test_identity_when_encoding_refused():
+    response = encoded_response(FakeRequest(accept_encoding="gzip;q=0"), BODY)
+    assert "content-encoding" not in response.headers
+    assert response.body == BODY.identity
+
+
+def test_reference_bodies_are_rebuilt_once_they_age_out(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(http_cache.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(http_cache, "_bodies", {})
+    builds = []
+
+    async def build():
+        builds.append(1)
+        return [{"name": "Guntur"}]
+
+    async def scenario():
+        first = await get_or_build_body("locations", build)
+        clock[0] += http_cache.CACHE_MAX_AGE_SECONDS - 1
+        assert await get_or_build_body("locations", build) is first
+        clock[0] += 1
+        assert await get_or_build_body("locations", build) is not first
+
+    asyncio.run(scenario())
+    assert len(builds) == 2
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from inventory import INVENTORY_TXN_WINDOW, InsufficientInventory, decrement_inventory, restore_inventory
+
+
+def test_decrement_takes_stock_and_marks_sold_out_products(fake_db):
+    db = fake_db
+    db.products.seed([{"id": "p1", "inventory_count": 5}, {"id": "p2", "inventory_count": 2}])
+    asyncio.run(decrement_inventory(db, {"p1": 3, "p2": 2}, "txn-1"))
+
+    p1, p2 = db.products.get(id="p1"), db.products.get(id="p2")
+    assert (p1["inventory_count"], p2["inventory_count"]) == (2, 0)
+    assert p1["inventory_txns"] == p2["inventory_txns"] == ["txn-1"]
+    assert "out_of_stock" not in p1
+    assert (p2["out_of_stock"], p2["out_of_stock_auto"]) == (True, True)
+
+
+def test_shortfall_restores_every_product_it_took(fake_db):
+    db = fake_db
+    db.products.seed([{"id": "p1", "inventory_count": 5}, {"id": "p2", "inventory_count": 1}])
+    with pytest.raises(InsufficientInventory) as error:
+        asyncio.run(decrement_inventory(db, {"p1": 3, "p2": 2, "gone": 1}, "txn-1"))
+
+    assert error.value.product_ids == ["p2", "gone"]
+    p1, p2 = db.products.get(id="p1"), db.products.get(id="p2")
+    assert (p1["inventory_count"], p2["inventory_count"]) == (5, 1)
+    assert p1["inventory_txns"] == []
+    assert "out_of_stock" not in p2
+
+
+def test_restore_only_gives_back_its_own_transaction(fake_db):
+    db = fake_db
+    db.products.seed([{"id": "p1", "inventory_count": 10}, {"id": "p2", "inventory_count": 10}])
+    asyncio.run(decrement_inventory(db, {"p1": 2}, "txn-a"))
+    asyncio.run(decrement_inventory(db, {"p1": 3, "p2": 4}, "txn-b"))
+
+    # p2 was never touched by txn-a, so restoring txn-a must leave it alone
+    assert asyncio.run(restore_inventory(db, {"p1": 2, "p2": 2}, "txn-a")) == 1
+    assert db.products.get(id="p1")["inventory_count"] == 7
+    assert db.products.get(id="p2")["inventory_count"] == 6
+    assert db.products.get(id="p1")["inventory_txns"] == ["txn-b"]
+
+    # A second restore of the same transaction is a no-op
+    assert asyncio.run(restore_inventory(db, {"p1": 2}, "txn-a")) == 0
+    assert db.products.get(id="p1")["inventory_count"] == 7
+
+
+def test_transaction_window_is_bounded(fake_db):
+    db = fake_db
+    db.products.seed([{"id": "p1", "inventory_count": 1000}])
+    for n in range(INVENTORY_TXN_WINDOW + 5):
+        asyncio.run(decrement_inventory(db, {"p1": 1}, f"txn-{n}"))
+    txns = db.products.get(id="p1")["inventory_txns"]
+    assert len(txns) == INVENTORY_TXN_WINDOW
+    assert txns[-1] == f"txn-{INVENTORY_TXN_WINDOW + 4}"
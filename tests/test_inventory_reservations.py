@@ -0,0 +1,237 @@
+import asyncio
+import hashlib
+import hmac
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import inventory_reservations
+from inventory_reservations import (
+    ReservationSweeper, commit_holds, commit_many_holds, discard_holds, place_holds, release_holds
+)
+
+
+def stocked(db, counts):
+    db.products.seed({"id": product_id, "inventory_count": count} for product_id, count in counts.items())
+    return db
+
+
+def stock(db, product_id):
+    return db.products.get(id=product_id)["inventory_count"]
+
+
+def statuses(db, order_id):
+    return sorted(doc["status"] for doc in db.inventory_reservations.docs if doc["order_id"] == order_id)
+
+
+def test_paid_orders_keep_their_stock(fake_db):
+    db = stocked(fake_db, {"p1": 8})
+
+    async def scenario():
+        await place_holds(db, "AL1", {"p1": 2})
+        assert statuses(db, "AL1") == ["held"]
+        assert await commit_holds(db, "AL1") == 1
+        # Committed holds are not restocked by a plain release or by the sweeper
+        assert await release_holds(db, "AL1") == 0
+        expire_all(db)
+        assert await ReservationSweeper(db).sweep() == 0
+
+    asyncio.run(scenario())
+    assert statuses(db, "AL1") == ["committed"]
+    assert stock(db, "p1") == 8
+
+
+def test_cancellation_restocks_once(fake_db):
+    db = stocked(fake_db, {"p1": 8, "p2": 0})
+
+    async def scenario():
+        await place_holds(db, "AL1", {"p1": 2, "p2": 1})
+        await commit_holds(db, "AL1")
+        assert await release_holds(db, "AL1", include_committed=True) == 2
+        assert await release_holds(db, "AL1", include_committed=True) == 0
+
+    asyncio.run(scenario())
+    assert (stock(db, "p1"), stock(db, "p2")) == (10, 1)
+    assert statuses(db, "AL1") == ["released", "released"]
+
+
+def test_bulk_commit_and_discard(fake_db):
+    db = stocked(fake_db, {"p1": 8})
+
+    async def scenario():
+        for order_id in ("AL1", "AL2", "AL3"):
+            await place_holds(db, order_id, {"p1": 1})
+        assert await commit_many_holds(db, ["AL1", "AL2"]) == 2
+        assert await commit_many_holds(db, []) == 0
+        assert await discard_holds(db, "AL3") == 1
+
+    asyncio.run(scenario())
+    assert statuses(db, "AL1") == statuses(db, "AL2") == ["committed"]
+    assert statuses(db, "AL3") == []
+    assert stock(db, "p1") == 8
+
+
+def expire_all(db):
+    for doc in db.inventory_reservations.docs:
+        doc["expires_at"] = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+
+def test_sweeper_restocks_expired_holds_in_batches(monkeypatch, fake_db):
+    monkeypatch.setattr(inventory_reservations, "SWEEP_BATCH_SIZE", 2)
+    db = stocked(fake_db, {"p1": 0, "p2": 5})
+    changes = []
+
+    async def scenario():
+        await place_holds(db, "AL1", {"p1": 1, "p2": 2})
+        await place_holds(db, "AL2", {"p1": 3})
+        await place_holds(db, "AL3", {"p2": 4})
+        expire_all(db)
+        await place_holds(db, "AL4", {"p1": 5})  # not due yet
+
+        # A release claimed by a process that died long ago is picked up again
+        stale = db.inventory_reservations.docs[3]
+        stale.update({"status": "releasing", "claim_token": "dead", "claimed_at": datetime.now(timezone.utc) - timedelta(hours=1)})
+
+        sweeper = ReservationSweeper(db, on_change=lambda: changes.append(1))
+        assert await sweeper.sweep() == 4
+        assert await sweeper.sweep() == 0
+
+    asyncio.run(scenario())
+    assert (stock(db, "p1"), stock(db, "p2")) == (4, 11)
+    assert [doc["status"] for doc in db.inventory_reservations.docs] == ["expired"] * 4 + ["held"]
+    assert all("claim_token" not in doc for doc in db.inventory_reservations.docs)
+    assert changes == [1]
+
+
+def test_admin_status_change_commits_the_holds(monkeypatch, fake_db):
+    import server
+
+    async def update_order(order_id, fields):
+        return {"order_id": order_id}
+
+    db = stocked(fake_db, {"p1": 8})
+    db.orders.seed([{"order_id": "AL1", "order_status": "pending"}, {"order_id": "AL2", "order_status": "pending"}])
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "update_order", update_order)
+
+    async def scenario():
+        await place_holds(db, "AL1", {"p1": 1})
+        await place_holds(db, "AL2", {"p1": 1})
+        await server.update_order_status("AL1", {"status": "confirmed"}, current_user={})
+        await server.update_order_admin_fields("AL2", {"admin_notes": "call first"}, current_user={})
+
+    asyncio.run(scenario())
+    assert statuses(db, "AL1") == ["committed"]
+    assert statuses(db, "AL2") == ["held"]
+
+
+class QueuedEmails:
+    def __init__(self):
+        self.queued = []
+
+    async def enqueue(self, template, to_email, payload, ref_id=None, variant=None):
+        self.queued.append((template, ref_id))
+
+    async def enqueue_many(self, emails):
+        self.queued.extend((email[0], email[3]) for email in emails)
+
+
+@pytest.fixture
+def shop(monkeypatch, fake_db):
+    import server
+
+    db = stocked(fake_db, {"p1": 8})
+    bumps = []
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "email_outbox", QueuedEmails())
+    monkeypatch.setattr(server, "bump_catalog_version", bumps.append)
+    return server, db, bumps
+
+
+def lapsed_order(db, order_id, quantity):
+    """An unpaid order whose hold the sweeper has already expired, returning quantity to stock"""
+    db.orders.seed([{"order_id": order_id, "order_status": "pending", "payment_status": "pending", "total": 100}])
+    asyncio.run(place_holds(db, order_id, {"p1": quantity}))
+    expire_all(db)
+    asyncio.run(ReservationSweeper(db).sweep())
+
+
+def test_sweeper_flags_the_orders_whose_holds_lapsed(shop):
+    _, db, _ = shop
+    lapsed_order(db, "AL1", 3)
+
+    assert stock(db, "p1") == 11
+    assert statuses(db, "AL1") == ["expired"]
+    assert db.orders.get(order_id="AL1")["inventory_hold_lapsed"] is True
+
+
+def test_paying_after_the_hold_expired_takes_the_stock_again(shop):
+    server, db, bumps = shop
+    lapsed_order(db, "AL1", 3)
+
+    response = asyncio.run(server.complete_payment("AL1", {"payment_method": "online"}))
+
+    assert response["order_status"] == "confirmed"
+    assert stock(db, "p1") == 8
+    assert statuses(db, "AL1") == ["committed"]
+    assert "inventory_hold_lapsed" not in db.orders.get(order_id="AL1")
+    assert bumps == ["lapsed hold reclaimed"]
+    # Committed like any paid order - cancelling gives the stock back once
+    asyncio.run(server.cancel_order("AL1", {}, current_user={}))
+    assert stock(db, "p1") == 11
+
+
+def test_paying_after_the_stock_sold_out_is_rejected(shop):
+    server, db, _ = shop
+    lapsed_order(db, "AL1", 3)
+    db.products.get(id="p1")["inventory_count"] = 2  # sold to someone else meanwhile
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.complete_payment("AL1", {}))
+
+    assert error.value.status_code == 409
+    order = db.orders.get(order_id="AL1")
+    assert (order["order_status"], order["payment_status"]) == ("pending", "pending")
+    assert stock(db, "p1") == 2
+    assert statuses(db, "AL1") == ["expired"]
+
+
+def test_captured_razorpay_payment_without_stock_is_flagged_for_refund(shop, monkeypatch):
+    server, db, _ = shop
+    monkeypatch.setenv("RAZORPAY_KEY_SECRET", "secret")
+    lapsed_order(db, "AL1", 3)
+    db.products.get(id="p1")["inventory_count"] = 0
+    signature = hmac.new(b"secret", b"order_rp|pay_rp", hashlib.sha256).hexdigest()
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.verify_razorpay_payment({
+            "razorpay_order_id": "order_rp", "razorpay_payment_id": "pay_rp",
+            "razorpay_signature": signature, "order_id": "AL1"
+        }))
+
+    assert error.value.status_code == 409
+    order = db.orders.get(order_id="AL1")
+    assert (order["payment_status"], order["order_status"]) == ("completed", "pending")
+    assert order["refund_required"] is True
+    assert order["razorpay_payment_id"] == "pay_rp"
+
+
+@pytest.mark.parametrize("endpoint", ["status", "admin-update"])
+def test_admin_cancellation_returns_the_stock(shop, endpoint):
+    server, db, bumps = shop
+    db.orders.seed([{"order_id": "AL1", "order_status": "confirmed", "total": 100}])
+
+    async def scenario():
+        await place_holds(db, "AL1", {"p1": 3})
+        await commit_holds(db, "AL1")
+        if endpoint == "status":
+            await server.update_order_status("AL1", {"status": "cancelled"}, current_user={})
+        else:
+            await server.update_order_admin_fields("AL1", {"order_status": "cancelled"}, current_user={})
+
+    asyncio.run(scenario())
+    assert stock(db, "p1") == 11
+    assert statuses(db, "AL1") == ["released"]
+    assert db.orders.get(order_id="AL1")["cancelled"] is True
+    assert bumps == ["order cancelled"]
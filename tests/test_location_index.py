@@ -0,0 +1,62 @@
+import asyncio
+
+import location_index
+from location_index import LocationIndex, location_key
+
+
+def test_location_key_normalizes_case_and_whitespace():
+    assert location_key("  Vijayawada ") == "vijayawada"
+    assert location_key("ANDHRA   pradesh") == "andhra pradesh"
+    assert location_key(None) == ""
+
+
+def test_resolve_matches_case_insensitively_without_queries(fake_db):
+    db = fake_db
+    db.locations.seed([
+        {"_id": 1, "name": "Guntur", "state": "Andhra Pradesh", "charge": 49.0},
+        {"_id": 2, "name": "Warangal", "state": "Telangana", "charge": 99.0, "free_delivery_threshold": 1000,
+         "name_key": "warangal", "state_key": "telangana"}
+    ])
+    index = LocationIndex()
+    asyncio.run(index.load(db))
+    assert db.locations.get(_id=1)["name_key"] == "guntur"
+    assert db.locations.count_calls("bulk_write") == 1
+
+    assert asyncio.run(index.resolve(db, " guntur", "ANDHRA PRADESH"))["charge"] == 49.0
+    assert asyncio.run(index.resolve(db, "Warangal", "telangana"))["free_delivery_threshold"] == 1000
+    assert asyncio.run(index.resolve(db, "Guntur", "Telangana")) is None
+    # Regex metacharacters are just characters
+    assert asyncio.run(index.resolve(db, "G.*", "Andhra Pradesh")) is None
+    assert db.locations.count_calls("find_one") == 2
+
+
+def test_locations_added_elsewhere_are_found_on_a_miss(fake_db):
+    db = fake_db
+    index = LocationIndex()
+    asyncio.run(index.load(db))
+    db.locations.seed([{"name": "Tenali", "state": "Andhra Pradesh", "charge": 79.0,
+                        "name_key": "tenali", "state_key": "andhra pradesh"}])
+
+    assert asyncio.run(index.resolve(db, "Tenali", "Andhra Pradesh"))["charge"] == 79.0
+    assert asyncio.run(index.resolve(db, "tenali", "andhra pradesh"))["charge"] == 79.0
+    assert db.locations.count_calls("find_one") == 1
+
+
+def test_charge_changes_elsewhere_show_up_once_the_map_ages_out(monkeypatch, fake_db):
+    clock = [1000.0]
+    monkeypatch.setattr(location_index.time, "monotonic", lambda: clock[0])
+    db = fake_db
+    db.locations.seed([{"name": "Guntur", "state": "Andhra Pradesh", "charge": 49.0,
+                        "name_key": "guntur", "state_key": "andhra pradesh"}])
+    index = LocationIndex()
+
+    async def charge():
+        return (await index.resolve(db, "Guntur", "Andhra Pradesh"))["charge"]
+
+    assert asyncio.run(charge()) == 49.0
+    db.locations.get(name="Guntur")["charge"] = 59.0
+    clock[0] += location_index.CACHE_MAX_AGE_SECONDS - 1
+    assert asyncio.run(charge()) == 49.0
+    clock[0] += 1
+    assert asyncio.run(charge()) == 59.0
+    assert db.locations.count_calls("find") == 2
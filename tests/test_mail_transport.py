@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+import mail_transport
+from gmail_service import send_order_status_update_email
+from mail_transport import FileTransport, MailTransport, MemoryTransport, OutgoingEmail
+
+ORDER = {"order_id": "AL1", "tracking_code": "TRK1", "customer_name": "Ravi", "total": 500.0}
+
+
+class SlowTransport(MailTransport):
+    def __init__(self, delay, **kwargs):
+        super().__init__(**kwargs)
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+
+    async def _send(self, email):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture
+def installed(monkeypatch):
+    monkeypatch.setenv("MAIL_TRANSPORT", "memory")
+    monkeypatch.setattr(mail_transport, "_transports", {})
+
+    def install(transport):
+        mail_transport.set_transport(transport)
+        return transport
+
+    return install
+
+
+def test_memory_transport_receives_rendered_email(installed):
+    transport = installed(MemoryTransport())
+    assert asyncio.run(send_order_status_update_email("a@example.com", ORDER, "confirmed", "shipped"))
+
+    [email] = transport.outbox
+    assert email.to_email == "a@example.com"
+    assert email.subject == "Order Status Update - #AL1"
+    assert "Shipped" in email.html
+
+
+def test_sends_time_out(installed):
+    installed(SlowTransport(delay=1, timeout=0.05))
+    assert not asyncio.run(send_order_status_update_email("a@example.com", ORDER, "confirmed", "shipped"))
+
+
+def test_concurrency_is_limited():
+    transport = SlowTransport(delay=0.01, max_concurrency=2)
+
+    async def burst():
+        await asyncio.gather(*(transport.send(OutgoingEmail("a@example.com", "s", "h")) for _ in range(10)))
+
+    asyncio.run(burst())
+    assert transport.peak == 2
+
+
+def test_file_transport_writes_eml(tmp_path):
+    asyncio.run(FileTransport(directory=str(tmp_path)).send(OutgoingEmail("a@example.com", "Hello", "<p>Hi</p>")))
+    [path] = tmp_path.glob("*.eml")
+    assert b"Subject: Hello" in path.read_bytes()
+
+
+def test_unconfigured_smtp_does_not_raise(monkeypatch):
+    monkeypatch.setenv("MAIL_TRANSPORT", "smtp")
+    monkeypatch.setenv("GMAIL_EMAIL", "")
+    monkeypatch.setattr(mail_transport, "_transports", {})
+    assert not asyncio.run(send_order_status_update_email("a@example.com", ORDER, "confirmed", "shipped"))
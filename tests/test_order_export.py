@@ -0,0 +1,58 @@
+import asyncio
+import csv
+import io
+from datetime import datetime, timezone
+
+import pytest
+
+from order_export import COLUMN_NAMES, date_chunks, order_rows, stream_csv, write_parquet
+
+
+def placed(day):
+    return datetime(2026, 3, day, 12, 0, tzinfo=timezone.utc)
+
+
+ORDERS = [
+    {"order_id": f"AL{day}", "created_at": placed(day), "customer_name": "Lakshmi", "city": "Guntur",
+     "order_status": "delivered", "subtotal": 300.0, "delivery_charge": 49.0, "total": 349.0,
+     "items": [
+         {"product_id": "p1", "name": "Mango Pickle", "weight": "500g", "price": 120.0, "quantity": 2},
+         {"product_id": "p2", "name": "Ariselu", "weight": "250g", "price": 60.0, "quantity": 1}
+     ]}
+    for day in range(1, 20)
+]
+
+
+def test_orders_flatten_to_one_row_per_line_item():
+    rows = order_rows(ORDERS[0])
+    assert [row["product_name"] for row in rows] == ["Mango Pickle", "Ariselu"]
+    assert rows[0]["line_total"] == 240.0 and rows[0]["order_id"] == "AL1"
+    assert set(rows[0]) == set(COLUMN_NAMES)
+
+    (empty,) = order_rows({"order_id": "AL0", "items": []})
+    assert empty["product_id"] is None and empty["cancelled"] is False
+
+
+def test_csv_streams_every_line_item_in_date_chunks(fake_db):
+    db = fake_db
+    db.orders.seed(ORDERS)
+    start, end = placed(1), placed(20)
+
+    async def collect():
+        return "".join([chunk async for chunk in stream_csv(db, start, end)])
+
+    rows = list(csv.DictReader(io.StringIO(asyncio.run(collect()))))
+    assert len(rows) == 2 * len(ORDERS)
+    assert rows[0]["order_id"] == "AL1" and rows[-1]["order_id"] == "AL19"
+    assert rows[0]["created_at"] == "2026-03-01T12:00:00+00:00"
+    assert db.orders.count_calls("find") == len(list(date_chunks(start, end)))
+
+
+def test_parquet_round_trips(tmp_path, fake_db):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "orders.parquet"
+    fake_db.orders.seed(ORDERS)
+    count = asyncio.run(write_parquet(fake_db, placed(1), placed(20), path))
+    table = pq.read_table(path)
+    assert count == table.num_rows == 2 * len(ORDERS)
+    assert table.column_names == COLUMN_NAMES
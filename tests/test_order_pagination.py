@@ -0,0 +1,67 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from order_pagination import InvalidCursor, decode_cursor, encode_cursor, fetch_order_page, order_filter
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    placed = datetime(2026, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc)
+    assert decode_cursor(encode_cursor({"created_at": placed, "order_id": "AL42"})) == (placed, "AL42")
+    # Orders not yet migrated by timestamps.py still page correctly
+    legacy = {"created_at": "2026-01-02T03:04:05+00:00", "order_id": "AL41"}
+    assert decode_cursor(encode_cursor(legacy)) == ("2026-01-02T03:04:05+00:00", "AL41")
+    with pytest.raises(InvalidCursor):
+        decode_cursor("not a cursor")
+
+
+def test_pages_walk_every_order_once_including_ties(fake_db):
+    # Five orders share a timestamp, so only order_id orders them
+    docs = [
+        {"order_id": f"AL{i:03d}", "created_at": datetime(2026, 1, 1 + i // 5, tzinfo=timezone.utc), "order_status": "pending"}
+        for i in range(23)
+    ]
+    fake_db.orders.seed(docs)
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = asyncio.run(fetch_order_page(fake_db, order_filter(cursor=cursor), limit=5))
+        seen.extend(order["order_id"] for order in page)
+        if cursor is None:
+            break
+
+    expected = [doc["order_id"] for doc in sorted(docs, key=lambda d: (d["created_at"], d["order_id"]), reverse=True)]
+    assert seen == expected
+
+
+def test_filters_combine_with_cursor():
+    query = order_filter(
+        status="pending",
+        date_from=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        custom_city=False,
+        cursor=encode_cursor({"created_at": datetime(2026, 2, 1, tzinfo=timezone.utc), "order_id": "AL1"})
+    )
+    assert query["$and"][0] == {
+        "order_status": "pending",
+        "custom_city_request": False,
+        "created_at": {"$gte": datetime(2026, 1, 1, tzinfo=timezone.utc)}
+    }
+    assert "$or" in query["$and"][1]
+
+
+def test_order_history_keeps_its_hundred_order_default(monkeypatch, fake_db):
+    import server
+    from fastapi import Response
+
+    fake_db.orders.seed(
+        {"order_id": f"AL{i:03d}", "user_id": "u1", "created_at": datetime(2026, 1, 1, i // 60, i % 60, tzinfo=timezone.utc)}
+        for i in range(120)
+    )
+    monkeypatch.setattr(server, "db", fake_db)
+    response = Response()
+    orders = asyncio.run(server.get_user_orders("u1", response, current_user={"id": "u1"}))
+
+    assert len(orders) == 100
+    assert orders[0]["order_id"] == "AL119"
+    assert "x-next-cursor" in response.headers
@@ -0,0 +1,36 @@
+import pytest
+
+from order_state import TRANSITIONS, InvalidTransition, check_transition, commits_stock
+
+
+def test_forward_transitions_are_allowed():
+    for old_status, new_status in [("pending", "confirmed"), ("confirmed", "shipped"),
+                                   ("shipped", "out for delivery"), ("out for delivery", "delivered")]:
+        check_transition(old_status, new_status)
+    # Orders stored without a status are pending
+    check_transition("", "confirmed")
+
+
+@pytest.mark.parametrize("old_status, new_status", [
+    ("delivered", "shipped"),
+    ("cancelled", "confirmed"),
+    ("shipped", "pending"),
+    ("pending", "teleported"),
+    ("lost", "shipped")
+])
+def test_invalid_transitions_are_rejected(old_status, new_status):
+    with pytest.raises(InvalidTransition):
+        check_transition(old_status, new_status)
+
+
+def test_every_target_is_a_known_status():
+    for targets in TRANSITIONS.values():
+        assert targets <= set(TRANSITIONS)
+
+
+def test_only_pending_and_cancelled_orders_leave_holds_to_expire():
+    assert not commits_stock("pending")
+    assert not commits_stock("")
+    assert not commits_stock("cancelled")
+    for status in ("confirmed", "processing", "shipped", "out for delivery", "delivered"):
+        assert commits_stock(status)
@@ -0,0 +1,41 @@
+import asyncio
+from datetime import datetime, timezone
+
+from order_tracking import TrackingCache
+
+
+ORDERS = [
+    {"order_id": "AL1", "tracking_code": "TRK1", "phone": "9000000001", "email": "a@example.com",
+     "order_status": "pending", "created_at": datetime(2026, 3, 1, tzinfo=timezone.utc)},
+    {"order_id": "AL2", "tracking_code": "TRK2", "phone": "9000000001", "email": "a@example.com",
+     "order_status": "pending", "created_at": datetime(2026, 3, 2, tzinfo=timezone.utc)}
+]
+
+
+def test_identifiers_resolve_in_one_query_newest_first(fake_db):
+    cache = TrackingCache()
+    db = fake_db
+    db.orders.seed(ORDERS)
+
+    assert [o["order_id"] for o in asyncio.run(cache.lookup(db, "9000000001"))] == ["AL2", "AL1"]
+    assert [o["order_id"] for o in asyncio.run(cache.lookup(db, "TRK1"))] == ["AL1"]
+    assert asyncio.run(cache.lookup(db, "unknown")) == []
+    assert db.orders.count_calls("find") == 3
+
+
+def test_cached_results_are_dropped_when_their_order_changes(fake_db):
+    cache = TrackingCache()
+    db = fake_db
+    db.orders.seed(ORDERS)
+
+    asyncio.run(cache.lookup(db, "a@example.com"))
+    asyncio.run(cache.lookup(db, "AL2"))
+    asyncio.run(cache.lookup(db, "a@example.com"))
+    assert db.orders.count_calls("find") == 2
+
+    db.orders.get(order_id="AL1")["order_status"] = "shipped"
+    cache.invalidate_order("AL1")
+    assert asyncio.run(cache.lookup(db, "a@example.com"))[1]["order_status"] == "shipped"
+    # The AL2 result did not contain AL1 and is still cached
+    asyncio.run(cache.lookup(db, "AL2"))
+    assert db.orders.count_calls("find") == 3
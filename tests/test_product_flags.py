@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def products(monkeypatch, fake_db):
+    db = fake_db
+    db.products.seed([
+        {"id": "p1", "isBestSeller": True},
+        {"id": "p2", "isBestSeller": True},
+        {"id": "p3", "isBestSeller": False},
+        {"id": "p4"}
+    ])
+    bumps = []
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "bump_catalog_version", bumps.append)
+    return db.products, bumps
+
+
+def test_only_changed_products_are_written(products):
+    collection, bumps = products
+    response = asyncio.run(server.update_best_sellers({"product_ids": ["p2", "p3", "p4"]}, current_user={}))
+
+    assert (response["added"], response["removed"]) == (["p3", "p4"], ["p1"])
+    # One write to clear the flag and one to set it
+    assert collection.count_calls("update_many") == 2
+    assert [product["id"] for product in collection.docs if product.get("isBestSeller")] == ["p2", "p3", "p4"]
+    assert len(bumps) == 1
+
+
+def test_unknown_ids_are_not_reported_as_added(products):
+    collection, bumps = products
+    response = asyncio.run(server.update_best_sellers({"product_ids": ["p1", "p2", "missing"]}, current_user={}))
+
+    assert (response["added"], response["removed"]) == ([], [])
+    assert collection.count_calls("update_many") == 0
+    assert bumps == []
@@ -0,0 +1,48 @@
+import pytest
+from fastapi import HTTPException
+
+from server import CARD_VIEW_FIELDS, _catalog_projection, _catalog_shape
+
+
+def test_full_view_reads_everything_but_internal_fields():
+    assert _catalog_shape(None, None, None) == (None, None)
+    assert _catalog_shape("full", None, None) == (None, None)
+    assert _catalog_projection((None, None)) == {"_id": 0, "inventory_txns": 0}
+    assert _catalog_projection((None, "en")) == {
+        "_id": 0, "inventory_txns": 0, "name_telugu": 0, "description_telugu": 0
+    }
+
+
+def test_card_view_selects_card_fields():
+    fields, lang = _catalog_shape("card", None, None)
+    assert set(fields) == set(CARD_VIEW_FIELDS)
+    assert "description" not in fields and "available_cities" not in fields
+    projection = _catalog_projection((fields, lang))
+    assert projection["_id"] == 0
+    assert set(projection) - {"_id"} == set(CARD_VIEW_FIELDS)
+
+
+def test_fields_whitelist_always_includes_id():
+    assert _catalog_shape(None, " name , prices,", None) == (("id", "name", "prices"), None)
+    # fields= takes precedence over view
+    assert _catalog_shape("card", "name", None) == (("id", "name"), None)
+
+    with pytest.raises(HTTPException) as error:
+        _catalog_shape(None, "name,inventory_txns,password", None)
+    assert error.value.status_code == 400
+    assert "inventory_txns, password" in error.value.detail
+
+
+def test_telugu_reads_both_languages_english_reads_one():
+    fields, _ = _catalog_shape(None, "name", "te")
+    assert fields == ("id", "name", "name_telugu")
+
+    shape = _catalog_shape("card", None, "en")
+    assert "name_telugu" not in _catalog_projection(shape)
+
+
+@pytest.mark.parametrize("view,lang", [("grid", None), (None, "hi")])
+def test_invalid_shape_is_rejected(view, lang):
+    with pytest.raises(HTTPException) as error:
+        _catalog_shape(view, None, lang)
+    assert error.value.status_code == 400
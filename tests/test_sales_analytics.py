@@ -0,0 +1,49 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from sales_analytics import AnalyticsCache, InvalidBreakdown, build_pipeline
+
+
+MARCH = datetime(2026, 3, 1, tzinfo=timezone.utc)
+APRIL = datetime(2026, 4, 1, tzinfo=timezone.utc)
+
+
+def test_pipeline_matches_on_indexed_fields_before_grouping():
+    pipeline = build_pipeline("product", MARCH, APRIL, {"state": "Telangana", "unknown": "x"})
+    match = pipeline[0]["$match"]
+    assert match["state"] == "Telangana" and "unknown" not in match
+    assert match["created_at"] == {"$gte": MARCH, "$lt": APRIL}
+    assert pipeline[1] == {"$unwind": "$items"}
+    assert pipeline[2]["$group"]["_id"] == "$items.product_id"
+
+    with pytest.raises(InvalidBreakdown):
+        build_pipeline("customer_name")
+
+
+def test_results_are_cached_until_an_order_in_their_window_changes(fake_db):
+    cache = AnalyticsCache()
+    db = fake_db
+    db.orders.seed([
+        {"order_id": "AL1", "city": "Guntur", "total": 500.333, "created_at": datetime(2026, 3, 2, tzinfo=timezone.utc)},
+        {"order_id": "AL2", "city": "Guntur", "total": 999.666, "created_at": datetime(2026, 3, 3, tzinfo=timezone.utc)},
+        {"order_id": "AL3", "city": "Tenali", "total": 100.0, "created_at": datetime(2026, 3, 4, tzinfo=timezone.utc)},
+        {"order_id": "AL4", "city": "Tenali", "total": 300.0, "created_at": datetime(2026, 3, 4, tzinfo=timezone.utc),
+         "cancelled": True, "order_status": "cancelled"},
+        {"order_id": "AL5", "city": "Tenali", "total": 900.0, "created_at": APRIL}
+    ])
+
+    rows = asyncio.run(cache.breakdown(db, "city", MARCH, APRIL))
+    assert rows == [{"key": "Guntur", "orders": 2, "sales": 1500.0}, {"key": "Tenali", "orders": 1, "sales": 100.0}]
+    asyncio.run(cache.breakdown(db, "city", MARCH, APRIL))
+    assert db.orders.count_calls("aggregate") == 1
+
+    # An order outside the window leaves the result cached
+    cache.invalidate_order({"created_at": "2026-04-15T10:00:00+00:00"})
+    asyncio.run(cache.breakdown(db, "city", MARCH, APRIL))
+    assert db.orders.count_calls("aggregate") == 1
+
+    cache.invalidate_order({"created_at": "2026-03-15T10:00:00+00:00"})
+    asyncio.run(cache.breakdown(db, "city", MARCH, APRIL))
+    assert db.orders.count_calls("aggregate") == 2
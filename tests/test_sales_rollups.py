@@ -0,0 +1,47 @@
+import asyncio
+
+from sales_rollups import apply_rollup_changes, rollup_changes, sales_summary
+
+
+def order(total, status="pending", created_at="2026-03-05T10:00:00+00:00", **fields):
+    return {
+        "created_at": created_at,
+        "order_status": status,
+        "cancelled": status == "cancelled",
+        "total": total,
+        "items": [{"name": "Mango Pickle", "quantity": 2}, {"name": "Ariselu 1.5kg", "quantity": 1}],
+        **fields
+    }
+
+
+def test_status_changes_only_touch_what_they_change():
+    pending = order(500)
+    assert rollup_changes(pending, {**pending, "order_status": "confirmed"}) == {}
+
+    delivered = rollup_changes(pending, {**pending, "order_status": "delivered"})
+    assert delivered == {
+        "day:2026-03-05": {"active": -1, "completed": 1},
+        "month:2026-03": {"active": -1, "completed": 1}
+    }
+
+
+def test_summary_matches_the_orders_after_every_change(fake_db):
+    db = fake_db
+    first = order(500)
+    second = order(250, created_at="2026-04-01T00:30:00+00:00")
+    third = order(100, status="delivered", created_at="2026-04-02T09:00:00Z")
+
+    async def scenario():
+        for placed in (first, second, third):
+            await apply_rollup_changes(db, after=placed)
+        await apply_rollup_changes(db, second, {**second, "cancelled": True, "order_status": "cancelled"})
+        return await sales_summary(db)
+
+    summary = asyncio.run(scenario())
+    assert summary["total_orders"] == 3
+    assert summary["total_sales"] == 600
+    assert (summary["active_orders"], summary["completed_orders"], summary["cancelled_orders"]) == (1, 1, 1)
+    assert summary["monthly_sales"] == {"2026-03": 500, "2026-04": 100}
+    assert summary["monthly_orders"] == {"2026-03": 1, "2026-04": 1}
+    assert summary["top_products"] == [{"name": "Mango Pickle", "count": 4}, {"name": "Ariselu 1.5kg", "count": 2}]
+    assert db.sales_rollups.get(_id="day:2026-04-01") is not None
@@ -0,0 +1,98 @@
+import smtplib
+import socket
+from email.message import EmailMessage
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller
+
+from smtp_pool import SMTPPool
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+
+def make_message(index):
+    msg = EmailMessage()
+    msg["Subject"] = f"Order Status Update - #{index}"
+    msg["From"] = "shop@example.com"
+    msg["To"] = f"customer{index}@example.com"
+    msg.set_content("Your order has shipped")
+    return msg
+
+
+def make_pool(controller, **kwargs):
+    return SMTPPool(controller.hostname, controller.port, use_ssl=False, size=2, **kwargs)
+
+
+def test_burst_reuses_sessions(smtp_server):
+    controller, handler = smtp_server
+    pool = make_pool(controller)
+
+    for index in range(20):
+        pool.send_message(make_message(index))
+    pool.close()
+
+    assert len(handler.messages) == 20
+    assert pool.connections_opened == 1
+
+
+def test_idle_sessions_are_health_checked(smtp_server):
+    controller, handler = smtp_server
+    pool = make_pool(controller, idle_check_seconds=0)
+
+    pool.send_message(make_message(1))
+    pool.send_message(make_message(2))
+    pool.close()
+
+    assert len(handler.messages) == 2
+    assert pool.connections_opened == 1
+
+
+def test_dropped_session_reconnects(smtp_server):
+    controller, handler = smtp_server
+    pool = make_pool(controller)
+
+    pool.send_message(make_message(1))
+    # Simulate the server dropping the idle connection without the pool noticing
+    pool._idle.queue[0].smtp.sock.shutdown(socket.SHUT_RDWR)
+    pool.send_message(make_message(2))
+    pool.close()
+
+    assert len(handler.messages) == 2
+    assert pool.connections_opened == 2
+
+
+def test_credentials_are_never_sent_without_tls(smtp_server):
+    controller, handler = smtp_server
+    # The test server does not offer STARTTLS, so login must not be attempted
+    pool = make_pool(controller, username="shop@example.com", password="secret")
+
+    with pytest.raises(smtplib.SMTPNotSupportedError):
+        pool.send_message(make_message(1))
+    pool.close()
+
+    assert handler.messages == []
+    assert pool.connections_opened == 0
@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime, timezone
+
+import timestamps
+from timestamps import TIMESTAMP_SCHEMA_VERSION, migrate_timestamps, parse_timestamp
+
+
+def test_parse_timestamp_accepts_strings_and_datetimes():
+    expected = datetime(2026, 3, 5, 10, 0, tzinfo=timezone.utc)
+    assert parse_timestamp("2026-03-05T10:00:00Z") == expected
+    assert parse_timestamp("2026-03-05T15:30:00+05:30") == expected
+    assert parse_timestamp(datetime(2026, 3, 5, 10, 0)) == expected
+    assert parse_timestamp("yesterday") is None
+    assert parse_timestamp(None) is None
+
+
+def test_migration_converts_in_batches_and_records_the_version(monkeypatch, fake_db):
+    monkeypatch.setattr(timestamps, "MIGRATION_BATCH_SIZE", 2)
+    already = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    db = fake_db
+    orders = db.orders
+    orders.seed([
+        {"_id": 1, "created_at": "2026-03-05T10:00:00+00:00", "cancelled_at": None},
+        {"_id": 2, "created_at": already},
+        {"_id": 3, "created_at": "2026-03-06T10:00:00+00:00", "cancelled_at": "2026-03-06T10:05:00+00:00"},
+        {"_id": 4, "created_at": "not a date"},
+        {"_id": 5, "created_at": "2026-03-07T10:00:00+00:00"}
+    ])
+
+    assert asyncio.run(migrate_timestamps(db)) == 3
+    assert orders.count_calls("bulk_write") == 2
+    assert orders.get(_id=1)["created_at"] == datetime(2026, 3, 5, 10, 0, tzinfo=timezone.utc)
+    assert orders.get(_id=2)["created_at"] == already
+    assert orders.get(_id=3)["cancelled_at"] == datetime(2026, 3, 6, 10, 5, tzinfo=timezone.utc)
+    assert orders.get(_id=4)["created_at"] == "not a date"
+
+    state = db.schema_migrations.get(_id="timestamps")
+    assert state["version"] == TIMESTAMP_SCHEMA_VERSION and "checkpoint" not in state
+    # Already at the current version - nothing is scanned again
+    assert asyncio.run(migrate_timestamps(db)) == 0
+
+
+def test_migration_resumes_from_its_checkpoint(monkeypatch, fake_db):
+    monkeypatch.setattr(timestamps, "MIGRATION_BATCH_SIZE", 2)
+    db = fake_db
+    orders = db.orders
+    orders.seed([{"_id": i, "created_at": f"2026-03-0{i}T00:00:00+00:00"} for i in range(1, 6)])
+    # An earlier run stopped after its first batch - documents before the checkpoint are not rescanned
+    db.schema_migrations.seed([{"_id": "timestamps", "checkpoint": {"orders": 2}}])
+
+    assert asyncio.run(migrate_timestamps(db)) == 3
+    assert orders.get(_id=1)["created_at"] == "2026-03-01T00:00:00+00:00"
+    assert isinstance(orders.get(_id=5)["created_at"], datetime)
@@ -0,0 +1,40 @@
+import asyncio
+
+from auth import create_access_token
+from user_cache import UserCache
+
+
+def test_tokens_and_users_are_cached_until_invalidated(fake_db):
+    cache = UserCache()
+    db = fake_db
+    db.users.seed([{"id": "u1", "name": "Ravi"}])
+    token = create_access_token({"sub": "u1", "email": "ravi@example.com"})
+
+    async def resolve():
+        return await cache.get_user(db, cache.decode(token)["sub"])
+
+    assert asyncio.run(resolve())["name"] == "Ravi"
+    assert asyncio.run(resolve())["name"] == "Ravi"
+    assert db.users.count_calls("find_one") == 1
+
+    db.users.get(id="u1")["name"] = "Ravi Kumar"
+    cache.invalidate_user("u1")
+    assert asyncio.run(resolve())["name"] == "Ravi Kumar"
+    assert db.users.count_calls("find_one") == 2
+
+
+def test_invalid_tokens_and_unknown_users_are_not_cached(fake_db):
+    cache = UserCache()
+    db = fake_db
+    assert cache.decode("not-a-jwt") is None
+    assert asyncio.run(cache.get_user(db, "missing")) is None
+    assert asyncio.run(cache.get_user(db, "missing")) is None
+    assert db.users.count_calls("find_one") == 2
+
+
+def test_returned_users_are_copies(fake_db):
+    cache = UserCache()
+    db = fake_db
+    db.users.seed([{"id": "u1", "name": "Ravi"}])
+    asyncio.run(cache.get_user(db, "u1"))["name"] = "changed"
+    assert asyncio.run(cache.get_user(db, "u1"))["name"] == "Ravi"